@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Run the clinic data server, which keeps the patient store open for every desk
+
+Desks use it by setting storage_backend to 'remote', server_address to
+the address printed here, and server_token to the token in this machine's
+settings file, which the server generates on its first start.
+
+Usage:
+    python data_server.py [--host HOST] [--port PORT]
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+
+# Add the src directory to the path so we can import our modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from config.settings import Settings
+from utils.data_server import DataServer
+
+def main():
+    """Serve the data folder until interrupted"""
+    parser = argparse.ArgumentParser(description="Serve the clinic's patient data to the desks")
+    parser.add_argument("--host", default=None,
+                        help="Address to listen on (default: host of the server_address setting)")
+    parser.add_argument("--port", type=int, default=None,
+                        help="Port to listen on (default: port of the server_address setting)")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    settings = Settings()
+    server = DataServer(settings, args.host, args.port)
+    server.start()
+    print(f"Serving {server.store.storage_path} on {server.host}:{server.port}. Press Ctrl+C to stop.")
+    
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
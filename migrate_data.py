@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Migrate patient data from the Excel workbook to the SQLite store
+
+Usage:
+    python migrate_data.py [--no-backups] [--force] [--switch-backend]
+"""
+
+import os
+import sys
+import argparse
+import logging
+
+# Add the src directory to the path so we can import our modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from config.settings import Settings
+from utils.sqlite_handler import SQLiteHandler
+from utils.data_migration import DataMigrator
+
+def main():
+    """Run the migration and print the verification report"""
+    parser = argparse.ArgumentParser(description="Migrate patients.xlsx and its backups into the SQLite store")
+    parser.add_argument("--no-backups", action="store_true",
+                        help="Only migrate the live workbook, not data/backups/patients_backup_*.xlsx")
+    parser.add_argument("--force", action="store_true",
+                        help="Replace patients already present in the SQLite database")
+    parser.add_argument("--switch-backend", action="store_true",
+                        help="Set storage_backend to 'sqlite' after a verified migration")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="Rows inserted per transaction (default: 1000)")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    settings = Settings()
+    store = SQLiteHandler(settings)
+    
+    try:
+        migrator = DataMigrator(settings, batch_size=args.batch_size)
+        report = migrator.migrate(store, include_backups=not args.no_backups, force=args.force)
+    except ValueError as e:
+        print(f"Migration aborted: {e}")
+        return 1
+    finally:
+        store.close()
+    
+    for source in report['sources']:
+        print(f"{source['path']}: {source['rows_imported']} imported / {source['rows_read']} read")
+    print(f"Duplicates skipped: {report['duplicates_skipped']}")
+    print(f"Backup rows without a patient ID skipped: {report['missing_id_skipped']}")
+    print(f"Rows expected: {report['expected_rows']}, rows in database: {report['actual_rows']}")
+    print(f"Finished in {report['seconds']:.1f}s")
+    
+    if not report['verified']:
+        print(f"VERIFICATION FAILED. Mismatched columns: {', '.join(report['mismatched_columns']) or 'none'}")
+        if report['unfolded_changes']:
+            print(f"{report['unfolded_changes']} changes were made on another workstation during the migration; "
+                  f"close every workstation and run it again with --force")
+        return 1
+    
+    print("Verification passed: row counts and column checksums match.")
+    
+    if args.switch_backend:
+        settings.set('storage_backend', 'sqlite')
+        print("Storage backend switched to SQLite.")
+    
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
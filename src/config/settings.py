@@ -23,8 +23,19 @@ class Settings:
         "company_name": "Dr. Muhammad Sajid Sohail",
         "data_path": "./data",
         "excel_file": "patients.xlsx",
+        "storage_backend": "excel",  # "excel", "sqlite", or "remote" to use the data server
+        "server_address": "127.0.0.1:8765",  # host:port of the data server
+        "server_storage_backend": "excel",  # Store the data server keeps, "excel" or "sqlite"
+        "server_token": "",  # Shared secret desks must send to the data server; generated by the server if blank
+        "sqlite_file": "patients.db",
+        "sqlite_journal_mode": "auto",  # "wal", "delete", or "auto" for delete on network shares and wal otherwise
+        "journal_compact_threshold": 200,  # Journal entries before they are folded into the workbook
+        "partition_cache_months": 12,  # Past months of patients kept loaded in memory
+        "cold_archive_after_months": 24,  # Age of months compressed into column files; 0 to never
+        "external_check_interval_ms": 3000,  # How often to pick up other workstations' changes
         "backup_interval_days": 7,
         "auto_backup": True,
+        "backup_max_snapshots": 10,  # Full snapshots kept, each with its change deltas
         "date_format": "%d-%m-%Y",
         "time_format": "%H:%M",
         "receipt_template": "default_template.html",
@@ -142,6 +153,15 @@ class Settings:
             str: Full path to the Excel file
         """
         return os.path.join(self.settings['data_path'], self.settings['excel_file'])
+    
+    def get_sqlite_path(self):
+        """
+        Get the full path to the SQLite database file
+        
+        Returns:
+            str: Full path to the SQLite database file
+        """
+        return os.path.join(self.settings['data_path'], self.settings['sqlite_file'])
         
     def __str__(self):
         """String representation of settings"""
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Model Events for the Receptionist Application
+Change notifications published by the patient model
+"""
+
+import logging
+
+logger = logging.getLogger('receptionist.events')
+
+class PatientEvent:
+    """
+    Base class of patient change events
+    
+    Attributes:
+        patient_id (str): Patient ID
+        old (dict): Patient data before the change, None for an added patient
+        new (dict): Patient data after the change, None for a deleted patient
+    """
+    
+    def __init__(self, patient_id, old=None, new=None):
+        """
+        Initialize the event
+        
+        Args:
+            patient_id (str): Patient ID
+            old (dict, optional): Patient data before the change. Defaults to None.
+            new (dict, optional): Patient data after the change. Defaults to None.
+        """
+        self.patient_id = patient_id
+        self.old = old
+        self.new = new
+    
+    def dates(self):
+        """
+        Get the appointment dates the change touches
+        
+        Returns:
+            set: Dates in format YYYY-MM-DD, before and after the change
+        """
+        return {
+            row.get('appointment_date')
+            for row in (self.old, self.new)
+            if row and row.get('appointment_date')
+        }
+    
+    def __repr__(self):
+        return f"{type(self).__name__}({self.patient_id!r})"
+
+class PatientAdded(PatientEvent):
+    """A patient was added; only new is set"""
+
+class PatientUpdated(PatientEvent):
+    """A patient was changed; old and new are both set"""
+
+class PatientDeleted(PatientEvent):
+    """A patient was deleted; only old is set"""
+
+class EventBus:
+    """
+    Event Bus class for the Receptionist Application
+    Delivers events to the callbacks subscribed to their type. Events are
+    delivered synchronously on the thread that publishes them, in the order
+    the callbacks subscribed. A failing callback is logged and does not
+    stop delivery to the others.
+    """
+    
+    def __init__(self):
+        """Initialize an Event Bus without subscribers"""
+        self._subscribers = []
+    
+    def subscribe(self, callback, event_type=PatientEvent):
+        """
+        Subscribe to events
+        
+        Args:
+            callback (callable): Called with each matching event
+            event_type (type, optional): Event class to receive, including its
+                subclasses. Defaults to every patient event.
+        
+        Returns:
+            callable: Function that removes the subscription
+        """
+        subscription = (event_type, callback)
+        self._subscribers.append(subscription)
+        
+        def unsubscribe():
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+        
+        return unsubscribe
+    
+    def publish(self, event):
+        """
+        Deliver an event to its subscribers
+        
+        Args:
+            event (PatientEvent): Event to deliver
+        """
+        # Copy so callbacks may subscribe or unsubscribe while being called
+        for event_type, callback in list(self._subscribers):
+            if not isinstance(event, event_type):
+                continue
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"Error handling {event!r}: {e}")
@@ -6,9 +6,12 @@ Handles patient data operations
 """
 
 import logging
-from utils.excel_handler import ExcelHandler
+from datetime import datetime
+from models.events import EventBus, PatientAdded, PatientUpdated, PatientDeleted
+from utils.patient_store import create_patient_store
 from utils.print_handler import PrintHandler
 from utils.stats_handler import StatsHandler
+from utils.stats_provider import StatsProvider
 
 logger = logging.getLogger('receptionist.patient_model')
 
@@ -18,17 +21,41 @@ class PatientModel:
     Handles patient data operations
     """
     
-    def __init__(self, settings):
+    def __init__(self, settings, ui_dispatcher=None, backend=None):
         """
         Initialize the Patient Model
         
         Args:
             settings: Application settings
+            ui_dispatcher (callable, optional): Schedules a call on the UI
+                thread, normally root.after. Write completion callbacks are
+                delivered through it.
+            backend (str, optional): Storage backend to use instead of the
+                'storage_backend' setting. Defaults to None.
+        
+        Raises:
+            RemoteStoreError: If the remote backend is used and the data
+                server cannot be reached
         """
         self.settings = settings
-        self.excel_handler = ExcelHandler(settings)
+        self.ui_dispatcher = ui_dispatcher
+        self.store = create_patient_store(settings, backend)
         self.print_handler = PrintHandler(settings)
-        self.stats_handler = StatsHandler(self.excel_handler)
+        
+        # Views subscribe here to hear about changes instead of re-reading everything
+        self.events = EventBus()
+        
+        # Per-day totals kept next to the data file, or by the data server,
+        # subscribed first so views that read statistics when a change
+        # arrives see it counted
+        self.rollup = self.store.create_daily_rollup()
+        self.events.subscribe(self.rollup.apply_event)
+        self.stats_handler = StatsHandler(self.store, self.rollup)
+        self.events.subscribe(self.stats_handler.on_patient_changed)
+        
+        # Today's, this week's and this month's figures, shared by every view
+        self.stats_provider = StatsProvider(self.stats_handler)
+        self.events.subscribe(self.stats_provider.on_patient_changed)
     
     def get_all_patients(self):
         """
@@ -37,7 +64,7 @@ class PatientModel:
         Returns:
             pandas.DataFrame: DataFrame containing all patients
         """
-        return self.excel_handler.get_all_patients()
+        return self.store.get_all_patients()
     
     def get_patient_by_id(self, patient_id):
         """
@@ -49,56 +76,127 @@ class PatientModel:
         Returns:
             dict: Patient data or None if not found
         """
-        return self.excel_handler.get_patient_by_id(patient_id)
+        return self.store.get_patient_by_id(patient_id)
+    
+    def get_patient_count(self):
+        """
+        Get the number of patient rows
+        
+        Returns:
+            int: Row count
+        """
+        return self.store.get_patient_count()
     
-    def search_patients_by_name(self, name):
+    def get_patients_slice(self, start, count):
+        """
+        Get a range of patients in the order get_all_patients() returns them
+        
+        Args:
+            start (int): Index of the first row
+            count (int): Maximum number of rows
+            
+        Returns:
+            pandas.DataFrame: The rows in that range
+        """
+        return self.store.get_patients_slice(start, count)
+    
+    def search_patients_by_name(self, name, limit=100):
         """
         Search for patients by name (first or last)
         
         Args:
             name (str): Name to search for
+            limit (int, optional): Maximum number of matches. Defaults to 100.
             
         Returns:
-            pandas.DataFrame: DataFrame containing matching patients
+            pandas.DataFrame: Matching patients, best match first
         """
-        return self.excel_handler.get_patients_by_name(name)
+        return self.store.get_patients_by_name(name, limit)
     
-    def add_patient(self, patient_data):
+    def _on_ui_thread(self, callback):
+        """
+        Wrap a completion callback so it runs on the UI thread
+        
+        Args:
+            callback (callable): Callback taking the success flag, or None
+            
+        Returns:
+            callable: Callback safe to call from the writer thread, or None
+        """
+        if callback is None:
+            return None
+        
+        if self.ui_dispatcher is None:
+            return callback
+        
+        return lambda success: self.ui_dispatcher(0, callback, success)
+    
+    def add_patient(self, patient_data, on_complete=None):
         """
         Add a new patient
         
+        Returns as soon as the patient is visible to reads; the write to disk
+        may still be in progress. A PatientAdded event is published on success.
+        
         Args:
             patient_data (dict): Patient data
+            on_complete (callable, optional): Called on the UI thread with True
+                once the patient is on disk, or False if writing failed
             
         Returns:
             bool: True if successful, False otherwise
         """
-        return self.excel_handler.add_patient(patient_data)
+        success = self.store.add_patient(patient_data, self._on_ui_thread(on_complete))
+        
+        if success:
+            # The store fills in the generated patient ID
+            patient_id = patient_data.get('patient_id')
+            self.events.publish(PatientAdded(patient_id, new=self.store.get_patient_by_id(patient_id)))
+        
+        return success
     
-    def update_patient(self, patient_id, patient_data):
+    def update_patient(self, patient_id, patient_data, on_complete=None):
         """
         Update an existing patient
         
+        A PatientUpdated event is published on success.
+        
         Args:
             patient_id (str): Patient ID
             patient_data (dict): Updated patient data
+            on_complete (callable, optional): See add_patient()
             
         Returns:
             bool: True if successful, False otherwise
         """
-        return self.excel_handler.update_patient(patient_id, patient_data)
+        old = self.store.get_patient_by_id(patient_id)
+        success = self.store.update_patient(patient_id, patient_data, self._on_ui_thread(on_complete))
+        
+        if success:
+            self.events.publish(PatientUpdated(patient_id, old=old, new=self.store.get_patient_by_id(patient_id)))
+        
+        return success
     
-    def delete_patient(self, patient_id):
+    def delete_patient(self, patient_id, on_complete=None):
         """
         Delete a patient
         
+        A PatientDeleted event is published on success.
+        
         Args:
             patient_id (str): Patient ID
+            on_complete (callable, optional): See add_patient()
             
         Returns:
             bool: True if successful, False otherwise
         """
-        return self.excel_handler.delete_patient(patient_id)
+        old = self.store.get_patient_by_id(patient_id)
+        success = self.store.delete_patient(patient_id, self._on_ui_thread(on_complete))
+        
+        if success:
+            self.events.publish(PatientDeleted(patient_id, old=old))
+        
+        return success
     
     def get_appointments_for_date(self, date):
         """
@@ -110,7 +208,21 @@ class PatientModel:
         Returns:
             pandas.DataFrame: DataFrame containing appointments for the date
         """
-        return self.excel_handler.get_appointments_for_date(date)
+        return self.store.get_appointments_for_date(date)
+    
+    def get_next_token_number(self, date=None):
+        """
+        Get the token number the next patient added on a day will get
+        
+        Args:
+            date (str, optional): Date in format YYYY-MM-DD. Defaults to today.
+            
+        Returns:
+            str: Next token number, empty if it could not be read
+        """
+        if date is None:
+            date = datetime.now().strftime('%Y-%m-%d')
+        return self.store.get_next_token_number(date)
     
     def get_appointments_for_doctor(self, doctor_name, date=None):
         """
@@ -123,7 +235,91 @@ class PatientModel:
         Returns:
             pandas.DataFrame: DataFrame containing appointments for the doctor
         """
-        return self.excel_handler.get_appointments_for_doctor(doctor_name, date)
+        return self.store.get_appointments_for_doctor(doctor_name, date)
+    
+    def create_backup(self):
+        """Create a backup copy of the patient store"""
+        self.store.create_backup()
+    
+    def restore_backup(self, point_in_time, export_path):
+        """
+        Restore the patient data as it was at a point in time into a workbook
+        
+        Args:
+            point_in_time (datetime): Time to restore
+            export_path (str): Path of the workbook to write
+            
+        Returns:
+            int: Number of patients in the restored workbook
+        """
+        return self.store.restore_backup(point_in_time, export_path)
+    
+    def export_to_excel(self, export_path):
+        """
+        Export all patients to an Excel workbook
+        
+        Args:
+            export_path (str): Path of the workbook to write
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        return self.store.export_to_excel(export_path)
+    
+    def poll_external_changes(self):
+        """
+        Read the changes other workstations made to the shared data
+        
+        The store may parse the data file again, so this runs off the Tk
+        thread; the result goes to publish_external_changes() on it.
+        
+        Returns:
+            list: (patient_id, old, new) tuples, or None if the store
+                reloaded and anything may have changed
+        """
+        return self.store.poll_external_changes()
+    
+    def publish_external_changes(self, changes):
+        """
+        Publish the changes read by poll_external_changes()
+        
+        Each changed patient is published as an event, so the views and
+        statistics update just those rows. If the store could not tell
+        which rows changed, the statistics are rebuilt here, on the same
+        thread as the events of this desk's own saves, so a save is never
+        counted by both the rebuild and its event.
+        
+        Args:
+            changes (list): (patient_id, old, new) tuples, or None if the
+                store reloaded
+        
+        Returns:
+            bool: True if the store reloaded and every view should refresh
+        """
+        if changes is None:
+            logger.info("Data changed on another workstation; reloading")
+            self.rebuild_statistics()
+            return True
+        
+        for patient_id, old, new in changes:
+            if old is None:
+                self.events.publish(PatientAdded(patient_id, new=new))
+            elif new is None:
+                self.events.publish(PatientDeleted(patient_id, old=old))
+            else:
+                self.events.publish(PatientUpdated(patient_id, old=old, new=new))
+        return False
+    
+    def rebuild_statistics(self):
+        """Recalculate the daily rollup, breakdowns and current figures from every patient in the store"""
+        self.rollup.rebuild()
+        self.stats_handler.clear_cache()
+        self.stats_provider.invalidate()
+    
+    def close(self):
+        """Release the resources held by the patient store"""
+        self.rollup.close()
+        self.store.close()
     
     def print_reception_slip(self, patient_data):
         """
@@ -5,12 +5,15 @@ Appointment View for the Receptionist Application
 Displays appointments for a specific date
 """
 
+import bisect
 import logging
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
 from tkcalendar import DateEntry
 
+from ui.virtual_tree import VirtualTreeview
+
 logger = logging.getLogger('receptionist.appointment_view')
 
 class AppointmentView:
@@ -35,8 +38,17 @@ class AppointmentView:
         # Current date
         self.current_date = datetime.now().strftime('%Y-%m-%d')
         
+        # Rows shown for the current date: patient_id -> (sort key, values),
+        # and the sort keys in display order
+        self._rows = {}
+        self._order = []
+        self._sequence = 0
+        
         # Create the UI
         self._create_ui()
+        
+        # Keep the rows current as patients are saved and deleted
+        self.patient_model.events.subscribe(self._on_patient_changed)
     
     def _create_ui(self):
         """Create the user interface"""
@@ -74,10 +86,9 @@ class AppointmentView:
         self.refresh_button.grid(row=0, column=2, sticky='e', padx=5, pady=5)
         
         # Create the appointments treeview
-        self.appointments_tree = ttk.Treeview(
+        self.appointments_tree = VirtualTreeview(
             self.frame,
-            columns=("Token", "Arrival", "Patient", "Status", "Doctor", "Fees", "Remarks"),
-            show="headings"
+            columns=("Token", "Arrival", "Patient", "Status", "Doctor", "Fees", "Remarks")
         )
         
         # Define the columns
@@ -98,20 +109,15 @@ class AppointmentView:
         self.appointments_tree.column("Fees", width=60)
         self.appointments_tree.column("Remarks", width=150)
         
-        # Add a scrollbar
-        scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.appointments_tree.yview)
-        self.appointments_tree.configure(yscrollcommand=scrollbar.set)
-        
-        # Pack the treeview and scrollbar
+        # Pack the treeview, which brings its own scrollbar
         self.appointments_tree.grid(row=1, column=0, columnspan=3, sticky='nsew', padx=5, pady=5)
-        scrollbar.grid(row=1, column=3, sticky='ns')
         
         # Add delete button
         self.delete_button = ttk.Button(self.frame, text="Delete Selected Patient", command=self._on_delete_selected)
         self.delete_button.grid(row=2, column=0, columnspan=3, sticky='e', padx=5, pady=5)
         
         # Bind selection event
-        self.appointments_tree.bind("<<TreeviewSelect>>", self._on_appointment_selected)
+        self.appointments_tree.bind_select(self._on_appointment_selected)
         
         # Load today's appointments
         self.show_appointments_for_date(self.current_date)
@@ -129,32 +135,19 @@ class AppointmentView:
         # Show appointments for the selected date
         self.show_appointments_for_date(self.current_date)
     
-    def _on_appointment_selected(self, event):
+    def _on_appointment_selected(self, patient_id):
         """
         Handle selection of an appointment
         
         Args:
-            event: Treeview selection event
+            patient_id (str): Patient ID of the selected appointment
         """
-        # Get the selected item
-        selection = self.appointments_tree.selection()
+        # Get the patient data
+        patient_data = self.patient_model.get_patient_by_id(patient_id)
         
-        if not selection:
-            return
-        
-        # Get the patient ID from the selected item's tags
-        item = self.appointments_tree.item(selection[0])
-        tags = item['tags']
-        
-        if tags and len(tags) > 0:
-            patient_id = tags[0]
-            
-            # Get the patient data
-            patient_data = self.patient_model.get_patient_by_id(patient_id)
-            
-            # Call the callback if provided
-            if self.on_patient_selected and patient_data:
-                self.on_patient_selected(patient_data)
+        # Call the callback if provided
+        if self.on_patient_selected and patient_data:
+            self.on_patient_selected(patient_data)
     
     def _on_delete_selected(self):
         """Handle delete button click"""
@@ -164,13 +157,12 @@ class AppointmentView:
             messagebox.showinfo("Selection Required", "Please select an appointment to delete.")
             return
         
-        # Get the patient ID from the selected item's tags
-        item = self.appointments_tree.item(selection[0])
-        tags = item['tags']
+        # Rows are keyed by patient ID
+        patient_id = selection[0]
+        values = self.appointments_tree.item_values(patient_id)
         
-        if tags and len(tags) > 0:
-            patient_id = tags[0]
-            patient_name = item['values'][2]  # Patient name is in the third column
+        if values:
+            patient_name = values[2]  # Patient name is in the third column
             
             # Confirm deletion
             confirm = messagebox.askyesno(
@@ -184,60 +176,195 @@ class AppointmentView:
                 success = self.patient_model.delete_patient(patient_id)
                 
                 if success:
+                    # The row goes when the model reports the deletion
                     messagebox.showinfo("Success", f"Patient {patient_name} has been deleted.")
-                    # Refresh the appointments
-                    self.refresh()
                 else:
                     messagebox.showerror("Error", f"Failed to delete patient {patient_name}.")
     
     def refresh(self):
-        """Refresh the appointments view"""
-        self.show_appointments_for_date(self.current_date)
+        """
+        Refresh the appointments view
+        
+        The date's appointments are read again and compared with the rows on
+        screen; only rows that were added, changed or removed are touched,
+        and the selection and scroll position are kept.
+        """
+        appointments = self.patient_model.get_appointments_for_date(self.current_date)
+        
+        changes = {patient_id: None for patient_id in self._rows}
+        for appointment in appointments.to_dict('records'):
+            patient_id = appointment.get('patient_id', '')
+            shown = self._rows.get(patient_id)
+            if shown is not None and shown[0][0] == self._sort_time(appointment) \
+                    and shown[1] == self._row_values(appointment):
+                del changes[patient_id]
+            else:
+                changes[patient_id] = appointment
+        
+        self.apply_changes(changes)
     
     def show_appointments_for_date(self, date):
         """Show all appointments for the given date."""
+        if date == self.current_date and self._rows:
+            self.refresh()
+            return
+        
         # Update the current date
         self.current_date = date
         self.date_var.set(date)
         
-        # Clear the treeview
-        for item in self.appointments_tree.get_children():
-            self.appointments_tree.delete(item)
+        self._rows = {}
+        self._order = []
         
-        # Get appointments for the date
+        # Get appointments for the date; rows are sorted by time as they are added
         appointments = self.patient_model.get_appointments_for_date(date)
+        for appointment in appointments.to_dict('records'):
+            self._put_row(appointment)
         
-        # Sort by time
-        appointments = appointments.sort_values('appointment_time')
+        # Start at the top of the new date's list
+        self.appointments_tree.set_source(lambda: len(self._order), self._fetch_rows)
+    
+    def _on_patient_changed(self, event):
+        """
+        Update the view for a patient change
         
-        # Add the appointments to the treeview
-        for _, appointment in appointments.iterrows():
-            # Get patient name
-            patient_name = f"{appointment.get('first_name', '')} {appointment.get('last_name', '')}"
-            
-            # Get arrival time
-            arrival_time = appointment.get('arrival_time', '')
-            
-            # Format fees
-            fees = appointment.get('fees', '')
-            if fees:
-                fees = f"PKR {fees}"
-            
-            # Insert the appointment
-            self.appointments_tree.insert(
-                "",
-                "end",
-                values=(
-                    appointment.get('token_number', ''),
-                    arrival_time,
-                    patient_name,
-                    appointment.get('status', ''),
-                    appointment.get('doctor_name', ''),
-                    fees,
-                    appointment.get('remarks', appointment.get('notes', ''))
-                ),
-                tags=(appointment.get('patient_id', ''),)
-            )
-
+        Args:
+            event (PatientEvent): Change published by the patient model
+        """
+        self.apply_changes({event.patient_id: event.new})
+    
+    def apply_changes(self, changes):
+        """
+        Update the view for changed patients
+        
+        The cost depends on the number of changes, not on the number of
+        appointments shown. The selection and scroll position are kept.
+        
+        Args:
+            changes (dict): patient_id -> new patient data, or None if the
+                patient was deleted. Patients whose appointment is on another
+                date are removed from the view.
+        """
+        changed = False
+        for patient_id, patient_data in changes.items():
+            if patient_data and patient_data.get('appointment_date') == self.current_date:
+                changed = self._put_row(dict(patient_data, patient_id=patient_id)) or changed
+            else:
+                changed = self._remove_row(patient_id) or changed
+        
+        if changed:
+            # A selected appointment that left the list is no longer selected
+            selection = self.appointments_tree.selection()
+            if selection and selection[0] not in self._rows:
+                self.appointments_tree.clear_selection()
+            self.appointments_tree.refresh()
+    
+    def _sort_time(self, appointment):
+        """
+        Get the value appointments are ordered by
+        
+        Args:
+            appointment (dict): Patient data
+        
+        Returns:
+            str: Appointment time
+        """
+        time = appointment.get('appointment_time', '')
+        return '' if time is None else str(time)
+    
+    def _row_values(self, appointment):
+        """
+        Get the values shown for an appointment
+        
+        Args:
+            appointment (dict): Patient data
+        
+        Returns:
+            tuple: Column values
+        """
+        # Get patient name
+        patient_name = f"{appointment.get('first_name', '')} {appointment.get('last_name', '')}"
+        
+        # Get arrival time
+        arrival_time = appointment.get('arrival_time', '')
+        
+        # Format fees
+        fees = appointment.get('fees', '')
+        if fees:
+            fees = f"PKR {fees}"
+        
+        return (
+            appointment.get('token_number', ''),
+            arrival_time,
+            patient_name,
+            appointment.get('status', ''),
+            appointment.get('doctor_name', ''),
+            fees,
+            appointment.get('remarks', appointment.get('notes', ''))
+        )
+    
+    def _put_row(self, appointment):
+        """
+        Add or replace the row of an appointment, keeping time order
+        
+        Args:
+            appointment (dict): Patient data
+        
+        Returns:
+            bool: True if the view changed
+        """
+        patient_id = appointment.get('patient_id', '')
+        values = self._row_values(appointment)
+        time = self._sort_time(appointment)
+        
+        shown = self._rows.get(patient_id)
+        if shown is not None:
+            sort_key = shown[0]
+            if sort_key[0] == time:
+                if shown[1] == values:
+                    return False
+                # Same place in the list, new values
+                self._rows[patient_id] = (sort_key, values)
+                return True
+            self._remove_row(patient_id)
+        
+        # Appointments at the same time stay in the order they were added
+        self._sequence += 1
+        sort_key = (time, self._sequence, patient_id)
+        bisect.insort(self._order, sort_key)
+        self._rows[patient_id] = (sort_key, values)
+        return True
+    
+    def _remove_row(self, patient_id):
+        """
+        Remove the row of an appointment
+        
+        Args:
+            patient_id (str): Patient ID
+        
+        Returns:
+            bool: True if the row was shown
+        """
+        shown = self._rows.pop(patient_id, None)
+        if shown is None:
+            return False
+        
+        position = bisect.bisect_left(self._order, shown[0])
+        del self._order[position]
+        return True
+    
+    def _fetch_rows(self, start, count):
+        """
+        Get a range of rows for the tree
+        
+        Args:
+            start (int): Index of the first row
+            count (int): Number of rows
+        
+        Returns:
+            list: (patient ID, values) tuples
+        """
+        return [(patient_id, self._rows[patient_id][1]) for _, _, patient_id in self._order[start:start + count]]
+    
     def delete_selected_patient(self):
         """Delete the selected patient."""
\ No newline at end of file
@@ -7,17 +7,20 @@ Provides the main UI for the application
 
 import os
 import logging
+import threading
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog, simpledialog
 from datetime import datetime, timedelta
 from PIL import Image, ImageTk  # Add PIL import for image handling
 
 from ui.patient_form import PatientForm
 from ui.appointment_view import AppointmentView
 from ui.search_panel import SearchPanel
+from ui.stats_counter import StatsCounter
 from ui.settings_dialog import SettingsDialog
 from ui.doctors_dialog import DoctorsDialog
 from models.patient_model import PatientModel
+from utils.remote_store import RemoteStoreError
 
 logger = logging.getLogger('receptionist.main_window')
 
@@ -83,7 +86,7 @@ class MainWindow:
             logger.error(f"Failed to set application logo: {str(e)}")
         
         # Create the patient model
-        self.patient_model = PatientModel(settings)
+        self.patient_model = self._create_patient_model()
         
         # Create the UI
         self._create_ui()
@@ -93,6 +96,34 @@ class MainWindow:
         
         # Set up cleanup on window close
         self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+        
+        # Pick up saves made on other workstations sharing the data folder
+        self._external_check_interval = settings.get('external_check_interval_ms', 3000)
+        self.root.after(self._external_check_interval, self._check_external_changes)
+    
+    def _create_patient_model(self):
+        """
+        Create the patient model, working locally if the data server is down
+        
+        The data folder the server would use is opened directly instead, so
+        the desk stays usable; the data server setting is left as it is and
+        is tried again at the next start.
+        
+        Returns:
+            PatientModel: The patient model
+        """
+        try:
+            return PatientModel(self.settings, ui_dispatcher=self.root.after)
+        except RemoteStoreError as e:
+            logger.error(f"Data server unavailable, using the local data folder: {e}")
+            backend = self.settings.get('server_storage_backend', 'excel')
+            messagebox.showwarning(
+                "Data Server Unavailable",
+                f"Could not reach the data server at {self.settings.get('server_address', '')}.\n\n"
+                "Working with the data folder directly for now. Check that the data "
+                "server is running, or change the storage backend in Settings."
+            )
+            return PatientModel(self.settings, ui_dispatcher=self.root.after, backend=backend)
     
     def _create_ui(self):
         """Create the user interface"""
@@ -157,8 +188,10 @@ class MainWindow:
         file_menu.add_command(label="Print Current", command=self._on_print_current)
         file_menu.add_separator()
         file_menu.add_command(label="Backup Database", command=self._on_backup_database)
+        file_menu.add_command(label="Restore Backup...", command=self._on_restore_backup)
+        file_menu.add_command(label="Export to Excel...", command=self._on_export_to_excel)
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=self.root.quit)
+        file_menu.add_command(label="Exit", command=self._on_close)
         self.menu_bar.add_cascade(label="File", menu=file_menu)
         
         # View menu
@@ -227,83 +260,13 @@ class MainWindow:
     
     def _create_stats_bar(self):
         """Create a compact stats bar showing daily, weekly, and monthly statistics"""
-        # Create a frame for the stats bar with a border
-        stats_frame = ttk.Frame(self.root, relief=tk.RIDGE, borderwidth=1)
-        stats_frame.grid(row=2, column=0, sticky='ew', padx=5, pady=2)
-        
-        # Style for labels
-        title_style = {'font': ('Arial', 9, 'bold')}
-        value_style = {'font': ('Arial', 9)}
-        
-        # Create the daily stats section
-        daily_frame = ttk.Frame(stats_frame)
-        daily_frame.pack(side=tk.LEFT, padx=10, pady=2)
-        
-        ttk.Label(daily_frame, text="TODAY:", **title_style).pack(side=tk.LEFT)
-        self.daily_visits_label = ttk.Label(daily_frame, text="0 visits", **value_style)
-        self.daily_visits_label.pack(side=tk.LEFT, padx=5)
-        self.daily_revenue_label = ttk.Label(daily_frame, text="PKR 0", **value_style)
-        self.daily_revenue_label.pack(side=tk.LEFT, padx=5)
-        
-        # Add separator
-        ttk.Separator(stats_frame, orient=tk.VERTICAL).pack(side=tk.LEFT, fill=tk.Y, padx=5, pady=2)
-        
-        # Create the weekly stats section
-        weekly_frame = ttk.Frame(stats_frame)
-        weekly_frame.pack(side=tk.LEFT, padx=10, pady=2)
-        
-        ttk.Label(weekly_frame, text="WEEK:", **title_style).pack(side=tk.LEFT)
-        self.weekly_visits_label = ttk.Label(weekly_frame, text="0 visits", **value_style)
-        self.weekly_visits_label.pack(side=tk.LEFT, padx=5)
-        self.weekly_revenue_label = ttk.Label(weekly_frame, text="PKR 0", **value_style)
-        self.weekly_revenue_label.pack(side=tk.LEFT, padx=5)
-        
-        # Add separator
-        ttk.Separator(stats_frame, orient=tk.VERTICAL).pack(side=tk.LEFT, fill=tk.Y, padx=5, pady=2)
-        
-        # Create the monthly stats section
-        monthly_frame = ttk.Frame(stats_frame)
-        monthly_frame.pack(side=tk.LEFT, padx=10, pady=2)
-        
-        ttk.Label(monthly_frame, text="MONTH:", **title_style).pack(side=tk.LEFT)
-        self.monthly_visits_label = ttk.Label(monthly_frame, text="0 visits", **value_style)
-        self.monthly_visits_label.pack(side=tk.LEFT, padx=5)
-        self.monthly_revenue_label = ttk.Label(monthly_frame, text="PKR 0", **value_style)
-        self.monthly_revenue_label.pack(side=tk.LEFT, padx=5)
-        
-        # Refresh button
-        refresh_btn = ttk.Button(stats_frame, text="↻", width=2, command=self._on_refresh_stats)
-        refresh_btn.pack(side=tk.RIGHT, padx=5, pady=2)
-        
-        # Update the stats initially
-        self._update_stats_bar()
+        # The counter reads the model's cached figures and follows patient changes itself
+        self.stats_counter = StatsCounter(self.root, self.patient_model, on_refresh=self._on_refresh_stats)
+        self.stats_counter.frame.grid(row=2, column=0, sticky='ew')
     
     def _update_stats_bar(self):
         """Update the statistics in the stats bar"""
-        try:
-            # Get current date
-            now = datetime.now()
-            today = now.strftime('%Y-%m-%d')
-            
-            # Update daily stats
-            daily_stats = self.patient_model.stats_handler.get_daily_stats(today)
-            self.daily_visits_label.config(text=f"{daily_stats['visit_count']} visits")
-            self.daily_revenue_label.config(text=f"PKR {daily_stats['revenue']:.2f}")
-            
-            # Update weekly stats
-            weekly_stats = self.patient_model.stats_handler.get_weekly_stats()
-            self.weekly_visits_label.config(text=f"{weekly_stats['visit_count']} visits")
-            self.weekly_revenue_label.config(text=f"PKR {weekly_stats['revenue']:.2f}")
-            
-            # Update monthly stats
-            monthly_stats = self.patient_model.stats_handler.get_monthly_stats()
-            self.monthly_visits_label.config(text=f"{monthly_stats['visit_count']} visits")
-            self.monthly_revenue_label.config(text=f"PKR {monthly_stats['revenue']:.2f}")
-            
-            logger.info("Updated stats bar")
-            
-        except Exception as e:
-            logger.error(f"Error updating stats bar: {e}")
+        self.stats_counter.update_stats()
     
     def _create_status_bar(self):
         """Create the status bar"""
@@ -315,7 +278,7 @@ class MainWindow:
         self.status_message.pack(side=tk.LEFT, padx=5)
         
         # Database path label
-        db_path = self.settings.get_excel_path()
+        db_path = self.patient_model.store.storage_path
         self.db_path_label = ttk.Label(self.status_bar, text=f"Database: {db_path}", anchor=tk.E)
         self.db_path_label.pack(side=tk.RIGHT, padx=5)
     
@@ -340,12 +303,12 @@ class MainWindow:
         """
         Handle patient save
         
+        The views and the stats bar update themselves from the model's
+        change events, so only the status is set here.
+        
         Args:
             patient_data (dict): Saved patient data
         """
-        # Refresh appointment view if necessary
-        self.appointment_view.refresh()
-        
         # Update status
         self.status_message.config(text=f"Saved patient: {patient_data.get('first_name', '')} {patient_data.get('last_name', '')}")
     
@@ -378,13 +341,73 @@ class MainWindow:
     def _on_backup_database(self):
         """Handle backup database command"""
         try:
-            # Use the Excel handler to create a backup
-            self.patient_model.excel_handler._create_backup()
+            # Use the patient store to create a backup
+            self.patient_model.create_backup()
             messagebox.showinfo("Backup Created", "Database backup created successfully.")
         except Exception as e:
             logger.error(f"Error creating backup: {e}")
             messagebox.showerror("Backup Error", f"Error creating backup: {e}")
     
+    def _on_restore_backup(self):
+        """Handle restore backup command"""
+        earliest = self.patient_model.store.backup_manager.get_earliest_restore_point() \
+            if self.patient_model.store.backup_manager else None
+        if earliest is None:
+            messagebox.showinfo("Restore Backup", "No backups are available yet.")
+            return
+        
+        answer = simpledialog.askstring(
+            "Restore Backup",
+            f"Restore data as it was at (YYYY-MM-DD HH:MM).\n"
+            f"Backups are available from {earliest.strftime('%Y-%m-%d %H:%M')}.",
+            initialvalue=datetime.now().strftime('%Y-%m-%d %H:%M'),
+            parent=self.root
+        )
+        if not answer:
+            return
+        
+        try:
+            point_in_time = datetime.strptime(answer.strip(), '%Y-%m-%d %H:%M')
+        except ValueError:
+            messagebox.showerror("Restore Error", "Please enter the time as YYYY-MM-DD HH:MM.")
+            return
+        
+        # Restores go to a separate workbook; the live data is left untouched
+        export_path = filedialog.asksaveasfilename(
+            title="Save Restored Patients",
+            defaultextension=".xlsx",
+            initialfile=f"patients_restored_{point_in_time.strftime('%Y%m%d_%H%M')}.xlsx",
+            filetypes=[("Excel files", "*.xlsx")]
+        )
+        if not export_path:
+            return
+        
+        try:
+            # Include changes saved during the chosen minute
+            patient_count = self.patient_model.restore_backup(point_in_time.replace(second=59), export_path)
+            messagebox.showinfo("Restore Complete", f"Restored {patient_count} patients to {export_path}")
+            self.status_message.config(text=f"Restored backup to {export_path}")
+        except Exception as e:
+            logger.error(f"Error restoring backup: {e}")
+            messagebox.showerror("Restore Error", f"Error restoring backup: {e}")
+    
+    def _on_export_to_excel(self):
+        """Handle export to Excel command"""
+        export_path = filedialog.asksaveasfilename(
+            title="Export Patients to Excel",
+            defaultextension=".xlsx",
+            initialfile=f"patients_export_{datetime.now().strftime('%Y%m%d')}.xlsx",
+            filetypes=[("Excel files", "*.xlsx")]
+        )
+        if not export_path:
+            return
+        
+        if self.patient_model.export_to_excel(export_path):
+            messagebox.showinfo("Export Complete", f"Patients exported to {export_path}")
+            self.status_message.config(text=f"Exported patients to {export_path}")
+        else:
+            messagebox.showerror("Export Error", "Failed to export patients to Excel.")
+    
     def _on_view_today(self):
         """Handle view today's appointments command"""
         today = datetime.now().strftime('%Y-%m-%d')
@@ -412,10 +435,6 @@ class MainWindow:
         # Update window title
         self.root.title(self.settings.get('app_name', 'Clinic Receptionist'))
         
-        # Update database path label
-        db_path = self.settings.get_excel_path()
-        self.db_path_label.config(text=f"Database: {db_path}")
-        
         # Refresh patient form if it exists
         if hasattr(self, 'patient_form'):
             # Update doctor list in the patient form
@@ -460,11 +479,11 @@ class MainWindow:
     
     def _on_refresh(self):
         """Handle refresh command"""
-        # Refresh appointment view
+        # Refresh the changed rows of the appointment view
         self.appointment_view.refresh()
         
-        # Refresh search results if showing all patients
-        self.search_panel.show_all_patients()
+        # Refresh the rows on screen in the search panel
+        self.search_panel.refresh()
         
         # Refresh stats bar
         self._update_stats_bar()
@@ -474,6 +493,9 @@ class MainWindow:
     
     def _on_refresh_stats(self):
         """Handle refresh stats command"""
+        # Recount from the data file, picking up changes made outside the application
+        self.patient_model.rebuild_statistics()
+        
         # Update the stats bar
         self._update_stats_bar()
         
@@ -516,12 +538,49 @@ class MainWindow:
         # Update status
         self.status_message.config(text="Viewing statistics")
     
+    def _check_external_changes(self):
+        """Read other workstations' changes on a worker thread"""
+        threading.Thread(target=self._external_changes_worker, name='external-changes', daemon=True).start()
+    
+    def _external_changes_worker(self):
+        """Poll the store, which may parse the data file again (runs on a worker thread)"""
+        try:
+            changes = self.patient_model.poll_external_changes()
+        except Exception as e:
+            logger.error(f"Error checking for external changes: {e}")
+            changes = []
+        
+        try:
+            # Tk widgets may only be touched from the Tk thread
+            self.root.after(0, self._on_external_changes, changes)
+        except (RuntimeError, tk.TclError):
+            # The window was closed while the store was read
+            pass
+    
+    def _on_external_changes(self, changes):
+        """
+        Apply other workstations' changes, then check again after the interval
+        
+        Args:
+            changes (list): Changes read by the worker, None if the store reloaded
+        """
+        try:
+            if self.patient_model.publish_external_changes(changes):
+                self._on_refresh()
+        except Exception as e:
+            logger.error(f"Error applying external changes: {e}")
+        
+        self.root.after(self._external_check_interval, self._check_external_changes)
+    
     def _on_close(self):
         """Handle window close event"""
         # Clean up resources
         if hasattr(self, 'patient_form'):
             self.patient_form.cleanup()
         
+        # Close the patient store
+        self.patient_model.close()
+        
         # Close the window
         self.root.destroy()
     
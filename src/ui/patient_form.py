@@ -10,7 +10,6 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
 from tkcalendar import DateEntry
-import pandas as pd
 
 logger = logging.getLogger('receptionist.patient_form')
 
@@ -40,6 +39,9 @@ class PatientForm:
         # Current patient data
         self.current_patient = None
         
+        # Token number shown by set_next_token_number(), not yet given out
+        self._token_preview = None
+        
         # Create the UI
         self._create_ui()
     
@@ -298,37 +300,28 @@ class PatientForm:
     def set_next_token_number(self):
         """
         Set the next token number for today's date
+        
+        The number shown is a preview from the shared token counter. If it
+        is still unchanged when the patient is saved, the store gives out
+        the token instead, so two quick saves never share a number.
         """
         try:
             # Get today's date
             today = datetime.now().strftime('%Y-%m-%d')
             
-            # Get today's appointments
-            today_appointments = self.patient_model.get_appointments_for_date(today)
-            
-            # Find the highest token number
-            if not today_appointments.empty and 'token_number' in today_appointments.columns:
-                # Convert to numeric, ignoring errors
-                today_appointments['token_number_numeric'] = pd.to_numeric(today_appointments['token_number'], errors='coerce')
-                # Get the maximum, defaulting to 0 if all are NaN
-                current_max = today_appointments['token_number_numeric'].max()
-                # If max is NaN, start from 0
-                if pd.isna(current_max):
-                    current_max = 0
-                # Set the next token number
-                next_token = int(current_max) + 1
-            else:
-                # Start from 1 if no appointments today
-                next_token = 1
+            # Peek at the counter without reading today's appointments
+            next_token = self.patient_model.get_next_token_number(today)
             
             # Set the token number
-            self.token_number_var.set(str(next_token))
+            self.token_number_var.set(next_token)
+            self._token_preview = next_token
             logger.info(f"Set next token number to {next_token} for date {today}")
             
         except Exception as e:
             logger.error(f"Error setting next token number: {e}")
             # Default to empty if there's an error
             self.token_number_var.set("")
+            self._token_preview = ""
     
     def load_patient(self, patient_data):
         """
@@ -558,22 +551,41 @@ class PatientForm:
         
         try:
             if self.current_patient and self.current_patient.get('patient_id'):
-                # Update existing patient
+                # Update existing patient, unless another workstation changed it
+                # after it was loaded into the form
                 patient_id = self.current_patient.get('patient_id')
-                success = self.patient_model.update_patient(patient_id, form_data)
+                loaded_version = self.current_patient.get('version', '')
+                form_data['version'] = loaded_version
+                success = self.patient_model.update_patient(patient_id, form_data, self._on_write_completed)
                 
                 if success:
                     messagebox.showinfo("Success", "Patient updated successfully.")
                     logger.info(f"Updated patient: {patient_id}")
                     
+                    # The saved row has a new version; a second save starts from it
+                    self.current_patient = self.patient_model.get_patient_by_id(patient_id) or self.current_patient
+                    
                     # Call the callback if provided
                     if self.on_save_callback:
                         self.on_save_callback(form_data)
                 else:
-                    messagebox.showerror("Error", "Failed to update patient.")
+                    latest = self.patient_model.get_patient_by_id(patient_id)
+                    if latest and str(latest.get('version', '')) != str(loaded_version):
+                        messagebox.showwarning(
+                            "Patient Changed",
+                            "This patient was changed on another workstation. The form now shows "
+                            "the saved details; please make your changes again."
+                        )
+                        self.load_patient(latest)
+                    else:
+                        messagebox.showerror("Error", "Failed to update patient.")
             else:
+                # An untouched preview is given out by the store when saving
+                if form_data['token_number'] == self._token_preview:
+                    form_data['token_number'] = ''
+                
                 # Add new patient
-                success = self.patient_model.add_patient(form_data)
+                success = self.patient_model.add_patient(form_data, self._on_write_completed)
                 
                 if success:
                     messagebox.showinfo("Success", "Patient added successfully.")
@@ -594,6 +606,21 @@ class PatientForm:
             logger.error(f"Error saving patient: {e}")
             messagebox.showerror("Error", f"An error occurred: {e}")
     
+    def _on_write_completed(self, success):
+        """
+        Handle the background write of a saved patient finishing
+        
+        Args:
+            success (bool): Whether the patient was written to disk
+        """
+        if not success:
+            logger.error("Saved patient could not be written to disk")
+            messagebox.showerror(
+                "Save Error",
+                "The patient could not be written to disk and has not been kept.\n\n"
+                "Please check the data folder and save the patient again."
+            )
+    
     def print_reception_slip(self):
         """Print a reception slip for the current patient"""
         # Make sure we have a patient ID or at least allow printing without saving first
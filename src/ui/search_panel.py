@@ -6,9 +6,13 @@ Provides search functionality for patients
 """
 
 import logging
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
 
+from models.events import PatientAdded, PatientDeleted
+from ui.virtual_tree import VirtualTreeview
+
 logger = logging.getLogger('receptionist.search_panel')
 
 class SearchPanel:
@@ -17,6 +21,12 @@ class SearchPanel:
     Provides search functionality for patients
     """
     
+    # Most matches shown for one search, best first
+    MAX_RESULTS = 100
+    
+    # Pause in typing before a search starts
+    SEARCH_DELAY_MS = 150
+    
     def __init__(self, parent, patient_model, on_patient_selected=None):
         """
         Initialize the Search Panel
@@ -30,11 +40,28 @@ class SearchPanel:
         self.patient_model = patient_model
         self.on_patient_selected = on_patient_selected
         
+        # Search-as-you-type state: the pending after() id, the number of the
+        # newest search, and the one search waiting for the worker thread
+        self._search_after_id = None
+        self._search_generation = 0
+        self._pending_search = None
+        self._search_condition = threading.Condition()
+        
+        # Searches run on one background thread so typing never waits for them
+        self._search_thread = threading.Thread(target=self._search_worker, name='patient-search', daemon=True)
+        self._search_thread.start()
+        
+        # Rows of the search results on screen, or None while all patients are shown
+        self._results = None
+        
         # Create the UI
         self._create_ui()
         
         # Show all patients by default
         self.show_all_patients()
+        
+        # Keep the list current as patients are saved and deleted
+        self.patient_model.events.subscribe(self._on_patient_changed)
     
     def _create_ui(self):
         """Create the user interface"""
@@ -63,6 +90,9 @@ class SearchPanel:
         # Bind Enter key to search
         self.search_entry.bind("<Return>", lambda event: self._on_search())
         
+        # Search as the user types
+        self.search_var.trace_add('write', self._on_search_text_changed)
+        
         # Search Results
         self.results_frame = ttk.Frame(self.frame)
         self.results_frame.grid(row=1, column=0, columnspan=4, sticky='nsew', padx=5, pady=5)
@@ -71,11 +101,10 @@ class SearchPanel:
         self.results_frame.columnconfigure(0, weight=1)
         self.results_frame.rowconfigure(0, weight=1)
         
-        # Create the treeview for search results
-        self.results_tree = ttk.Treeview(
+        # Create the treeview for search results; it only holds the rows on screen
+        self.results_tree = VirtualTreeview(
             self.results_frame,
             columns=("ID", "Token", "Name", "Status", "Doctor", "Date", "Arrival", "Fees"),
-            show="headings",
             height=5
         )
         
@@ -99,27 +128,101 @@ class SearchPanel:
         self.results_tree.column("Arrival", width=60)
         self.results_tree.column("Fees", width=60)
         
-        # Add a scrollbar
-        scrollbar = ttk.Scrollbar(self.results_frame, orient="vertical", command=self.results_tree.yview)
-        self.results_tree.configure(yscrollcommand=scrollbar.set)
-        
-        # Pack the treeview and scrollbar
+        # Pack the treeview, which brings its own scrollbar
         self.results_tree.grid(row=0, column=0, sticky='nsew')
-        scrollbar.grid(row=0, column=1, sticky='ns')
+        
+        # Number of patients shown, or why none are
+        self.result_count_label = ttk.Label(self.frame, text="")
+        self.result_count_label.grid(row=2, column=0, columnspan=2, sticky='w', padx=5, pady=5)
         
         # Add the delete button
         self.delete_button = ttk.Button(self.frame, text="Delete Selected Patient", command=self._on_delete_selected)
-        self.delete_button.grid(row=2, column=0, columnspan=4, sticky='e', padx=5, pady=5)
+        self.delete_button.grid(row=2, column=2, columnspan=2, sticky='e', padx=5, pady=5)
         
         # Bind selection event
-        self.results_tree.bind("<<TreeviewSelect>>", self._on_result_selected)
+        self.results_tree.bind_select(self._on_result_selected)
     
     def _on_search(self):
         """Handle search button click"""
+        self._start_search(explicit=True)
+    
+    def _on_search_text_changed(self, *args):
+        """Restart the debounce timer on every keystroke"""
+        self._cancel_scheduled_search()
+        self._search_after_id = self.frame.after(self.SEARCH_DELAY_MS, self._start_search)
+    
+    def _cancel_scheduled_search(self):
+        """Cancel a search that is waiting for the debounce timer"""
+        if self._search_after_id is not None:
+            self.frame.after_cancel(self._search_after_id)
+            self._search_after_id = None
+    
+    def _start_search(self, explicit=False):
+        """
+        Hand the current search text to the worker thread
+        
+        A newer search replaces one that has not started yet, and the
+        results of any older search are thrown away when they arrive.
+        
+        Args:
+            explicit (bool, optional): True for Enter or the Search button,
+                which report an empty result in a message box. Defaults to False.
+        """
+        self._cancel_scheduled_search()
         search_text = self.search_var.get().strip()
         
-        # Search for patients by name
-        results = self.patient_model.search_patients_by_name(search_text)
+        # Clearing the box lists everyone, paged from the store, rather than
+        # searching for nothing
+        if not search_text:
+            self.show_all_patients()
+            return
+        
+        with self._search_condition:
+            self._search_generation += 1
+            self._pending_search = (self._search_generation, search_text, explicit)
+            self._search_condition.notify()
+        
+        self.result_count_label.config(text="Searching...")
+    
+    def _search_worker(self):
+        """Run searches off the Tk thread, always the newest one first"""
+        while True:
+            with self._search_condition:
+                while self._pending_search is None:
+                    self._search_condition.wait()
+                generation, search_text, explicit = self._pending_search
+                self._pending_search = None
+            
+            try:
+                # Search for patients by name through the store's name index
+                results = self.patient_model.search_patients_by_name(search_text, self.MAX_RESULTS)
+            except Exception as e:
+                logger.error(f"Error searching patients: {e}")
+                continue
+            
+            if generation != self._search_generation:
+                continue
+            
+            try:
+                # Tk widgets may only be touched from the Tk thread
+                self.frame.after(0, self._on_search_results, generation, search_text, explicit, results)
+            except (RuntimeError, tk.TclError):
+                # The window was closed while the search ran
+                return
+    
+    def _on_search_results(self, generation, search_text, explicit, results):
+        """
+        Show the results of a finished search
+        
+        Args:
+            generation (int): Number of the search
+            search_text (str): Text that was searched for
+            explicit (bool): True if the search came from Enter or the Search button
+            results (pandas.DataFrame): Search results
+        """
+        # A newer search has started since this one was queued
+        if generation != self._search_generation:
+            return
         
         # Display the results
         self._display_results(results)
@@ -127,25 +230,17 @@ class SearchPanel:
         # Update the results label
         if search_text:
             if len(results) == 0:
-                messagebox.showinfo("Search Results", "No patients found matching your search.")
+                self.result_count_label.config(text="No patients found")
+                if explicit:
+                    messagebox.showinfo("Search Results", "No patients found matching your search.")
     
-    def _on_result_selected(self, event):
+    def _on_result_selected(self, patient_id):
         """
         Handle selection of a search result
         
         Args:
-            event: Treeview selection event
+            patient_id (str): Patient ID of the selected row
         """
-        # Get the selected item
-        selection = self.results_tree.selection()
-        
-        if not selection:
-            return
-        
-        # Get the patient ID from the selected item
-        item = self.results_tree.item(selection[0])
-        patient_id = item['values'][0]
-        
         # Get the patient data
         patient_data = self.patient_model.get_patient_by_id(patient_id)
         
@@ -162,9 +257,8 @@ class SearchPanel:
             return
         
         # Get the patient info from the selected item
-        item = self.results_tree.item(selection[0])
-        patient_id = item['values'][0]
-        patient_name = item['values'][2]
+        patient_id = selection[0]
+        patient_name = self.results_tree.item_values(patient_id)[2]
         
         # Confirm deletion
         confirm = messagebox.askyesno(
@@ -178,12 +272,57 @@ class SearchPanel:
             success = self.patient_model.delete_patient(patient_id)
             
             if success:
+                # The list drops the row when the model reports the deletion
                 messagebox.showinfo("Success", f"Patient {patient_name} has been deleted.")
-                # Refresh the list
-                self.show_all_patients()
             else:
                 messagebox.showerror("Error", f"Failed to delete patient {patient_name}.")
     
+    def _row_values(self, row):
+        """
+        Get the values shown for a patient row
+        
+        Args:
+            row (dict): Patient data
+            
+        Returns:
+            tuple: Column values
+        """
+        # Get patient name
+        name = f"{row.get('first_name', '')} {row.get('last_name', '')}"
+        
+        # Format fees
+        fees = row.get('fees', '')
+        if fees:
+            fees = f"PKR {fees}"
+        
+        return (
+            row.get('patient_id', ''),
+            row.get('token_number', ''),
+            name,
+            row.get('status', ''),
+            row.get('doctor_name', ''),
+            row.get('appointment_date', ''),
+            row.get('arrival_time', ''),
+            fees
+        )
+    
+    def _to_rows(self, df):
+        """
+        Turn patient rows into (patient ID, values) rows for the tree
+        
+        Args:
+            df (pandas.DataFrame): Patient rows
+            
+        Returns:
+            list: (patient ID, values) tuples
+        """
+        return [(row.get('patient_id', ''), self._row_values(row)) for row in df.to_dict('records')]
+    
+    def _update_count_label(self):
+        """Show how many patients are listed"""
+        count = self.results_tree.get_row_count()
+        self.result_count_label.config(text=f"{count} patient{'s' if count != 1 else ''}")
+    
     def _display_results(self, results):
         """
         Display search results in the treeview
@@ -191,42 +330,69 @@ class SearchPanel:
         Args:
             results (pandas.DataFrame): Search results
         """
-        # Clear the treeview
-        for item in self.results_tree.get_children():
-            self.results_tree.delete(item)
+        self._results = self._to_rows(results)
+        self.results_tree.set_source(
+            lambda: len(self._results),
+            lambda start, count: self._results[start:start + count]
+        )
+        self._update_count_label()
+    
+    def _on_patient_changed(self, event):
+        """
+        Update the list for a patient change
         
-        # Add the results to the treeview
-        for _, row in results.iterrows():
-            # Get patient name
-            name = f"{row.get('first_name', '')} {row.get('last_name', '')}"
-            
-            # Format fees
-            fees = row.get('fees', '')
-            if fees:
-                fees = f"PKR {fees}"
+        While all patients are shown only the rows on screen are read again.
+        Search results keep their matches: changed rows are updated in
+        place, deleted ones removed, and new patients are not added until
+        the next search.
+        
+        Args:
+            event (PatientEvent): Change published by the patient model
+        """
+        if isinstance(event, PatientDeleted) and self.results_tree.selection() == (event.patient_id,):
+            self.results_tree.clear_selection()
+        
+        if self._results is not None:
+            if isinstance(event, PatientAdded):
+                return
             
-            self.results_tree.insert(
-                "",
-                "end",
-                values=(
-                    row.get('patient_id', ''),
-                    row.get('token_number', ''),
-                    name,
-                    row.get('status', ''),
-                    row.get('doctor_name', ''),
-                    row.get('appointment_date', ''),
-                    row.get('arrival_time', ''),
-                    fees
-                )
-            )
+            for position, (patient_id, _) in enumerate(self._results):
+                if patient_id == event.patient_id:
+                    if event.new is None:
+                        del self._results[position]
+                    else:
+                        self._results[position] = (patient_id, self._row_values(event.new))
+                    break
+            else:
+                return
+        
+        self.results_tree.refresh()
+        self._update_count_label()
+    
+    def refresh(self):
+        """Read the rows on screen again, or repeat the current search"""
+        if self._results is None:
+            self.results_tree.refresh()
+            self._update_count_label()
+        else:
+            self._start_search()
     
     def show_all_patients(self):
         """Show all patients in the search results"""
         # Clear the search field
         self.search_var.set("")
         
-        # Get all patients
-        results = self.patient_model.get_all_patients()
-        
-        # Display the results
-        self._display_results(results)
\ No newline at end of file
+        # Clearing the field queues a search; showing everything makes it redundant
+        self._cancel_scheduled_search()
+        with self._search_condition:
+            self._search_generation += 1
+            self._pending_search = None
+        
+        # Page through all patients from the store as the list is scrolled,
+        # instead of loading and inserting every row
+        self._results = None
+        self.results_tree.set_source(
+            self.patient_model.get_patient_count,
+            lambda start, count: self._to_rows(self.patient_model.get_patients_slice(start, count))
+        )
+        self._update_count_label()
\ No newline at end of file
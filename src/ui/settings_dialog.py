@@ -50,6 +50,8 @@ class SettingsDialog:
         self.clinic_phone_var = tk.StringVar(value=settings.get("clinic_phone", ""))
         self.data_path_var = tk.StringVar(value=settings.get("data_path", "./data"))
         self.excel_file_var = tk.StringVar(value=settings.get("excel_file", "patients.xlsx"))
+        self.storage_backend_var = tk.StringVar(value=settings.get("storage_backend", "excel"))
+        self.server_address_var = tk.StringVar(value=settings.get("server_address", "127.0.0.1:8765"))
         self.backup_interval_var = tk.StringVar(value=str(settings.get("backup_interval_days", 7)))
         self.auto_backup_var = tk.BooleanVar(value=settings.get("auto_backup", True))
         self.logo_path_var = tk.StringVar(value=settings.get("logo_path", ""))
@@ -240,6 +242,30 @@ class SettingsDialog:
         excel_file_entry = ttk.Entry(frame, textvariable=self.excel_file_var)
         excel_file_entry.grid(row=row, column=1, sticky='ew', padx=5, pady=5)
         
+        # Storage Backend
+        row += 1
+        ttk.Label(frame, text="Storage Backend:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+        storage_backend_combo = ttk.Combobox(
+            frame,
+            textvariable=self.storage_backend_var,
+            values=["excel", "sqlite", "remote"],
+            state="readonly"
+        )
+        storage_backend_combo.grid(row=row, column=1, sticky='w', padx=5, pady=5)
+        
+        # Data Server, used by the remote backend
+        row += 1
+        ttk.Label(frame, text="Data Server (host:port):").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+        server_address_entry = ttk.Entry(frame, textvariable=self.server_address_var)
+        server_address_entry.grid(row=row, column=1, sticky='ew', padx=5, pady=5)
+        
+        row += 1
+        ttk.Label(
+            frame,
+            text="Changing the storage backend takes effect after restarting the application.",
+            font=('TkDefaultFont', 8, 'italic')
+        ).grid(row=row, column=1, sticky='w', padx=5)
+        
         # Backup Interval
         row += 1
         ttk.Label(frame, text="Backup Interval (days):").grid(row=row, column=0, sticky='w', padx=5, pady=5)
@@ -289,6 +315,8 @@ class SettingsDialog:
             self.settings.set("clinic_phone", self.clinic_phone_var.get())
             self.settings.set("data_path", self.data_path_var.get())
             self.settings.set("excel_file", self.excel_file_var.get())
+            self.settings.set("storage_backend", self.storage_backend_var.get())
+            self.settings.set("server_address", self.server_address_var.get().strip())
             
             # Convert numeric values
             try:
@@ -8,7 +8,6 @@ Displays statistics in the top bar
 import logging
 import tkinter as tk
 from tkinter import ttk
-from datetime import datetime
 
 logger = logging.getLogger('receptionist.stats_counter')
 
@@ -18,26 +17,34 @@ class StatsCounter:
     Displays patient visit and revenue statistics in the top bar
     """
     
-    def __init__(self, parent, patient_model):
+    def __init__(self, parent, patient_model, on_refresh=None):
         """
         Initialize the Stats Counter
         
         Args:
             parent: Parent widget
             patient_model: PatientModel instance
+            on_refresh (callable, optional): Called by the refresh button.
+                Defaults to update_stats.
         """
         self.parent = parent
         self.patient_model = patient_model
+        self.on_refresh = on_refresh or self.update_stats
         self.frame = ttk.Frame(parent)
         
-        # Use the stats handler from the patient model
-        self.stats_handler = patient_model.stats_handler
+        # Current figures are cached by the model's stats provider, shared
+        # with the statistics window
+        self.stats_provider = patient_model.stats_provider
         
         # Create the UI
         self._create_ui()
         
         # Initial update
         self.update_stats()
+        
+        # The provider has already dropped its cache when a change reaches us
+        self._unsubscribe = patient_model.events.subscribe(self._on_patient_changed)
+        self.frame.bind("<Destroy>", self._on_destroy)
     
     def _create_ui(self):
         """Create the user interface"""
@@ -86,28 +93,27 @@ class StatsCounter:
         self.monthly_revenue_label.pack(side=tk.LEFT, padx=5)
         
         # Refresh button
-        self.refresh_btn = ttk.Button(self.stats_frame, text="↻", width=2, command=self.update_stats)
+        self.refresh_btn = ttk.Button(self.stats_frame, text="↻", width=2, command=lambda: self.on_refresh())
         self.refresh_btn.pack(side=tk.RIGHT, padx=5, pady=2)
     
     def update_stats(self):
         """Update the statistics"""
         try:
-            # Get current date
-            now = datetime.now()
-            today = now.strftime('%Y-%m-%d')
+            # Get today's, this week's and this month's stats in one read
+            current = self.stats_provider.get_current_stats()
             
             # Get daily stats
-            daily_stats = self.stats_handler.get_daily_stats(today)
+            daily_stats = current['daily']
             self.daily_visits_label.config(text=f"{daily_stats['visit_count']} visits")
             self.daily_revenue_label.config(text=f"PKR {daily_stats['revenue']:.2f}")
             
             # Get weekly stats
-            weekly_stats = self.stats_handler.get_weekly_stats()
+            weekly_stats = current['weekly']
             self.weekly_visits_label.config(text=f"{weekly_stats['visit_count']} visits")
             self.weekly_revenue_label.config(text=f"PKR {weekly_stats['revenue']:.2f}")
             
             # Get monthly stats
-            monthly_stats = self.stats_handler.get_monthly_stats()
+            monthly_stats = current['monthly']
             self.monthly_visits_label.config(text=f"{monthly_stats['visit_count']} visits")
             self.monthly_revenue_label.config(text=f"PKR {monthly_stats['revenue']:.2f}")
             
@@ -116,4 +122,23 @@ class StatsCounter:
                        f"Monthly={monthly_stats['visit_count']} visits/PKR{monthly_stats['revenue']:.2f}")
             
         except Exception as e:
-            logger.error(f"Error updating stats: {e}") 
\ No newline at end of file
+            logger.error(f"Error updating stats: {e}")
+    
+    def _on_patient_changed(self, event):
+        """
+        Update the counters for a patient change
+        
+        Args:
+            event (PatientEvent): Change published by the patient model
+        """
+        self.update_stats()
+    
+    def _on_destroy(self, event):
+        """
+        Stop listening for patient changes when the counter is destroyed
+        
+        Args:
+            event: Destroy event
+        """
+        if event.widget is self.frame:
+            self._unsubscribe()
\ No newline at end of file
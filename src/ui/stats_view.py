@@ -9,6 +9,7 @@ import logging
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger('receptionist.stats_view')
 
@@ -33,6 +34,23 @@ class StatsView:
         
         # Use the stats handler from the patient model
         self.stats_handler = patient_model.stats_handler
+        # Today's, this week's and this month's figures come from the cache
+        # the stats bar reads, so opening this window does not recompute them
+        self.stats_provider = patient_model.stats_provider
+        
+        # Periods on screen, and those a patient change has made out of date
+        self._shown_day = None
+        self._shown_week = None
+        self._shown_month = None
+        self._shown_range = None
+        self._stale_periods = set()
+        self._stale_after_id = None
+        
+        # Statistics are computed off the Tk thread; each period keeps the
+        # number of its newest request and the future computing it
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='stats')
+        self._generations = {}
+        self._futures = {}
         
         # Set default window properties
         if isinstance(parent, tk.Toplevel):
@@ -48,8 +66,12 @@ class StatsView:
         # Create the UI
         self._create_ui()
         
-        # Initial update with loading indicator
-        self.parent.after(100, self.update_stats)  # Short delay before loading data
+        # Initial update; each tab fills in as its figures arrive
+        self.update_stats()
+        
+        # Recalculate a period when a patient in it changes, until the window closes
+        self._unsubscribe = patient_model.events.subscribe(self._on_patient_changed)
+        self.frame.bind("<Destroy>", self._on_destroy)
     
     def _create_ui(self):
         """Create the user interface"""
@@ -387,6 +409,134 @@ class StatsView:
         # Pack the Treeview and scrollbar
         self.monthly_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         monthly_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        # Date range tab: any range compared with the same dates a year earlier
+        range_tab = ttk.Frame(self.notebook, padding=10)
+        self.notebook.add(range_tab, text="Date Range")
+        range_tab.columnconfigure(0, weight=1)
+        range_tab.rowconfigure(0, weight=0)  # Controls
+        range_tab.rowconfigure(1, weight=1)  # Table
+        
+        # Range controls
+        range_info_frame = ttk.Frame(range_tab, padding=5)
+        range_info_frame.grid(row=0, column=0, sticky='ew', padx=5, pady=5)
+        
+        range_info_border = ttk.LabelFrame(range_info_frame, text="Date Range")
+        range_info_border.pack(fill='x', expand=True)
+        
+        info_content = ttk.Frame(range_info_border, padding=10)
+        info_content.pack(fill='x')
+        
+        now = datetime.now()
+        self.range_start_var = tk.StringVar(value=now.strftime('%Y-01-01'))
+        self.range_end_var = tk.StringVar(value=now.strftime('%Y-%m-%d'))
+        
+        ttk.Label(info_content, text="From:", font=('Arial', 10, 'bold')).pack(side=tk.LEFT)
+        ttk.Entry(info_content, textvariable=self.range_start_var, width=12).pack(side=tk.LEFT, padx=(5, 10))
+        ttk.Label(info_content, text="To:", font=('Arial', 10, 'bold')).pack(side=tk.LEFT)
+        ttk.Entry(info_content, textvariable=self.range_end_var, width=12).pack(side=tk.LEFT, padx=(5, 10))
+        ttk.Button(info_content, text="Apply", width=8, command=self._on_range_change).pack(side=tk.LEFT)
+        
+        # Range table
+        range_table_frame = ttk.Frame(range_tab)
+        range_table_frame.grid(row=1, column=0, sticky='nsew', padx=5, pady=5)
+        
+        range_table_border = ttk.LabelFrame(range_table_frame, text="Range Metrics")
+        range_table_border.pack(fill='both', expand=True, padx=2, pady=2)
+        
+        range_table_container = ttk.Frame(range_table_border, padding=10)
+        range_table_container.pack(fill='both', expand=True)
+        
+        self.range_tree = ttk.Treeview(
+            range_table_container,
+            columns=("metric", "value", "previous", "change"),
+            show="headings",
+            style="Treeview"
+        )
+        self.range_tree.heading("metric", text="Metric")
+        self.range_tree.heading("value", text="Selected Range")
+        self.range_tree.heading("previous", text="Year Before")
+        self.range_tree.heading("change", text="Change")
+        self.range_tree.column("metric", width=200, anchor='w')
+        self.range_tree.column("value", width=150, anchor='e')
+        self.range_tree.column("previous", width=150, anchor='e')
+        self.range_tree.column("change", width=100, anchor='e')
+        
+        range_scrollbar = ttk.Scrollbar(range_table_container, orient="vertical", command=self.range_tree.yview)
+        self.range_tree.configure(yscrollcommand=range_scrollbar.set)
+        
+        self.range_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        range_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        # Breakdown tabs for the same date range
+        self.doctor_range_label, self.doctor_tree = self._create_breakdown_tab("By Doctor", "Doctor")
+        self.hour_range_label, self.hour_tree = self._create_breakdown_tab("By Hour", "Arrival Hour")
+    
+    def _create_breakdown_tab(self, title, group_heading):
+        """
+        Create a tab listing visits and revenue per group
+        
+        Args:
+            title (str): Tab title
+            group_heading (str): Heading of the group column
+            
+        Returns:
+            tuple: (range label, Treeview) of the tab
+        """
+        tab = ttk.Frame(self.notebook, padding=10)
+        self.notebook.add(tab, text=title)
+        tab.columnconfigure(0, weight=1)
+        tab.rowconfigure(0, weight=0)  # Info
+        tab.rowconfigure(1, weight=1)  # Table
+        
+        # Info frame showing the range of the Date Range tab
+        info_frame = ttk.Frame(tab, padding=5)
+        info_frame.grid(row=0, column=0, sticky='ew', padx=5, pady=5)
+        
+        info_border = ttk.LabelFrame(info_frame, text="Date Range")
+        info_border.pack(fill='x', expand=True)
+        
+        info_content = ttk.Frame(info_border, padding=10)
+        info_content.pack(fill='x')
+        
+        ttk.Label(info_content, text="Selected Period:", font=('Arial', 10, 'bold')).pack(side=tk.LEFT)
+        range_label = ttk.Label(info_content, text="", font=('Arial', 10), foreground='#0066cc')
+        range_label.pack(side=tk.LEFT, padx=(5, 0))
+        
+        # Table
+        table_frame = ttk.Frame(tab)
+        table_frame.grid(row=1, column=0, sticky='nsew', padx=5, pady=5)
+        
+        table_border = ttk.LabelFrame(table_frame, text=f"Visits {title}")
+        table_border.pack(fill='both', expand=True, padx=2, pady=2)
+        
+        table_container = ttk.Frame(table_border, padding=10)
+        table_container.pack(fill='both', expand=True)
+        
+        tree = ttk.Treeview(
+            table_container,
+            columns=("group", "visits", "new", "old", "revenue"),
+            show="headings",
+            style="Treeview"
+        )
+        tree.heading("group", text=group_heading)
+        tree.heading("visits", text="Visits")
+        tree.heading("new", text="New")
+        tree.heading("old", text="Old")
+        tree.heading("revenue", text="Revenue")
+        tree.column("group", width=200, anchor='w')
+        tree.column("visits", width=80, anchor='e')
+        tree.column("new", width=80, anchor='e')
+        tree.column("old", width=80, anchor='e')
+        tree.column("revenue", width=150, anchor='e')
+        
+        scrollbar = ttk.Scrollbar(table_container, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        return range_label, tree
     
     def _on_daily_date_change(self):
         """Handle daily date change"""
@@ -459,10 +609,92 @@ class StatsView:
             logger.error(f"Invalid date: {e}")
             messagebox.showwarning("Invalid Input", "Please enter valid numbers for year and month.")
     
+    def _on_range_change(self):
+        """Handle date range change"""
+        try:
+            start_date = datetime.strptime(self.range_start_var.get().strip(), '%Y-%m-%d')
+            end_date = datetime.strptime(self.range_end_var.get().strip(), '%Y-%m-%d')
+        except ValueError:
+            messagebox.showwarning("Invalid Date", "Please enter dates as YYYY-MM-DD.")
+            return
+        
+        if end_date < start_date:
+            messagebox.showwarning("Invalid Range", "The end date must not be before the start date.")
+            return
+        
+        # Update stats for this range
+        self._update_range_stats(start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+        
+        # Switch to date range tab
+        self.notebook.select(3)
+    
+    def _compute(self, period, compute, show, *args):
+        """
+        Compute statistics on the worker pool and show them when they arrive
+        
+        A newer request for the same period replaces an older one: the
+        older computation is cancelled if it has not started, and its result
+        is dropped if it has.
+        
+        Args:
+            period (str): Name of the table being filled
+            compute (callable): Called with *args on a worker thread
+            show (callable): Called on the Tk thread with *args and the result
+            *args: Arguments of the request
+        """
+        generation = self._generations.get(period, 0) + 1
+        self._generations[period] = generation
+        
+        previous = self._futures.get(period)
+        if previous is not None:
+            previous.cancel()
+        
+        try:
+            future = self._executor.submit(compute, *args)
+        except RuntimeError:
+            # The window is closing
+            return
+        self._futures[period] = future
+        
+        def on_done(done):
+            if done.cancelled():
+                return
+            try:
+                # Tk widgets may only be touched from the Tk thread
+                self.frame.after(0, self._on_computed, period, generation, show, args, done)
+            except (RuntimeError, tk.TclError):
+                # The window was closed while the statistics were computed
+                pass
+        
+        future.add_done_callback(on_done)
+    
+    def _on_computed(self, period, generation, show, args, future):
+        """
+        Show a finished computation unless a newer one was requested
+        
+        Args:
+            period (str): Name of the table being filled
+            generation (int): Number of the request
+            show (callable): Display function
+            args (tuple): Arguments of the request
+            future (Future): Finished computation
+        """
+        if generation != self._generations.get(period):
+            return
+        self._futures.pop(period, None)
+        
+        try:
+            show(*args, future.result())
+        except Exception as e:
+            logger.error(f"Error updating {period} stats: {e}")
+    
     def _update_daily_stats(self, date):
         """Update daily statistics"""
-        daily_stats = self.stats_handler.get_daily_stats(date)
-        
+        self._shown_day = date
+        self._compute('daily', self.stats_provider.get_daily_stats, self._show_daily_stats, date)
+    
+    def _show_daily_stats(self, date, daily_stats):
+        """Show daily statistics"""
         # Update date label
         formatted_date = datetime.strptime(date, '%Y-%m-%d').strftime('%A, %B %d, %Y')
         self.daily_date_label.config(text=formatted_date)
@@ -494,7 +726,11 @@ class StatsView:
     
     def _update_weekly_stats(self, end_date):
         """Update weekly statistics"""
-        weekly_stats = self.stats_handler.get_weekly_stats(end_date)
+        self._compute('weekly', self.stats_provider.get_weekly_stats, self._show_weekly_stats, end_date)
+    
+    def _show_weekly_stats(self, end_date, weekly_stats):
+        """Show weekly statistics"""
+        self._shown_week = (weekly_stats['start_date'], weekly_stats['end_date'])
         
         # Update range label
         self.weekly_range_label.config(text=f"{weekly_stats['start_date']} to {weekly_stats['end_date']}")
@@ -528,8 +764,11 @@ class StatsView:
     
     def _update_monthly_stats(self, year, month):
         """Update monthly statistics"""
-        monthly_stats = self.stats_handler.get_monthly_stats(year, month)
-        
+        self._shown_month = (year, month)
+        self._compute('monthly', self.stats_provider.get_monthly_stats, self._show_monthly_stats, year, month)
+    
+    def _show_monthly_stats(self, year, month, monthly_stats):
+        """Show monthly statistics"""
         # Get month name
         month_name = datetime(year, month, 1).strftime('%B %Y')
         
@@ -575,16 +814,112 @@ class StatsView:
                 tag = 'projection'
             self.monthly_tree.insert("", "end", values=(metric, value), tags=(tag,))
     
+    def _update_range_stats(self, start_date, end_date):
+        """Update date range statistics, the comparison with a year earlier and the breakdowns"""
+        self._compute('range', self.stats_handler.get_year_over_year, self._show_range_stats, start_date, end_date)
+        self._compute('breakdown', self._compute_breakdowns, self._show_breakdown_stats, start_date, end_date)
+    
+    def _show_range_stats(self, start_date, end_date, comparison):
+        """Show date range statistics and the comparison with a year earlier"""
+        current = comparison['current']
+        previous = comparison['previous']
+        self._shown_range = (start_date, end_date, previous['start_date'], previous['end_date'])
+        
+        # Clear previous data
+        for item in self.range_tree.get_children():
+            self.range_tree.delete(item)
+        
+        # Configure treeview tags for alternating row colors
+        self.range_tree.tag_configure('odd', background='#f5f5f5')
+        self.range_tree.tag_configure('even', background='#ffffff')
+        self.range_tree.tag_configure('highlight', background='#e6f2ff')
+        
+        def average(stats):
+            return f"PKR {stats['revenue'] / stats['visit_count']:.2f}" if stats['visit_count'] > 0 else "PKR 0.00"
+        
+        def percent(change):
+            return f"{change:+.1f}%" if change is not None else "N/A"
+        
+        # Add metrics to table
+        metrics = [
+            ("Date Range", f"{start_date} to {end_date}", f"{previous['start_date']} to {previous['end_date']}", ""),
+            ("Total Patient Visits", current['visit_count'], previous['visit_count'], percent(comparison['visit_change'])),
+            ("Total Revenue", f"PKR {current['revenue']:.2f}", f"PKR {previous['revenue']:.2f}", percent(comparison['revenue_change'])),
+            ("Average Revenue per Visit", average(current), average(previous), ""),
+            ("New Patients", current['new_count'], previous['new_count'], ""),
+            ("Old Patients", current['old_count'], previous['old_count'], "")
+        ]
+        
+        # Insert with alternating colors
+        for i, values in enumerate(metrics):
+            tag = 'even' if i % 2 == 0 else 'odd'
+            # Highlight revenue rows
+            if "Revenue" in values[0]:
+                tag = 'highlight'
+            self.range_tree.insert("", "end", values=values, tags=(tag,))
+    
+    def _compute_breakdowns(self, start_date, end_date):
+        """
+        Compute the per-doctor and per-hour summaries of a date range
+        
+        Returns:
+            tuple: (per-doctor, per-hour) DataFrames
+        """
+        return (
+            self.stats_handler.get_breakdown_summary(start_date, end_date, ['doctor_name']),
+            self.stats_handler.get_breakdown_summary(start_date, end_date, ['hour'])
+        )
+    
+    def _show_breakdown_stats(self, start_date, end_date, summaries):
+        """Show the per-doctor and per-hour tabs for a date range"""
+        for label, tree, summary, group_label in (
+            (self.doctor_range_label, self.doctor_tree, summaries[0], lambda doctor: doctor or "(none)"),
+            (self.hour_range_label, self.hour_tree, summaries[1], self._hour_label)
+        ):
+            label.config(text=f"{start_date} to {end_date}")
+            
+            # Clear previous data
+            for item in tree.get_children():
+                tree.delete(item)
+            
+            tree.tag_configure('odd', background='#f5f5f5')
+            tree.tag_configure('even', background='#ffffff')
+            
+            for i, (group, row) in enumerate(summary.iterrows()):
+                tree.insert("", "end", values=(
+                    group_label(group),
+                    int(row['visit_count']),
+                    int(row['new_count']),
+                    int(row['old_count']),
+                    f"PKR {row['revenue']:.2f}"
+                ), tags=('even' if i % 2 == 0 else 'odd',))
+    
+    @staticmethod
+    def _hour_label(hour):
+        """
+        Format an hour of arrival for the By Hour tab
+        
+        Args:
+            hour (int): Hour from 0 to 23, or -1 if unknown
+            
+        Returns:
+            str: Hour range such as '9 AM - 10 AM'
+        """
+        if hour < 0:
+            return "Unknown"
+        
+        def clock(h):
+            return f"{(h % 12) or 12} {'AM' if h % 24 < 12 else 'PM'}"
+        
+        return f"{clock(hour)} - {clock(hour + 1)}"
+    
     def update_stats(self):
-        """Update all statistics"""
+        """Update all statistics; the tabs fill in as their figures arrive"""
         try:
-            # Show a message while updating
-            self.notebook.pack_forget()
-            updating_frame = ttk.Frame(self.frame)
-            updating_frame.grid(row=2, column=0, sticky='nsew', padx=5, pady=5)
-            updating_label = ttk.Label(updating_frame, text="Updating statistics...", font=('Arial', 12))
-            updating_label.pack(expand=True, pady=50)
-            self.frame.update()
+            # Mark the tabs as updating; the window stays responsive meanwhile
+            for label in (self.daily_date_label, self.weekly_range_label, self.month_name_label,
+                          self.doctor_range_label, self.hour_range_label):
+                label.config(text="Updating...")
             
             # Update daily stats with current date
             today = datetime.now().strftime('%Y-%m-%d')
@@ -597,12 +932,66 @@ class StatsView:
             now = datetime.now()
             self._update_monthly_stats(now.year, now.month)
             
-            logger.info("Updated all statistics")
+            # Update the date range tab for the last range applied
+            if self._shown_range:
+                self._update_range_stats(*self._shown_range[:2])
+            else:
+                self._update_range_stats(self.range_start_var.get(), self.range_end_var.get())
             
-            # Restore the notebook
-            updating_frame.destroy()
-            self.notebook.pack(fill=tk.BOTH, expand=True)
+            logger.info("Requested all statistics")
             
         except Exception as e:
             logger.error(f"Error updating stats: {e}")
-            messagebox.showerror("Statistics Error", f"An error occurred while updating statistics: {e}") 
\ No newline at end of file
+            messagebox.showerror("Statistics Error", f"An error occurred while updating statistics: {e}") 
+    
+    def _on_patient_changed(self, event):
+        """
+        Note which periods on screen a patient change affects
+        
+        Saves often come in bursts, so the affected periods are recalculated
+        together a moment later.
+        
+        Args:
+            event (PatientEvent): Change published by the patient model
+        """
+        for date in event.dates():
+            if date == self._shown_day:
+                self._stale_periods.add('daily')
+            if self._shown_week and self._shown_week[0] <= date <= self._shown_week[1]:
+                self._stale_periods.add('weekly')
+            if self._shown_month and date.startswith(f"{self._shown_month[0]:04d}-{self._shown_month[1]:02d}-"):
+                self._stale_periods.add('monthly')
+            if self._shown_range and (self._shown_range[0] <= date <= self._shown_range[1]
+                                      or self._shown_range[2] <= date <= self._shown_range[3]):
+                self._stale_periods.add('range')
+        
+        if self._stale_periods and self._stale_after_id is None:
+            self._stale_after_id = self.frame.after(500, self._update_stale_periods)
+    
+    def _update_stale_periods(self):
+        """Recalculate only the periods affected by patient changes"""
+        self._stale_after_id = None
+        stale, self._stale_periods = self._stale_periods, set()
+        
+        try:
+            if 'daily' in stale:
+                self._update_daily_stats(self._shown_day)
+            if 'weekly' in stale:
+                self._update_weekly_stats(self._shown_week[1])
+            if 'monthly' in stale:
+                self._update_monthly_stats(*self._shown_month)
+            if 'range' in stale:
+                self._update_range_stats(*self._shown_range[:2])
+        except Exception as e:
+            logger.error(f"Error updating stats: {e}")
+    
+    def _on_destroy(self, event):
+        """
+        Stop listening for patient changes and computing when the window closes
+        
+        Args:
+            event: Destroy event
+        """
+        if event.widget is self.frame:
+            self._unsubscribe()
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Virtual Treeview for the Receptionist Application
+A list widget that only creates items for the rows on screen
+"""
+
+import logging
+from tkinter import ttk
+
+logger = logging.getLogger('receptionist.virtual_tree')
+
+class VirtualTreeview(ttk.Frame):
+    """
+    Virtual Treeview class for the Receptionist Application
+    Shows a window of rows from a data source in a ttk.Treeview that only
+    ever holds as many items as fit on screen. Rows are fetched from the
+    source as the user scrolls, with some overscan kept on either side so
+    small scrolls do not go back to the source. Rows are identified by a
+    key, such as the patient ID, and the selection follows that key.
+    """
+    
+    # Used until the first item has been drawn and can be measured
+    DEFAULT_ROW_HEIGHT = 20
+    DEFAULT_HEADER_HEIGHT = 25
+    
+    # Rows moved per mouse wheel step
+    WHEEL_ROWS = 3
+    
+    def __init__(self, parent, columns, height=10, overscan=20):
+        """
+        Initialize the Virtual Treeview
+        
+        Args:
+            parent: Parent widget
+            columns (tuple): Column identifiers
+            height (int, optional): Rows shown before the widget is laid out. Defaults to 10.
+            overscan (int, optional): Extra rows fetched above and below the
+                visible window. Defaults to 20.
+        """
+        super().__init__(parent)
+        
+        self.overscan = overscan
+        
+        # Data source: a row count and a function returning (key, values) rows
+        self._row_count = lambda: 0
+        self._fetch_rows = lambda start, count: []
+        self._total = 0
+        
+        # Rows fetched around the visible window
+        self._cache_start = 0
+        self._cache = []
+        
+        # Index of the first visible row, number of visible rows and their keys
+        self._first = 0
+        self._visible_rows = height
+        self._shown = []
+        
+        # Selection, kept by key so it survives scrolling and refreshes
+        self._selected_key = None
+        self._selected_values = None
+        self._selected_index = None
+        self._select_callback = None
+        
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+        
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", height=height, selectmode='browse')
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        
+        self.tree.grid(row=0, column=0, sticky='nsew')
+        self.scrollbar.grid(row=0, column=1, sticky='ns')
+        
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+        self.tree.bind("<Configure>", self._on_configure)
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", self._on_mousewheel)
+        self.tree.bind("<Button-5>", self._on_mousewheel)
+        self.tree.bind("<Up>", lambda event: self._move_selection(-1))
+        self.tree.bind("<Down>", lambda event: self._move_selection(1))
+        self.tree.bind("<Prior>", lambda event: self._move_selection(-self._visible_rows))
+        self.tree.bind("<Next>", lambda event: self._move_selection(self._visible_rows))
+        self.tree.bind("<Home>", lambda event: self._move_selection(-self._total))
+        self.tree.bind("<End>", lambda event: self._move_selection(self._total))
+    
+    def heading(self, column, **options):
+        """Configure a column heading, as ttk.Treeview.heading()"""
+        return self.tree.heading(column, **options)
+    
+    def column(self, column, **options):
+        """Configure a column, as ttk.Treeview.column()"""
+        return self.tree.column(column, **options)
+    
+    def bind_select(self, callback):
+        """
+        Set the function called when the user selects a row
+        
+        Args:
+            callback (callable): Called with the key of the selected row
+        """
+        self._select_callback = callback
+    
+    def set_source(self, row_count, fetch_rows):
+        """
+        Show rows pulled lazily from a data source, starting at the top
+        
+        Args:
+            row_count (callable): Returns the total number of rows
+            fetch_rows (callable): Called with (start, count); returns a list
+                of (key, values) tuples for that range
+        """
+        self._row_count = row_count
+        self._fetch_rows = fetch_rows
+        self._first = 0
+        self.clear_selection()
+        self.refresh()
+    
+    def set_rows(self, rows):
+        """
+        Show an in-memory list of rows, starting at the top
+        
+        Args:
+            rows (list): (key, values) tuples
+        """
+        rows = list(rows)
+        self.set_source(lambda: len(rows), lambda start, count: rows[start:start + count])
+    
+    def refresh(self):
+        """Re-read the source, keeping the scroll position and the selection"""
+        self._total = self._row_count()
+        self._cache = []
+        self._cache_start = 0
+        self._first = self._clamp_first(self._first)
+        self._render()
+    
+    def get_row_count(self):
+        """
+        Get the number of rows in the source
+        
+        Returns:
+            int: Row count as of the last refresh
+        """
+        return self._total
+    
+    def get_first_visible(self):
+        """
+        Get the index of the first visible row
+        
+        Returns:
+            int: Row index
+        """
+        return self._first
+    
+    def selection(self):
+        """
+        Get the selected row
+        
+        Returns:
+            tuple: The selected key, or an empty tuple
+        """
+        return (self._selected_key,) if self._selected_key is not None else ()
+    
+    def item_values(self, key):
+        """
+        Get the values shown for a row
+        
+        Args:
+            key: Row key
+        
+        Returns:
+            tuple: Values, or None if the row is neither visible nor selected
+        """
+        if key in self._shown:
+            return self._cache[self._first - self._cache_start + self._shown.index(key)][1]
+        if key == self._selected_key:
+            return self._selected_values
+        return None
+    
+    def clear_selection(self):
+        """Forget the selected row"""
+        self._selected_key = None
+        self._selected_values = None
+        self._selected_index = None
+        selection = self.tree.selection()
+        if selection:
+            self.tree.selection_remove(selection)
+    
+    def scroll_to(self, first):
+        """
+        Scroll so that a row is the first visible one
+        
+        Args:
+            first (int): Row index
+        """
+        first = self._clamp_first(first)
+        if first != self._first:
+            self._first = first
+            self._render()
+    
+    def see(self, index):
+        """
+        Scroll as little as needed to make a row visible
+        
+        Args:
+            index (int): Row index
+        """
+        if index < self._first:
+            self.scroll_to(index)
+        elif index >= self._first + self._visible_rows:
+            self.scroll_to(index - self._visible_rows + 1)
+    
+    def _clamp_first(self, first):
+        """
+        Limit the first visible row to the valid range
+        
+        Args:
+            first (int): Requested row index
+        
+        Returns:
+            int: Row index between 0 and the last full page
+        """
+        return max(0, min(first, self._total - self._visible_rows))
+    
+    def _get_rows(self, first, count):
+        """
+        Get rows from the overscan cache, fetching a new window if needed
+        
+        Args:
+            first (int): Index of the first row
+            count (int): Number of rows
+        
+        Returns:
+            list: (key, values) tuples
+        """
+        end = min(first + count, self._total)
+        if first < self._cache_start or end > self._cache_start + len(self._cache):
+            start = max(0, first - self.overscan)
+            self._cache = list(self._fetch_rows(start, end - start + self.overscan))
+            self._cache_start = start
+        
+        offset = first - self._cache_start
+        return self._cache[offset:offset + count]
+    
+    def _render(self):
+        """Update the pooled tree items to show the visible window"""
+        rows = self._get_rows(self._first, self._visible_rows)
+        items = self.tree.get_children()
+        
+        # The tree holds one item per visible row, reused as the view scrolls
+        for index in range(len(items), len(rows)):
+            self.tree.insert("", "end", iid=f"row{index}")
+        if len(items) > len(rows):
+            self.tree.delete(*items[len(rows):])
+        
+        for index, (key, values) in enumerate(rows):
+            self.tree.item(f"row{index}", values=values)
+        self._shown = [key for key, _ in rows]
+        
+        # Show the selection if its row is on screen
+        if self._selected_key in self._shown:
+            position = self._shown.index(self._selected_key)
+            self._selected_index = self._first + position
+            self._selected_values = rows[position][1]
+            if self.tree.selection() != (f"row{position}",):
+                self.tree.selection_set(f"row{position}")
+        elif self.tree.selection():
+            self.tree.selection_remove(self.tree.selection())
+        
+        if self._total > 0:
+            self.scrollbar.set(self._first / self._total, (self._first + len(rows)) / self._total)
+        else:
+            self.scrollbar.set(0, 1)
+    
+    def _select(self, key, index):
+        """
+        Record a selection made by the user and report it
+        
+        Args:
+            key: Row key
+            index (int): Row index
+        """
+        self._selected_key = key
+        self._selected_index = index
+        self._selected_values = self.item_values(key)
+        
+        if self._select_callback:
+            self._select_callback(key)
+    
+    def _on_tree_select(self, event):
+        """
+        Handle a click on a row
+        
+        Args:
+            event: Treeview selection event
+        """
+        selection = self.tree.selection()
+        if not selection:
+            return
+        
+        position = self.tree.index(selection[0])
+        if position >= len(self._shown):
+            return
+        
+        key = self._shown[position]
+        
+        # Selecting the row again after a scroll or refresh is not a new choice
+        if key == self._selected_key:
+            return
+        
+        self._select(key, self._first + position)
+    
+    def _move_selection(self, delta):
+        """
+        Move the selection with the keyboard, scrolling as needed
+        
+        Args:
+            delta (int): Rows to move, negative for up
+        
+        Returns:
+            str: "break" so the Treeview does not move its own selection
+        """
+        if self._total == 0:
+            return "break"
+        
+        # Move from the selected row even when it is scrolled out of view
+        if self._selected_index is None:
+            index = self._first
+        else:
+            index = self._selected_index + delta
+        index = max(0, min(index, self._total - 1))
+        
+        # Refresh the window even when see() does not scroll, since the
+        # rows may have changed since the last render
+        self.see(index)
+        self._render()
+        position = index - self._first
+        if not 0 <= position < len(self._shown):
+            return "break"
+        key = self._shown[position]
+        if key != self._selected_key:
+            self._select(key, index)
+            self._render()
+        return "break"
+    
+    def _on_scrollbar(self, *args):
+        """
+        Handle scrollbar commands
+        
+        Args:
+            *args: ('moveto', fraction) or ('scroll', amount, 'units' or 'pages')
+        """
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * self._total))
+        elif args[0] == 'scroll':
+            step = self._visible_rows if args[2] == 'pages' else 1
+            self.scroll_to(self._first + int(args[1]) * step)
+    
+    def _on_mousewheel(self, event):
+        """
+        Handle mouse wheel scrolling
+        
+        Args:
+            event: MouseWheel, or Button-4/Button-5 on X11
+        
+        Returns:
+            str: "break" so the Treeview does not scroll its own items
+        """
+        up = event.num == 4 or getattr(event, 'delta', 0) > 0
+        self.scroll_to(self._first + (-self.WHEEL_ROWS if up else self.WHEEL_ROWS))
+        return "break"
+    
+    def _on_configure(self, event):
+        """
+        Fit the number of pooled items to the tree's new height
+        
+        Args:
+            event: Configure event
+        """
+        row_height = self.DEFAULT_ROW_HEIGHT
+        header_height = self.DEFAULT_HEADER_HEIGHT
+        
+        items = self.tree.get_children()
+        if items:
+            bbox = self.tree.bbox(items[0])
+            if bbox:
+                header_height, row_height = bbox[1], bbox[3]
+        
+        visible_rows = max(1, (event.height - header_height) // max(row_height, 1))
+        if visible_rows != self._visible_rows:
+            self._visible_rows = visible_rows
+            self._first = self._clamp_first(self._first)
+            self._render()
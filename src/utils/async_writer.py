@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Async Writer for the Receptionist Application
+Runs storage writes on a dedicated background thread
+"""
+
+import queue
+import logging
+import threading
+
+logger = logging.getLogger('receptionist.async_writer')
+
+# Queue marker that tells the writer thread to exit
+_STOP = object()
+
+class AsyncWriter:
+    """
+    Async Writer class for the Receptionist Application
+    Collects submitted items on a queue and hands everything that is waiting
+    to a single flush call, so back-to-back saves share one disk write
+    """
+    
+    def __init__(self, flush_function, name='storage-writer'):
+        """
+        Initialize the Async Writer and start its thread
+        
+        Args:
+            flush_function (callable): Called on the writer thread with a list
+                of items; raises an exception if the items could not be written
+            name (str, optional): Thread name. Defaults to 'storage-writer'.
+        """
+        self.flush_function = flush_function
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+    
+    def submit(self, item, on_complete=None):
+        """
+        Queue an item for writing
+        
+        Args:
+            item: Item passed to the flush function
+            on_complete (callable, optional): Called on the writer thread with
+                True once the item is written, or False if the write failed
+        """
+        self._queue.put((item, on_complete))
+    
+    def _run(self):
+        """Writer thread loop"""
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                self._queue.task_done()
+                break
+            
+            # Take everything queued behind the first item into the same flush
+            batch = [first]
+            stop_requested = False
+            while True:
+                try:
+                    queued = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if queued is _STOP:
+                    stop_requested = True
+                    break
+                batch.append(queued)
+            
+            try:
+                self.flush_function([item for item, _ in batch])
+                success = True
+            except Exception as e:
+                logger.error(f"Error flushing {len(batch)} queued writes: {e}")
+                success = False
+            
+            for _, on_complete in batch:
+                if on_complete is not None:
+                    try:
+                        on_complete(success)
+                    except Exception as e:
+                        logger.error(f"Error in write completion callback: {e}")
+            
+            for _ in batch:
+                self._queue.task_done()
+            
+            if stop_requested:
+                self._queue.task_done()
+                break
+    
+    def flush(self):
+        """Block until every item submitted so far has been written"""
+        if self._thread.is_alive():
+            self._queue.join()
+    
+    def stop(self):
+        """Write everything still queued and stop the writer thread"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Backup Manager for the Receptionist Application
+Keeps periodic full snapshots plus compressed per-change deltas
+"""
+
+import os
+import gzip
+import json
+import logging
+import shutil
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from utils.patient_journal import apply_entry, _json_default
+from utils.month_partitions import MonthPartitions
+from utils.patient_schema import plain_frame
+from utils.file_lock import FileLock
+
+logger = logging.getLogger('receptionist.backup_manager')
+
+class BackupManager:
+    """
+    Backup Manager class for the Receptionist Application
+    
+    A full snapshot of the store is written every 'backup_interval_days'.
+    Every change saved after a snapshot is appended to a gzip delta file
+    next to it, so a save costs one small compressed append instead of a
+    copy of the whole data file. Any point in time covered by a snapshot
+    and its deltas can be restored.
+    
+    Workstations sharing the data folder share one backup chain: snapshot
+    creation, delta appends and cleanup happen under a lock file in the
+    backup folder, and the snapshot deltas are appended to is always the
+    newest one on disk.
+    
+    Snapshots keep the existing patients_backup_<timestamp> file names; the
+    deltas of a snapshot live in '<snapshot file>.delta.gz', and the month
+    partitions of an Excel store are copied into '<snapshot file>.partitions'.
+    """
+    
+    SNAPSHOT_PREFIX = 'patients_backup_'
+    DELTA_SUFFIX = '.delta.gz'
+    PARTITIONS_SUFFIX = '.partitions'
+    TIMESTAMP_FORMAT = '%Y%m%d_%H%M%S'
+    
+    def __init__(self, settings, backup_dir, snapshot_extension, write_snapshot):
+        """
+        Initialize the Backup Manager
+        
+        Args:
+            settings: Application settings
+            backup_dir (str): Directory holding snapshots and deltas
+            snapshot_extension (str): Snapshot file extension, '.xlsx' or '.db'
+            write_snapshot (callable): Called with a path; writes a full copy
+                of the store's current data there
+        """
+        self.settings = settings
+        self.backup_dir = backup_dir
+        self.snapshot_extension = snapshot_extension
+        self.write_snapshot = write_snapshot
+        
+        # Serializes delta appends and snapshot rotation, within this
+        # process and between workstations
+        self._lock = threading.Lock()
+        os.makedirs(self.backup_dir, exist_ok=True)
+        self._file_lock = FileLock(os.path.join(self.backup_dir, 'backups.lock'), timeout=60)
+        
+        # Set when changes went unrecorded, so the chain must restart
+        self._chain_broken = False
+    
+    @property
+    def enabled(self):
+        """bool: Whether automatic snapshots and deltas are recorded"""
+        return bool(self.settings.get('auto_backup', True))
+    
+    @property
+    def interval(self):
+        """timedelta: Time between automatic full snapshots, at least one day"""
+        try:
+            days = float(self.settings.get('backup_interval_days', 7))
+        except (TypeError, ValueError):
+            days = 7
+        return timedelta(days=max(days, 1))
+    
+    @property
+    def max_snapshots(self):
+        """int: Number of snapshots, with their deltas, that are kept"""
+        return max(int(self.settings.get('backup_max_snapshots', 10)), 1)
+    
+    def list_snapshots(self):
+        """
+        List the snapshots of this store, oldest first
+        
+        Returns:
+            list: (datetime, path) tuples
+        """
+        snapshots = []
+        for filename in os.listdir(self.backup_dir):
+            if not (filename.startswith(self.SNAPSHOT_PREFIX) and filename.endswith(self.snapshot_extension)):
+                continue
+            stamp = filename[len(self.SNAPSHOT_PREFIX):-len(self.snapshot_extension)]
+            try:
+                taken_at = datetime.strptime(stamp, self.TIMESTAMP_FORMAT)
+            except ValueError:
+                continue
+            snapshots.append((taken_at, os.path.join(self.backup_dir, filename)))
+        
+        return sorted(snapshots)
+    
+    def _current(self):
+        """
+        Get the snapshot deltas are recorded against; the caller holds the lock file
+        
+        Returns:
+            tuple: (datetime, path) of the newest snapshot, or None if there is none
+        """
+        snapshots = self.list_snapshots()
+        return snapshots[-1] if snapshots else None
+    
+    def _needs_snapshot(self):
+        """
+        Check whether the next change has to start a new snapshot
+        
+        A snapshot is needed when none exists, when the interval has passed,
+        when changes went unrecorded, or when the newest one has no delta
+        file. Backups written by older versions have none, so changes made
+        since then were never recorded and a fresh starting point is required.
+        The caller holds the lock file.
+        
+        Returns:
+            bool: True if a snapshot should be taken
+        """
+        current = self._current()
+        return (
+            current is None
+            or self._chain_broken
+            or datetime.now() - current[0] >= self.interval
+            or not os.path.exists(self._delta_path(current[1]))
+        )
+    
+    def _delta_path(self, snapshot_path):
+        """
+        Get the delta file belonging to a snapshot
+        
+        Args:
+            snapshot_path (str): Snapshot path
+        
+        Returns:
+            str: Path of the delta file
+        """
+        return snapshot_path + self.DELTA_SUFFIX
+    
+    def start(self):
+        """Take a snapshot at startup if one is needed, see _needs_snapshot()"""
+        if not self.enabled:
+            return
+        
+        with self._lock:
+            try:
+                with self._file_lock:
+                    if self._needs_snapshot():
+                        self._create_snapshot_locked()
+            except Exception as e:
+                logger.error(f"Error creating backup snapshot: {e}")
+    
+    def create_snapshot(self):
+        """
+        Write a full snapshot and start a new delta file for it
+        
+        Returns:
+            str: Path of the snapshot, or None if writing it failed
+        """
+        with self._lock:
+            try:
+                with self._file_lock:
+                    return self._create_snapshot_locked()
+            except Exception as e:
+                logger.error(f"Error creating backup snapshot: {e}")
+                return None
+    
+    def _create_snapshot_locked(self):
+        """
+        Body of create_snapshot(); the caller holds both locks
+        
+        Returns:
+            str: Path of the snapshot
+        """
+        taken_at = datetime.now().replace(microsecond=0)
+        snapshot_path = self._snapshot_path(taken_at)
+        
+        # Two snapshots within one second get consecutive timestamps
+        while os.path.exists(snapshot_path):
+            taken_at += timedelta(seconds=1)
+            snapshot_path = self._snapshot_path(taken_at)
+        
+        # The temporary name must not look like a finished snapshot, and is
+        # unique so a desk that crashed mid-write never collides with another
+        temp_path = os.path.join(
+            self.backup_dir,
+            f"snapshot_in_progress_{uuid.uuid4().hex}{self.snapshot_extension}"
+        )
+        try:
+            self.write_snapshot(temp_path)
+            os.replace(temp_path, snapshot_path)
+            if os.path.isdir(temp_path + self.PARTITIONS_SUFFIX):
+                os.replace(temp_path + self.PARTITIONS_SUFFIX, snapshot_path + self.PARTITIONS_SUFFIX)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            shutil.rmtree(temp_path + self.PARTITIONS_SUFFIX, ignore_errors=True)
+        
+        # An empty delta file marks the snapshot as the start of a complete chain
+        with gzip.open(self._delta_path(snapshot_path), 'wb'):
+            pass
+        
+        self._chain_broken = False
+        logger.info(f"Created backup snapshot at {snapshot_path}")
+        
+        self._cleanup_old_snapshots()
+        return snapshot_path
+    
+    def _snapshot_path(self, taken_at):
+        """
+        Get the snapshot path for a timestamp
+        
+        Args:
+            taken_at (datetime): Snapshot time
+        
+        Returns:
+            str: Snapshot path
+        """
+        filename = f"{self.SNAPSHOT_PREFIX}{taken_at.strftime(self.TIMESTAMP_FORMAT)}{self.snapshot_extension}"
+        return os.path.join(self.backup_dir, filename)
+    
+    def record_changes(self, entries):
+        """
+        Record saved changes as deltas of the current snapshot
+        
+        Each call appends one gzip member, so the cost depends only on the
+        size of the changes. When the snapshot interval has passed a new
+        snapshot is taken instead; it already contains the changes.
+        Errors are logged and never reach the caller, so a failing backup
+        never fails a save.
+        
+        Args:
+            entries (list): Journal entries built with PatientJournal.make_entry()
+        """
+        if not entries:
+            return
+        
+        if not self.enabled:
+            # Changes made now are missing from the current chain, so the
+            # next recorded change has to start from a new snapshot
+            self._chain_broken = True
+            return
+        
+        with self._lock:
+            try:
+                with self._file_lock:
+                    # A new snapshot already contains the changes
+                    if self._needs_snapshot():
+                        self._create_snapshot_locked()
+                        return
+                    
+                    data = ''.join(
+                        json.dumps(entry, default=_json_default, ensure_ascii=False) + '\n'
+                        for entry in entries
+                    )
+                    with gzip.open(self._delta_path(self._current()[1]), 'ab') as f:
+                        f.write(data.encode('utf-8'))
+            except Exception as e:
+                logger.error(f"Error recording backup deltas: {e}")
+    
+    def _cleanup_old_snapshots(self):
+        """Remove the oldest snapshots and their deltas beyond max_snapshots; the caller holds the lock file"""
+        try:
+            snapshots = self.list_snapshots()
+            for _, snapshot_path in snapshots[:-self.max_snapshots]:
+                os.remove(snapshot_path)
+                delta_path = self._delta_path(snapshot_path)
+                if os.path.exists(delta_path):
+                    os.remove(delta_path)
+                shutil.rmtree(snapshot_path + self.PARTITIONS_SUFFIX, ignore_errors=True)
+                logger.info(f"Removed old backup: {snapshot_path}")
+            
+            # Snapshots are only written under the lock file, so one still in
+            # progress now was left behind by a desk that crashed
+            for filename in os.listdir(self.backup_dir):
+                if filename.startswith('snapshot_in_progress'):
+                    path = os.path.join(self.backup_dir, filename)
+                    if os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        os.remove(path)
+        except Exception as e:
+            logger.error(f"Error cleaning up old backups: {e}")
+    
+    def _read_deltas(self, snapshot_path):
+        """
+        Read the deltas recorded for a snapshot
+        
+        A member cut short by a crash ends the chain; the entries before it
+        are still returned.
+        
+        Args:
+            snapshot_path (str): Snapshot path
+        
+        Returns:
+            list: Journal entries in the order they were saved
+        """
+        delta_path = self._delta_path(snapshot_path)
+        if not os.path.exists(delta_path):
+            return []
+        
+        entries = []
+        try:
+            with gzip.open(delta_path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        entries.append(json.loads(line))
+        except (EOFError, OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Stopped reading {delta_path} after {len(entries)} entries: {e}")
+        
+        return entries
+    
+    def _load_snapshot(self, snapshot_path):
+        """
+        Load a snapshot into a DataFrame
+        
+        Args:
+            snapshot_path (str): Path to a .xlsx or .db snapshot
+        
+        Returns:
+            pandas.DataFrame: Patients in the snapshot, blanks as empty strings
+        """
+        if snapshot_path.endswith('.db'):
+            conn = sqlite3.connect(snapshot_path)
+            try:
+                df = pd.read_sql_query("SELECT * FROM patients ORDER BY rowid", conn)
+            finally:
+                conn.close()
+        else:
+            df = pd.read_excel(snapshot_path).fillna('')
+            
+            # Past months copied with the snapshot come first, as in the store;
+            # a patient in both places is the workbook's
+            partitions_dir = snapshot_path + self.PARTITIONS_SUFFIX
+            if os.path.isdir(partitions_dir):
+                partitions = MonthPartitions(partitions_dir, self.SNAPSHOT_PREFIX, cache_months=1)
+                frames = [plain_frame(partitions.frame(month)) for month in partitions.months()]
+                frames = [frame[~frame['patient_id'].isin(df['patient_id'])] for frame in frames if not frame.empty]
+                if frames:
+                    df = pd.concat(frames + [df], ignore_index=True)
+        
+        return df.fillna('')
+    
+    def get_earliest_restore_point(self):
+        """
+        Get the earliest time that can be restored
+        
+        Returns:
+            datetime: Time of the oldest snapshot, or None if there is none
+        """
+        snapshots = self.list_snapshots()
+        return snapshots[0][0] if snapshots else None
+    
+    def restore(self, point_in_time):
+        """
+        Rebuild the patient data as it was at a point in time
+        
+        The newest snapshot taken at or before that time is loaded and its
+        deltas are replayed up to and including that time.
+        
+        Args:
+            point_in_time (datetime): Time to restore
+        
+        Returns:
+            pandas.DataFrame: Patients at that time
+        
+        Raises:
+            ValueError: If no snapshot is old enough
+        """
+        candidates = [s for s in self.list_snapshots() if s[0] <= point_in_time]
+        if not candidates:
+            raise ValueError(f"No backup exists from before {point_in_time:%Y-%m-%d %H:%M:%S}")
+        
+        taken_at, snapshot_path = candidates[-1]
+        df = self._load_snapshot(snapshot_path)
+        
+        # Entry timestamps are 'YYYY-MM-DD HH:MM:SS', which sort as text
+        cutoff = point_in_time.strftime('%Y-%m-%d %H:%M:%S')
+        replayed = 0
+        for entry in self._read_deltas(snapshot_path):
+            if entry.get('ts', '') > cutoff:
+                break
+            df = apply_entry(df, entry)
+            replayed += 1
+        
+        logger.info(f"Restored {snapshot_path} with {replayed} changes up to {cutoff}")
+        return df.reset_index(drop=True)
+    
+    def restore_to_excel(self, point_in_time, export_path):
+        """
+        Restore a point in time into a separate workbook
+        
+        The live data is never overwritten; the restored workbook can be
+        checked and copied back by hand.
+        
+        Args:
+            point_in_time (datetime): Time to restore
+            export_path (str): Path of the workbook to write
+        
+        Returns:
+            int: Number of patients in the restored workbook
+        """
+        df = self.restore(point_in_time)
+        df.to_excel(export_path, index=False)
+        return len(df)
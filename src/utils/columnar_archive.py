@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Columnar Archive for the Receptionist Application
+Compressed column files for visits that are rarely read
+"""
+
+import os
+import logging
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger('receptionist.columnar_archive')
+
+# Extensions of the two formats; a file is always read by its extension
+PARQUET = '.parquet'
+NUMPY = '.npz'
+
+def archive_extension():
+    """
+    Get the format new archive files are written in
+    
+    Parquet needs pyarrow; without it the columns go into a compressed
+    numpy file. Every workstation sharing the data folder must be able to
+    read the format, so install pyarrow on all of them or on none.
+    
+    Returns:
+        str: PARQUET if pyarrow is installed, NUMPY otherwise
+    """
+    return PARQUET if pyarrow is not None else NUMPY
+
+def is_archive(path):
+    """
+    Check whether a path is a columnar archive file
+    
+    Args:
+        path (str): File path
+    
+    Returns:
+        bool: True for Parquet and numpy archive files
+    """
+    return os.path.splitext(path)[1] in (PARQUET, NUMPY)
+
+def write_archive(df, path):
+    """
+    Write patient rows to an archive file, replacing it atomically
+    
+    Every column is stored as text, as plain_frame() gives it, so a column
+    holding a stray value round-trips like it does through a workbook.
+    
+    Args:
+        df (pandas.DataFrame): Plain rows
+        path (str): Archive path ending in PARQUET or NUMPY
+    """
+    text = df.reset_index(drop=True).astype(str)
+    temp_path = path + '.tmp'
+    
+    if path.endswith(PARQUET):
+        text.to_parquet(temp_path, engine='pyarrow', compression='zstd', index=False)
+    else:
+        # Members are named by position; the column names are stored alongside
+        columns = {f'c{i}': text[column].to_numpy(dtype=str) for i, column in enumerate(text.columns)}
+        with open(temp_path, 'wb') as f:
+            np.savez_compressed(f, __columns__=np.array(list(text.columns), dtype=str), **columns)
+    
+    os.replace(temp_path, path)
+
+def read_archive(path, start_date=None, end_date=None, doctor_name=None, columns=None):
+    """
+    Read the rows of an archive file that match a date range and a doctor
+    
+    Parquet applies the conditions while reading and skips row groups that
+    cannot match. A numpy archive has no row groups: the date and doctor
+    columns are compared first, and the other columns are decompressed in
+    full only when some row matches.
+    
+    Args:
+        path (str): Archive path
+        start_date (str, optional): First date in YYYY-MM-DD format. Defaults to None.
+        end_date (str, optional): Last date in YYYY-MM-DD format, inclusive. Defaults to None.
+        doctor_name (str, optional): Doctor name. Defaults to None.
+        columns (list, optional): Columns to read; the others are not
+            decompressed. Defaults to every column.
+    
+    Returns:
+        pandas.DataFrame: Matching rows, every column as text
+    """
+    if path.endswith(PARQUET):
+        filters = []
+        if start_date:
+            filters.append(('appointment_date', '>=', start_date))
+        if end_date:
+            filters.append(('appointment_date', '<=', end_date))
+        if doctor_name is not None:
+            filters.append(('doctor_name', '==', doctor_name))
+        return pd.read_parquet(path, engine='pyarrow', columns=columns, filters=filters or None)
+    
+    with np.load(path) as archive:
+        names = [str(name) for name in archive['__columns__']]
+        members = {name: f'c{i}' for i, name in enumerate(names)}
+        
+        mask = None
+        if start_date or end_date:
+            dates = archive[members['appointment_date']]
+            mask = np.ones(len(dates), dtype=bool)
+            if start_date:
+                mask &= dates >= start_date
+            if end_date:
+                mask &= dates <= end_date
+        if doctor_name is not None:
+            matches = archive[members['doctor_name']] == doctor_name
+            mask = matches if mask is None else mask & matches
+        
+        if columns is not None:
+            names = [name for name in names if name in columns]
+        if mask is not None and not mask.any():
+            return pd.DataFrame(columns=names, dtype=object)
+        
+        values = {}
+        for name in names:
+            column = archive[members[name]]
+            values[name] = column if mask is None else column[mask]
+    
+    return pd.DataFrame(values, columns=names)
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Daily Rollup for the Receptionist Application
+Per-day visit and revenue totals kept up to date change by change
+"""
+
+import os
+import json
+import uuid
+import bisect
+import logging
+import threading
+from datetime import date as date_type, datetime
+
+import pandas as pd
+
+from utils.fenwick import FenwickTree
+
+logger = logging.getLogger('receptionist.daily_rollup')
+
+class DailyRollup:
+    """
+    Daily Rollup class for the Receptionist Application
+    Holds, for every day with visits, the number of visits, the revenue,
+    the number of new and old patients and the visits and revenue of each
+    doctor. Saving, editing or deleting a patient adjusts at most two days,
+    so range statistics are sums over a few rollup rows instead of reads
+    of every visit. A Fenwick tree over day numbers answers the visits,
+    revenue and new/old counts of any date range in O(log D) steps.
+    
+    The rollup is saved to a JSON file when the application closes, with
+    the store's change marker for the data it summarizes. The marker moves
+    on with every change from any workstation, so after a crash, or when
+    another workstation changed the data since, it no longer matches and
+    the rollup is rebuilt from the store. Workstations sharing the file
+    each write a complete rollup with its own marker, so whichever wrote
+    last is still checked correctly.
+    """
+    
+    VERSION = 2
+    
+    # Numbers kept per day in the Fenwick tree
+    TREE_FIELDS = ('visits', 'revenue', 'new', 'old')
+    
+    # Patient columns the rollup is calculated from
+    COLUMNS = ('appointment_date', 'fees', 'status', 'doctor_name')
+    
+    def __init__(self, store, rollup_path):
+        """
+        Initialize the Daily Rollup, loading or rebuilding it
+        
+        Args:
+            store: PatientStore the rollup summarizes
+            rollup_path (str): Path of the JSON file holding the rollup
+        """
+        self.store = store
+        self.rollup_path = rollup_path
+        
+        # date -> {'visits', 'revenue', 'new', 'old', 'doctors': {name: [visits, revenue]}}
+        self._days = {}
+        # Dates with visits, sorted, for range lookups
+        self._dates = []
+        self._lock = threading.RLock()
+        
+        # Fenwick tree over whole years of days; slot 0 is day _tree_base
+        self._tree = None
+        self._tree_base = 0
+        
+        if self._load():
+            self._build_tree()
+        else:
+            self.rebuild()
+    
+    @staticmethod
+    def _fee(value):
+        """
+        Get the fee of a row as a number
+        
+        Args:
+            value: Fee as stored
+        
+        Returns:
+            float: Fee, 0 if blank or not a number
+        """
+        try:
+            fee = float(value)
+        except (TypeError, ValueError):
+            return 0.0
+        return 0.0 if pd.isna(fee) else fee
+    
+    @staticmethod
+    def _date(value):
+        """
+        Get the appointment date of a row as a YYYY-MM-DD string
+        
+        Args:
+            value: Date as stored
+        
+        Returns:
+            str: Date, empty if blank
+        """
+        if value is None or (not isinstance(value, str) and pd.isna(value)):
+            return ''
+        return str(value).strip()[:10]
+    
+    @staticmethod
+    def _status(value):
+        """
+        Get the rollup counter a patient status adds to
+        
+        Args:
+            value: Status as stored, 'New' or 'Old'
+        
+        Returns:
+            str: 'new', 'old', or None for any other status
+        """
+        status = str(value or '').strip().lower()
+        return status if status in ('new', 'old') else None
+    
+    @staticmethod
+    def _ordinal(date):
+        """
+        Get the day number of a date
+        
+        Args:
+            date (str): Date in YYYY-MM-DD format
+        
+        Returns:
+            int: Proleptic Gregorian ordinal, or None if the date is not valid
+        """
+        try:
+            return datetime.strptime(date, '%Y-%m-%d').toordinal()
+        except (TypeError, ValueError):
+            return None
+    
+    @classmethod
+    def summarize(cls, df):
+        """
+        Calculate the rollup rows of some patients
+        
+        Args:
+            df (pandas.DataFrame): Plain rows with at least the COLUMNS
+        
+        Returns:
+            dict: date -> day, in the form the rollup keeps
+        """
+        days = {}
+        if df.empty:
+            return days
+        
+        df = pd.DataFrame({
+            'date': df['appointment_date'].map(cls._date),
+            'fees': pd.to_numeric(df['fees'], errors='coerce').fillna(0),
+            'status': df['status'].map(cls._status),
+            'doctor': df['doctor_name'].astype(str)
+        })
+        df = df[df['date'] != '']
+        
+        totals = df.groupby('date')['fees'].agg(['size', 'sum'])
+        for date, visits, revenue in zip(totals.index, totals['size'], totals['sum']):
+            days[date] = {'visits': int(visits), 'revenue': float(revenue), 'new': 0, 'old': 0, 'doctors': {}}
+        
+        statuses = df.dropna(subset=['status']).groupby(['date', 'status']).size()
+        for (date, status), count in statuses.items():
+            days[date][status] = int(count)
+        
+        doctors = df.groupby(['date', 'doctor'])['fees'].agg(['size', 'sum'])
+        for (date, doctor), visits, revenue in zip(doctors.index, doctors['size'], doctors['sum']):
+            days[date]['doctors'][doctor] = [int(visits), float(revenue)]
+        
+        return days
+    
+    @staticmethod
+    def _merge(days, part):
+        """
+        Add the rollup rows of one part of the store to a running total
+        
+        Args:
+            days (dict): Running total, changed in place
+            part (dict): Rollup rows of the part, left unchanged
+        """
+        for date, day in part.items():
+            total = days.get(date)
+            if total is None:
+                total = days[date] = {'visits': 0, 'revenue': 0.0, 'new': 0, 'old': 0, 'doctors': {}}
+            for field in ('visits', 'revenue', 'new', 'old'):
+                total[field] += day[field]
+            for doctor, (visits, revenue) in day['doctors'].items():
+                split = total['doctors'].setdefault(doctor, [0, 0.0])
+                split[0] += visits
+                split[1] += revenue
+    
+    def _build_tree(self):
+        """
+        Build the Fenwick tree from the rollup rows
+        
+        The tree covers whole years, from the first year with visits to
+        the year after the later of the last one and the current year, so
+        it only has to grow when a date outside that span is recorded.
+        """
+        ordinals = [ordinal for ordinal in map(self._ordinal, self._dates) if ordinal is not None]
+        this_year = datetime.now().year
+        first_year = date_type.fromordinal(min(ordinals)).year if ordinals else this_year
+        last_year = max(date_type.fromordinal(max(ordinals)).year if ordinals else this_year, this_year) + 1
+        
+        self._tree_base = date_type(first_year, 1, 1).toordinal()
+        size = date_type(last_year, 12, 31).toordinal() - self._tree_base + 1
+        
+        values = {}
+        for date in self._dates:
+            ordinal = self._ordinal(date)
+            if ordinal is not None:
+                day = self._days[date]
+                values[ordinal - self._tree_base] = [day[field] for field in self.TREE_FIELDS]
+        
+        self._tree = FenwickTree(size, len(self.TREE_FIELDS), values)
+    
+    def _load(self):
+        """
+        Load the rollup file if it matches the store's data
+        
+        Returns:
+            bool: True if the rollup was loaded
+        """
+        if not os.path.exists(self.rollup_path):
+            return False
+        
+        try:
+            with open(self.rollup_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            
+            if (data.get('version') != self.VERSION
+                    or data.get('marker') is None
+                    or data.get('storage_path') != self.store.storage_path
+                    or data.get('marker') != self.store.get_change_marker()):
+                logger.info("Daily rollup is out of date; rebuilding")
+                return False
+            
+            self._days = data['days']
+            self._dates = sorted(self._days)
+            logger.debug(f"Loaded daily rollup with {len(self._dates)} days")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading daily rollup: {e}")
+            return False
+    
+    def _save(self, marker):
+        """
+        Write the rollup file
+        
+        Args:
+            marker (int): Change marker of the store data the rollup matches,
+                None if unknown, in which case the file is rebuilt next time
+        """
+        # Other workstations save the same file; each writes its own temp file
+        temp_path = f"{self.rollup_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            data = {
+                'version': self.VERSION,
+                'marker': marker,
+                'storage_path': self.store.storage_path,
+                'days': self._days
+            }
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_path, self.rollup_path)
+        except Exception as e:
+            logger.error(f"Error saving daily rollup: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def rebuild(self):
+        """
+        Recalculate the rollup from the store and save it
+        
+        The store hands over its totals in parts, so a store that keeps the
+        totals of its past months does not read their rows again.
+        """
+        with self._lock:
+            # Read before the rows, so a change landing in between makes the
+            # saved file out of date rather than wrongly up to date
+            marker = self.store.get_change_marker()
+            days = {}
+            for part in self.store.get_daily_summaries():
+                self._merge(days, part)
+            
+            self._days = days
+            self._dates = sorted(days)
+            self._build_tree()
+            self._save(marker)
+            logger.info(f"Rebuilt daily rollup over {len(self._dates)} days")
+    
+    def _add_row(self, row, sign):
+        """
+        Add a row to the rollup, or take it away
+        
+        Args:
+            row (dict): Patient data
+            sign (int): 1 to add the row, -1 to remove it
+        """
+        date = self._date(row.get('appointment_date'))
+        if not date:
+            return
+        
+        day = self._days.get(date)
+        if day is None:
+            day = self._days[date] = {'visits': 0, 'revenue': 0.0, 'new': 0, 'old': 0, 'doctors': {}}
+            bisect.insort(self._dates, date)
+        
+        fee = self._fee(row.get('fees'))
+        day['visits'] += sign
+        day['revenue'] += sign * fee
+        
+        status = self._status(row.get('status'))
+        if status:
+            day[status] += sign
+        
+        self._add_to_tree(date, [sign, sign * fee, sign if status == 'new' else 0, sign if status == 'old' else 0])
+        
+        doctor = str(row.get('doctor_name', ''))
+        split = day['doctors'].setdefault(doctor, [0, 0.0])
+        split[0] += sign
+        split[1] += sign * fee
+        if split[0] <= 0:
+            del day['doctors'][doctor]
+        
+        if day['visits'] <= 0:
+            del self._days[date]
+            del self._dates[bisect.bisect_left(self._dates, date)]
+    
+    def _add_to_tree(self, date, deltas):
+        """
+        Add a day's change to the Fenwick tree
+        
+        Args:
+            date (str): Date in YYYY-MM-DD format
+            deltas (list): Change of each of TREE_FIELDS
+        """
+        ordinal = self._ordinal(date)
+        if ordinal is None:
+            return
+        
+        index = ordinal - self._tree_base
+        if 0 <= index < self._tree.size:
+            self._tree.add(index, deltas)
+        else:
+            # Outside the years covered; the rebuilt tree includes the change
+            self._build_tree()
+    
+    def apply_change(self, old, new):
+        """
+        Adjust the rollup for one changed patient
+        
+        Fee edits, status changes and moves to another date or doctor are
+        handled by taking the old row away and adding the new one.
+        
+        Args:
+            old (dict): Patient data before the change, None for an added patient
+            new (dict): Patient data after the change, None for a deleted patient
+        """
+        with self._lock:
+            if old:
+                self._add_row(old, -1)
+            if new:
+                self._add_row(new, 1)
+    
+    def apply_event(self, event):
+        """
+        Adjust the rollup for a patient change event
+        
+        Args:
+            event (PatientEvent): Change published by the patient model
+        """
+        self.apply_change(event.old, event.new)
+    
+    def get_days(self, start_date, end_date):
+        """
+        Get the rollup rows of a date range
+        
+        Args:
+            start_date (str): First date in YYYY-MM-DD format
+            end_date (str): Last date in YYYY-MM-DD format, inclusive
+        
+        Returns:
+            list: (date, day) tuples in date order, only for days with visits
+        """
+        with self._lock:
+            first = bisect.bisect_left(self._dates, start_date)
+            last = bisect.bisect_right(self._dates, end_date)
+            return [(date, self._days[date]) for date in self._dates[first:last]]
+    
+    def range_totals(self, start_date, end_date):
+        """
+        Get the totals of a date range from the Fenwick tree
+        
+        Args:
+            start_date (str): First date in YYYY-MM-DD format
+            end_date (str): Last date in YYYY-MM-DD format, inclusive
+        
+        Returns:
+            dict: visits, revenue, new and old totals of the range
+        """
+        first = self._ordinal(start_date)
+        last = self._ordinal(end_date)
+        if first is None or last is None:
+            raise ValueError(f"Invalid date range {start_date} to {end_date}")
+        
+        with self._lock:
+            first = max(first - self._tree_base, 0)
+            last = min(last - self._tree_base, self._tree.size - 1)
+            totals = self._tree.range_sum(first, last)
+        
+        return dict(zip(self.TREE_FIELDS, totals))
+    
+    def close(self):
+        """
+        Save the rollup with the change marker of the data it matches
+        
+        Queued writes are flushed and the changes the store has read from
+        other workstations are applied first, so the rollup holds at least
+        what the marker counts.
+        """
+        with self._lock:
+            self.store.flush()
+            marker = self.store.get_change_marker()
+            changes = self.store.poll_external_changes()
+            if changes is None:
+                self.rebuild()
+            else:
+                for patient_id, old, new in changes:
+                    self.apply_change(old, new)
+            self._save(marker)
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Data Migration for the Receptionist Application
+Moves patient data from the Excel workbook and its backups into SQLite
+"""
+
+import os
+import glob
+import math
+import logging
+import zlib
+from datetime import datetime, date, time
+
+from openpyxl import load_workbook
+
+from utils.sqlite_handler import SQLiteHandler
+from utils.excel_handler import ExcelHandler
+from utils.patient_journal import PatientJournal
+from utils.month_partitions import MonthPartitions
+from utils.columnar_archive import is_archive, read_archive
+
+logger = logging.getLogger('receptionist.data_migration')
+
+class DataMigrator:
+    """
+    Data Migrator class for the Receptionist Application
+    Streams patients.xlsx and the backup workbooks into the SQLite store
+    in batches and verifies the result with row counts and per-column
+    checksums. Changes still in the Excel store's journal are folded into
+    the workbook first, so the rows read are the ones the desks see.
+    """
+    
+    # Columns stored as plain dates; other datetime cells keep the time part
+    DATE_COLUMNS = ('appointment_date',)
+    
+    def __init__(self, settings, batch_size=1000):
+        """
+        Initialize the Data Migrator
+        
+        Args:
+            settings: Application settings
+            batch_size (int, optional): Rows inserted per transaction. Defaults to 1000.
+        """
+        self.settings = settings
+        self.batch_size = batch_size
+        self.excel_path = settings.get_excel_path()
+        self.backup_dir = os.path.join(os.path.dirname(self.excel_path), 'backups')
+        base_path = os.path.splitext(self.excel_path)[0]
+        self.partitions = MonthPartitions(base_path + '_partitions', os.path.basename(base_path))
+        self.journal_path = base_path + '.journal'
+        self.columns = SQLiteHandler.COLUMNS
+    
+    def unfolded_changes(self):
+        """
+        Count the changes in the Excel store's journal that are not in the workbook
+        
+        Returns:
+            int: Number of journal entries after the last checkpoint
+        """
+        if not os.path.exists(self.journal_path):
+            return 0
+        return PatientJournal(self.journal_path).entry_count
+    
+    def fold_journal(self):
+        """
+        Fold the Excel store's journal into the workbook and month partitions
+        
+        The store replays the journal and compacts it when it closes, as it
+        does when a desk exits.
+        
+        Raises:
+            ValueError: If changes are left in the journal, such as when
+                another workstation holds the lock file
+        """
+        if not os.path.exists(self.excel_path) or self.unfolded_changes() == 0:
+            return
+        
+        handler = ExcelHandler(self.settings)
+        handler.close()
+        
+        remaining = self.unfolded_changes()
+        if remaining:
+            raise ValueError(f"{remaining} changes could not be folded into {self.excel_path}; close every workstation and try again")
+        logger.info(f"Folded the journal into {self.excel_path}")
+    
+    def get_source_files(self, include_backups=True):
+        """
+        Get the workbooks to migrate, live workbook first
+        
+        The month partitions of past appointments follow the live workbook,
+        as they are live data too. Backups are returned newest first, so when the same patient appears in
+        several backups the most recent copy is the one that is kept.
+        
+        Args:
+            include_backups (bool, optional): Include backup workbooks. Defaults to True.
+        
+        Returns:
+            list: Paths of the workbooks to read
+        """
+        sources = []
+        if os.path.exists(self.excel_path):
+            sources.append(self.excel_path)
+        sources.extend(path for path in self.partitions.paths() if os.path.exists(path))
+        
+        if include_backups:
+            pattern = os.path.join(self.backup_dir, 'patients_backup_*.xlsx')
+            sources.extend(sorted(glob.glob(pattern), reverse=True))
+        
+        return sources
+    
+    def normalize_value(self, column, value):
+        """
+        Normalize a cell value read from a workbook
+        
+        Empty cells, NaN and the 'nan' strings written by older versions all
+        become None, so they are stored as NULL.
+        
+        Args:
+            column (str): Column name
+            value: Raw cell value
+        
+        Returns:
+            The normalized value
+        """
+        if value is None:
+            return None
+        
+        if isinstance(value, float):
+            if math.isnan(value):
+                return None
+            # Excel stores every number as a float; keep whole numbers as integers
+            if value.is_integer():
+                value = int(value)
+        
+        if isinstance(value, datetime):
+            if column in self.DATE_COLUMNS:
+                return value.strftime('%Y-%m-%d')
+            return value.strftime('%Y-%m-%d %H:%M:%S')
+        
+        if isinstance(value, date):
+            return value.strftime('%Y-%m-%d')
+        
+        if isinstance(value, time):
+            return value.strftime('%H:%M')
+        
+        if isinstance(value, str):
+            value = value.strip()
+            if value == '' or value.lower() == 'nan':
+                return None
+            return value
+        
+        if column == 'patient_id':
+            return str(value)
+        
+        return value
+    
+    def iter_workbook_records(self, path):
+        """
+        Stream normalized records from a workbook in read-only mode
+        
+        Args:
+            path (str): Path to the workbook
+        
+        Yields:
+            tuple: (row number, record tuple in COLUMNS order)
+        """
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            sheet = workbook.worksheets[0]
+            rows = sheet.iter_rows(values_only=True)
+            
+            header = next(rows, None)
+            if header is None:
+                return
+            
+            # Map our columns onto the workbook's header positions
+            positions = {name: index for index, name in enumerate(header) if name}
+            column_positions = [positions.get(col) for col in self.columns]
+            
+            for row_number, row in enumerate(rows, start=2):
+                if not any(cell is not None for cell in row):
+                    continue
+                
+                record = tuple(
+                    self.normalize_value(col, row[pos] if pos is not None and pos < len(row) else None)
+                    for col, pos in zip(self.columns, column_positions)
+                )
+                yield row_number, record
+        finally:
+            workbook.close()
+    
+    def iter_archive_records(self, path):
+        """
+        Read normalized records from a frozen month's column file
+        
+        Args:
+            path (str): Path to the archive file
+        
+        Yields:
+            tuple: (row number as the month's workbook would have it, record tuple in COLUMNS order)
+        """
+        df = read_archive(path)
+        for row_number, row in enumerate(df.itertuples(index=False), start=2):
+            values = dict(zip(df.columns, row))
+            yield row_number, tuple(self.normalize_value(col, values.get(col)) for col in self.columns)
+    
+    def _canonical(self, column, value):
+        """
+        Get the canonical text used when checksumming a value
+        
+        SQLite stores numeric text in the NUMERIC columns as numbers, so
+        numbers are formatted the same way on both sides of the comparison.
+        
+        Args:
+            column (str): Column name
+            value: Value to canonicalize
+        
+        Returns:
+            str: Canonical text
+        """
+        if value is None:
+            return ''
+        
+        if column in SQLiteHandler.NUMERIC_COLUMNS:
+            try:
+                number = float(value)
+                if number.is_integer():
+                    return str(int(number))
+                return repr(number)
+            except (TypeError, ValueError):
+                pass
+        
+        return str(value)
+    
+    def _add_to_checksums(self, checksums, record):
+        """
+        Add a record to the running per-column checksums
+        
+        The checksum of a column is the sum of crc32(patient_id, value) over
+        all rows, which does not depend on row order.
+        
+        Args:
+            checksums (dict): Column name to running checksum
+            record (tuple): Record in COLUMNS order
+        """
+        patient_id = record[0]
+        for col, value in zip(self.columns, record):
+            data = f"{patient_id}\x1f{self._canonical(col, value)}".encode('utf-8')
+            checksums[col] = (checksums[col] + zlib.crc32(data)) % (1 << 64)
+    
+    def migrate(self, store, include_backups=True, force=False):
+        """
+        Migrate all workbooks into the SQLite store and verify the result
+        
+        The verification fails if a workstation changed the Excel store
+        while the workbooks were being read.
+        
+        Args:
+            store (SQLiteHandler): Target store
+            include_backups (bool, optional): Also import rows that only exist
+                in backup workbooks. Defaults to True.
+            force (bool, optional): Clear a non-empty target first. Defaults to False.
+        
+        Returns:
+            dict: Migration report
+        
+        Raises:
+            ValueError: If the target is not empty and force is not set, or
+                the journal could not be folded
+        """
+        self.fold_journal()
+        
+        if store.get_patient_count() > 0:
+            if not force:
+                raise ValueError(f"Target database {store.db_path} already contains patients; use force to replace them")
+            store.clear_all_patients()
+        
+        report = {
+            'sources': [],
+            'rows_read': 0,
+            'rows_imported': 0,
+            'duplicates_skipped': 0,
+            'missing_id_skipped': 0,
+            'verified': False,
+            'mismatched_columns': [],
+            'unfolded_changes': 0
+        }
+        
+        # Only the IDs are kept in memory, never whole rows
+        seen_ids = set()
+        expected_checksums = {col: 0 for col in self.columns}
+        started = datetime.now()
+        
+        live_workbooks = [self.excel_path] + self.partitions.paths()
+        for source in self.get_source_files(include_backups):
+            is_live_workbook = source in live_workbooks
+            source_report = {'path': source, 'rows_read': 0, 'rows_imported': 0}
+            batch = []
+            
+            records = self.iter_archive_records(source) if is_archive(source) else self.iter_workbook_records(source)
+            for row_number, record in records:
+                source_report['rows_read'] += 1
+                
+                if record[0] is None:
+                    if not is_live_workbook:
+                        report['missing_id_skipped'] += 1
+                        continue
+                    # Keep live rows without an ID under a stable generated one,
+                    # numbered per workbook
+                    prefix = '' if source == self.excel_path else os.path.splitext(os.path.basename(source))[0][-7:] + '-'
+                    record = (f"M{prefix}{row_number:06d}",) + record[1:]
+                
+                if record[0] in seen_ids:
+                    report['duplicates_skipped'] += 1
+                    continue
+                
+                seen_ids.add(record[0])
+                self._add_to_checksums(expected_checksums, record)
+                batch.append(record)
+                
+                if len(batch) >= self.batch_size:
+                    source_report['rows_imported'] += store.import_records(batch)
+                    batch = []
+            
+            if batch:
+                source_report['rows_imported'] += store.import_records(batch)
+            
+            report['rows_read'] += source_report['rows_read']
+            report['rows_imported'] += source_report['rows_imported']
+            report['sources'].append(source_report)
+            logger.info(f"Migrated {source_report['rows_imported']} of {source_report['rows_read']} rows from {source}")
+        
+        # Verify the row count and the per-column checksums against the database
+        actual_checksums = {col: 0 for col in self.columns}
+        actual_count = 0
+        for record in store.iter_records(self.batch_size):
+            actual_count += 1
+            self._add_to_checksums(actual_checksums, record)
+        
+        report['expected_rows'] = len(seen_ids)
+        report['actual_rows'] = actual_count
+        report['mismatched_columns'] = [
+            col for col in self.columns
+            if expected_checksums[col] != actual_checksums[col]
+        ]
+        # Rows a workstation changed meanwhile are not in what was read
+        report['unfolded_changes'] = self.unfolded_changes()
+        report['verified'] = (actual_count == len(seen_ids) and not report['mismatched_columns']
+                              and report['unfolded_changes'] == 0)
+        report['seconds'] = (datetime.now() - started).total_seconds()
+        
+        if report['verified']:
+            logger.info(f"Migration verified: {actual_count} rows in {report['seconds']:.1f}s")
+        else:
+            logger.error(
+                f"Migration verification failed: expected {len(seen_ids)} rows, found {actual_count}; "
+                f"mismatched columns: {report['mismatched_columns']}; "
+                f"changes made during the migration: {report['unfolded_changes']}"
+            )
+        
+        return report
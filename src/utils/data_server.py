@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Data Server for the Receptionist Application
+Serves one warm patient store to every desk over local HTTP
+"""
+
+import json
+import uuid
+import hmac
+import logging
+import secrets
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from utils.patient_store import create_patient_store
+
+logger = logging.getLogger('receptionist.data_server')
+
+def encode_value(value):
+    """
+    Turn a store result into something JSON can carry
+    
+    Args:
+        value: Result of a store method
+    
+    Returns:
+        The value, with a DataFrame replaced by a '__frame__' dict
+    """
+    if isinstance(value, pd.DataFrame):
+        return {'__frame__': {'columns': list(value.columns), 'data': value.values.tolist()}}
+    return value
+
+def decode_value(value):
+    """
+    Undo encode_value()
+    
+    Args:
+        value: Decoded JSON result
+    
+    Returns:
+        The value, with a '__frame__' dict turned back into a DataFrame
+    """
+    if isinstance(value, dict) and '__frame__' in value:
+        frame = value['__frame__']
+        return pd.DataFrame(frame['data'], columns=frame['columns'])
+    return value
+
+def json_default(value):
+    """
+    Convert the values json cannot write itself, such as numpy numbers and timestamps
+    
+    Args:
+        value: Value json.dumps() could not serialize
+    
+    Returns:
+        A plain Python number, or the value as a string
+    """
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+class DataServer:
+    """
+    Data Server class for the Receptionist Application
+    Owns the patient store and the daily rollup, so their caches and
+    indexes are built once and stay warm, and every desk reads them over
+    HTTP instead of parsing the shared workbook itself.
+    
+    Desks POST a batch of calls to /rpc as JSON and get one result per
+    call back, over a kept-alive connection. Each write is answered once
+    it is durable, and is added to a change feed that the other desks
+    poll to update their views.
+    """
+    
+    # Changes kept in the feed; a desk further behind refreshes fully
+    FEED_SIZE = 1000
+    
+    # Seconds a write may take to become durable before it is reported failed
+    WRITE_TIMEOUT = 30
+    
+    # Largest request body accepted; a batch of calls is far smaller
+    MAX_REQUEST_BYTES = 1024 * 1024
+    
+    # Store methods desks may call as they are
+    READ_METHODS = (
+        'get_all_patients',
+        'get_patient_count',
+        'get_patients_slice',
+        'get_patient_by_id',
+        'get_patients_by_name',
+        'get_next_token_number',
+        'get_appointments_for_date',
+        'get_appointments_between',
+        'get_appointments_for_doctor'
+    )
+    
+    def __init__(self, settings, host=None, port=None):
+        """
+        Initialize the Data Server and open the store
+        
+        Args:
+            settings: Application settings
+            host (str, optional): Address to listen on. Defaults to the
+                host of the 'server_address' setting.
+            port (int, optional): Port to listen on. Defaults to the port
+                of the 'server_address' setting.
+        """
+        default_host, _, default_port = settings.get('server_address', '127.0.0.1:8765').rpartition(':')
+        self.host = host or default_host or '127.0.0.1'
+        self.port = int(port if port is not None else default_port)
+        self.token = settings.get('server_token', '')
+        if not self.token:
+            # Never serve without a token; desks copy this one from the settings file
+            self.token = secrets.token_hex(16)
+            settings.set('server_token', self.token)
+            logger.info("Generated a server token and saved it as server_token in the settings")
+        
+        self.store = create_patient_store(settings, settings.get('server_storage_backend', 'excel'))
+        self.rollup = self.store.create_daily_rollup()
+        
+        # Changes as (seq, client_id, patient_id, old, new), newest last
+        self._feed = deque(maxlen=self.FEED_SIZE)
+        self._seq = 0
+        # Desks whose cursor is before this must refresh fully
+        self._reset_seq = 0
+        # Changes the session's desks can no longer be told about after a restart
+        self.session = uuid.uuid4().hex
+        
+        # One write at a time, so the rows read around it belong to it
+        self._write_lock = threading.Lock()
+        self._feed_lock = threading.Lock()
+        
+        self._methods = {name: getattr(self.store, name) for name in self.READ_METHODS}
+        self._methods.update({
+            'hello': self.hello,
+            'add_patient': self.add_patient,
+            'update_patient': self.update_patient,
+            'delete_patient': self.delete_patient,
+            'changes_since': self.changes_since,
+            'create_backup': self.store.create_backup,
+            'rollup_get_days': self.rollup.get_days,
+            'rollup_range_totals': self.rollup.range_totals
+        })
+        # Methods that are told which desk called them
+        self._client_methods = ('add_patient', 'update_patient', 'delete_patient', 'changes_since')
+        
+        self._httpd = None
+    
+    def hello(self):
+        """
+        Describe the server to a desk that just connected
+        
+        Returns:
+            dict: storage_path, session and the current feed seq
+        """
+        with self._feed_lock:
+            return {'storage_path': self.store.storage_path, 'session': self.session, 'seq': self._seq}
+    
+    def _record(self, client_id, patient_id, old, new):
+        """
+        Count a change in the rollup and add it to the feed
+        
+        Args:
+            client_id (str): Desk that made the change, None for a change
+                made outside the server
+            patient_id (str): Patient ID
+            old (dict): Row before the change, None for an added patient
+            new (dict): Row after the change, None for a deleted patient
+        """
+        self.rollup.apply_change(old, new)
+        with self._feed_lock:
+            self._seq += 1
+            self._feed.append((self._seq, client_id, patient_id, old, new))
+    
+    def _write_durably(self, write, *args):
+        """
+        Run a store write and wait until it is durable
+        
+        Args:
+            write (callable): add_patient, update_patient or delete_patient of the store
+            *args: Arguments before on_complete
+        
+        Returns:
+            bool: True if the change is durable
+        """
+        done = threading.Event()
+        outcome = {}
+        
+        def on_complete(success):
+            outcome['success'] = success
+            done.set()
+        
+        if not write(*args, on_complete):
+            return False
+        if not done.wait(self.WRITE_TIMEOUT):
+            logger.error("Timed out waiting for a write to become durable")
+            return False
+        return outcome['success']
+    
+    def add_patient(self, client_id, patient_data):
+        """
+        Add a patient for a desk
+        
+        Args:
+            client_id (str): Calling desk
+            patient_data (dict): Patient data
+        
+        Returns:
+            dict: success, and the patient_id and token_number given out
+        """
+        with self._write_lock:
+            success = self._write_durably(self.store.add_patient, patient_data)
+            if success:
+                patient_id = patient_data['patient_id']
+                self._record(client_id, patient_id, None, self.store.get_patient_by_id(patient_id))
+        
+        return {
+            'success': success,
+            'patient_id': patient_data.get('patient_id'),
+            'token_number': patient_data.get('token_number')
+        }
+    
+    def update_patient(self, client_id, patient_id, patient_data):
+        """
+        Update a patient for a desk
+        
+        Args:
+            client_id (str): Calling desk
+            patient_id (str): Patient ID
+            patient_data (dict): Updated patient data, optionally with a 'version'
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        with self._write_lock:
+            old = self.store.get_patient_by_id(patient_id)
+            success = self._write_durably(self.store.update_patient, patient_id, patient_data)
+            if success:
+                self._record(client_id, patient_id, old, self.store.get_patient_by_id(patient_id))
+        return success
+    
+    def delete_patient(self, client_id, patient_id):
+        """
+        Delete a patient for a desk
+        
+        Args:
+            client_id (str): Calling desk
+            patient_id (str): Patient ID
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        with self._write_lock:
+            old = self.store.get_patient_by_id(patient_id)
+            success = self._write_durably(self.store.delete_patient, patient_id)
+            if success and old:
+                self._record(client_id, patient_id, old, None)
+        return success
+    
+    def changes_since(self, client_id, session, seq):
+        """
+        Get the changes other desks made after a point in the feed
+        
+        Changes made to the store outside the server, such as by a desk
+        still opening the data folder directly, are picked up first.
+        
+        Args:
+            client_id (str): Calling desk; its own changes are left out
+            session (str): Session the desk's seq belongs to
+            seq (int): Last feed seq the desk has seen
+        
+        Returns:
+            dict: session, the current seq, and changes as
+                (seq, patient_id, old, new) lists, or None if the desk
+                fell too far behind and must refresh fully
+        """
+        with self._write_lock:
+            external = self.store.poll_external_changes()
+            if external is None:
+                self.rollup.rebuild()
+                with self._feed_lock:
+                    self._reset_seq = self._seq
+            else:
+                for patient_id, old, new in external:
+                    self._record(None, patient_id, old, new)
+        
+        with self._feed_lock:
+            oldest = self._feed[0][0] if self._feed else self._seq + 1
+            if session != self.session or seq < self._reset_seq or seq + 1 < oldest:
+                changes = None
+            else:
+                changes = [
+                    [entry_seq, patient_id, old, new]
+                    for entry_seq, origin, patient_id, old, new in self._feed
+                    if entry_seq > seq and origin != client_id
+                ]
+            return {'session': self.session, 'seq': self._seq, 'changes': changes}
+    
+    def call(self, client_id, method, params):
+        """
+        Run one call of a batch
+        
+        Args:
+            client_id (str): Calling desk
+            method (str): Method name
+            params (list): Positional arguments
+        
+        Returns:
+            dict: {'result': value} or {'error': message}
+        """
+        if method not in self._methods:
+            return {'error': f"Unknown method '{method}'"}
+        
+        try:
+            if method in self._client_methods:
+                result = self._methods[method](client_id, *params)
+            else:
+                result = self._methods[method](*params)
+            return {'result': encode_value(result)}
+        except Exception as e:
+            logger.error(f"Error in {method}: {e}")
+            return {'error': str(e)}
+    
+    def handle_batch(self, request):
+        """
+        Run a batch of calls in order
+        
+        Args:
+            request (dict): client_id and calls, a list of {'method', 'params'}
+        
+        Returns:
+            dict: results, one per call
+        """
+        client_id = request.get('client_id')
+        return {'results': [
+            self.call(client_id, call.get('method'), call.get('params', []))
+            for call in request.get('calls', [])
+        ]}
+    
+    def _make_handler(self):
+        """
+        Create the request handler class bound to this server
+        
+        Returns:
+            type: BaseHTTPRequestHandler subclass
+        """
+        server = self
+        
+        class RequestHandler(BaseHTTPRequestHandler):
+            # HTTP/1.1 keeps each desk's connection open between batches
+            protocol_version = 'HTTP/1.1'
+            
+            def do_POST(self):
+                if self.path != '/rpc':
+                    self._reply(404, {'error': 'Not found'})
+                    return
+                
+                # The body is left unread on these errors, so the
+                # connection cannot be reused after them
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    self.close_connection = True
+                    self._reply(400, {'error': 'Invalid Content-Length'})
+                    return
+                if length > server.MAX_REQUEST_BYTES:
+                    self.close_connection = True
+                    self._reply(413, {'error': 'Request too large'})
+                    return
+                body = self.rfile.read(length)
+                
+                if not hmac.compare_digest(self.headers.get('X-Clinic-Token', ''), server.token):
+                    self._reply(403, {'error': 'Invalid token'})
+                    return
+                
+                try:
+                    request = json.loads(body)
+                except ValueError:
+                    self._reply(400, {'error': 'Invalid JSON'})
+                    return
+                
+                self._reply(200, server.handle_batch(request))
+            
+            def _reply(self, status, payload):
+                data = json.dumps(payload, default=json_default).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def log_message(self, format, *args):
+                logger.debug(f"{self.address_string()} {format % args}")
+        
+        return RequestHandler
+    
+    def start(self):
+        """Start listening; requests are served on background threads"""
+        self._httpd = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._httpd.daemon_threads = True
+        # Port 0 picks a free port; report the one actually used
+        self.port = self._httpd.server_address[1]
+        
+        threading.Thread(target=self._httpd.serve_forever, name='data-server', daemon=True).start()
+        logger.info(f"Data server listening on {self.host}:{self.port} for {self.store.storage_path}")
+    
+    def stop(self):
+        """Stop listening and close the store"""
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+        
+        self.rollup.close()
+        self.store.close()
+        logger.info("Data server stopped")
@@ -6,43 +6,43 @@ Handles reading and writing patient data to Excel
 """
 
 import os
+import time
 import logging
 import pandas as pd
 from datetime import datetime
 import shutil
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
+from utils.patient_store import PatientStore
+from utils.patient_journal import PatientJournal, apply_entry, entry_applies, row_version
+from utils.async_writer import AsyncWriter
+from utils.backup_manager import BackupManager
+from utils.patient_index import PatientIndex
+from utils.name_index import NameIndex
+from utils.token_counter import TokenCounter
+from utils.file_lock import FileLock, FileLockTimeout
+from utils.patient_schema import typed_frame, plain_frame, plain_row, plain_value
+from utils.month_partitions import MonthPartitions
+from utils.daily_rollup import DailyRollup
+
 logger = logging.getLogger('receptionist.excel_handler')
 
-class ExcelHandler:
+class ExcelHandler(PatientStore):
     """
     Excel Handler class for the Receptionist Application
     Handles reading and writing patient data to Excel
+    
+    Several workstations may share the workbook on a network folder. Journal
+    appends and compaction happen under a lock file, and each workstation
+    catches up on the others' changes by reading only the journal lines
+    added since it last looked. Updates made against a known row version
+    are rejected if another workstation changed the row first.
     """
     
-    # Define the columns for the Excel file
-    COLUMNS = [
-        'patient_id', 
-        'token_number',
-        'first_name', 
-        'last_name', 
-        'guardian_relation',
-        'address', 
-        'city',
-        'postal_code',
-        'phone_number', 
-        'email',
-        'doctor_name', 
-        'appointment_date', 
-        'appointment_time',  # This is used for checkup time
-        'arrival_time',
-        'appointment_duration',
-        'fees',
-        'reason_for_visit',
-        'remarks',
-        'created_at',
-        'updated_at'
-    ]
+    # Seconds a full parse waits for another workstation to finish writing
+    PARSE_LOCK_TIMEOUT = 5
     
     def __init__(self, settings):
         """
@@ -53,7 +53,86 @@ class ExcelHandler:
         """
         self.settings = settings
         self.excel_path = settings.get_excel_path()
+        self.storage_path = self.excel_path
+        
+        # In-memory copy of the workbook, valid while the file signature matches
+        self._cache_df = None
+        self._cache_signature = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        # Lookup tables over the cached DataFrame, kept in step with it
+        self._index = PatientIndex()
+        
+        # Name search index, built on the first search after each parse
+        self._name_index = None
+        
+        # Changes are appended to the journal and folded into the workbook later
+        self.journal = PatientJournal(os.path.splitext(self.excel_path)[0] + '.journal')
+        self.compact_threshold = settings.get('journal_compact_threshold', 200)
+        
+        # Guards the cached DataFrame, shared by the UI and the writer thread
+        self._lock = threading.RLock()
+        
+        # Keeps other workstations out while the journal or workbook changes.
+        # Taken after self._lock, never while waiting for it.
+        self._file_lock = FileLock(os.path.splitext(self.excel_path)[0] + '.lock', timeout=60)
+        
+        # How far into the shared journal the cache has read, and the workbook
+        # generation and signature it started from
+        self._journal_offset = 0
+        self._generation = 0
+        # Changes folded into the workbook over all generations
+        self._sequence = 0
+        self._workbook_signature = None
+        
+        # Patient IDs with changes of ours not in the journal yet
+        self._pending_ids = {}
+        
+        # Set when the cache no longer matches the files and must be parsed
+        # again once our queued writes are on disk
+        self._reload_needed = False
+        
+        # Changes read from other workstations since the last poll, as
+        # (patient_id, old, new); None when the cache was parsed again
+        self._external_changes = []
+        self._loaded_once = False
+        
+        # Past months live in their own workbooks, parsed only when needed
+        base_path = os.path.splitext(self.excel_path)[0]
+        self.partitions = MonthPartitions(
+            base_path + '_partitions',
+            os.path.basename(base_path),
+            settings.get('partition_cache_months', MonthPartitions.DEFAULT_CACHE_MONTHS)
+        )
+        # patient_id -> month of the archived patients the name index holds
+        self._archived_months = {}
+        # Months older than this are frozen into compressed column files
+        self.cold_archive_after_months = settings.get('cold_archive_after_months', 24)
+        
+        # Token numbers are given out from a per-day counter file instead of
+        # scanning the day's rows on every save
+        self._tokens = TokenCounter(
+            os.path.splitext(self.excel_path)[0] + '_tokens.json',
+            self._max_token_number
+        )
+        
+        # Changes applied in memory whose journal entries are not on disk yet
+        self._pending_writes = 0
+        
+        # Periodic snapshots plus per-change deltas, instead of a full copy per save
+        self.backup_manager = BackupManager(
+            settings,
+            os.path.join(os.path.dirname(self.excel_path), 'backups'),
+            '.xlsx',
+            self._write_snapshot
+        )
+        
         self.ensure_excel_file()
+        self.backup_manager.start()
+        
+        # Journal writes and compaction run on a background thread
+        self._writer = AsyncWriter(self._flush_entries, name='excel-writer')
         
     def ensure_excel_file(self):
         """Ensure the Excel file exists with proper structure"""
@@ -63,76 +142,929 @@ class ExcelHandler:
                 df = pd.DataFrame(columns=self.COLUMNS)
                 
                 # Save the DataFrame to Excel
-                df.to_excel(self.excel_path, index=False)
+                self._save_dataframe(df)
                 logger.info(f"Created new Excel file at {self.excel_path}")
             else:
                 # Verify the Excel file has the proper columns
-                df = pd.read_excel(self.excel_path)
+                df = self._load_dataframe()
                 
                 # Check if all required columns exist
                 missing_columns = set(self.COLUMNS) - set(df.columns)
                 
                 if missing_columns:
+                    # Create a backup before modifying
+                    self.backup_manager.create_snapshot()
+                    
                     # Add missing columns
                     for col in missing_columns:
                         df[col] = ''
                     
-                    # Create a backup before modifying
-                    self._create_backup()
-                    
                     # Save the updated DataFrame to Excel
-                    df.to_excel(self.excel_path, index=False)
+                    self._save_dataframe(df)
                     logger.info(f"Added missing columns to Excel file: {missing_columns}")
         except Exception as e:
             logger.error(f"Error ensuring Excel file: {e}")
             raise
     
-    def _create_backup(self):
-        """Create a backup of the Excel file"""
+    def _get_file_signature(self):
+        """
+        Get the signature used to detect changes to the Excel file and journal on disk
+        
+        Returns:
+            tuple: (mtime in nanoseconds, size in bytes) of the workbook and the
+                journal, with None for a missing file
+        """
+        signature = []
+        for path in (self.excel_path, self.journal.journal_path):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+    
+    def _get_workbook_signature(self):
+        """
+        Get the signature of the workbook alone
+        
+        Returns:
+            tuple: (mtime in nanoseconds, size in bytes), or None if it is missing
+        """
+        try:
+            stat = os.stat(self.excel_path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+    
+    @contextmanager
+    def _write_locks(self):
+        """
+        Hold the cache lock and the shared lock file
+        
+        The lock file is only tried while holding the cache lock, and the
+        cache lock is let go between tries, so a reader waiting for the
+        cache never blocks a writer of this process that holds the file.
+        
+        Raises:
+            FileLockTimeout: If another workstation kept the lock past its timeout
+        """
+        deadline = time.monotonic() + self._file_lock.timeout
+        while True:
+            self._lock.acquire()
+            if self._file_lock.try_acquire(timeout=0):
+                break
+            self._lock.release()
+            if time.monotonic() >= deadline:
+                raise FileLockTimeout(f"Timed out waiting for {self._file_lock.lock_path}")
+            time.sleep(FileLock.POLL_INTERVAL)
+        
+        try:
+            yield
+        finally:
+            self._file_lock.release()
+            self._lock.release()
+    
+    def _row_dict(self, patient_id):
+        """
+        Get a cached patient row as a dict
+        
+        The caller holds the lock and has loaded the DataFrame.
+        
+        Args:
+            patient_id (str): Patient ID
+        
+        Returns:
+            dict: Patient data or None if not found
+        """
+        labels = self._index.get_labels(patient_id)
+        if len(labels) == 0:
+            return None
+        return plain_row(self._cache_df.loc[labels[0]])
+    
+    def _catch_up_locked(self):
+        """
+        Apply the journal lines other workstations wrote since the cache last read it
+        
+        The caller holds the lock and the lock file. If another workstation
+        folded the journal into the workbook, the new workbook is adopted
+        without parsing it when the cache had read exactly what was folded.
+        
+        Returns:
+            bool: False if the cache must be parsed again instead
+        """
+        if self._cache_df is None:
+            return False
+        
+        workbook_signature = self._get_workbook_signature()
+        
+        if workbook_signature != self._workbook_signature:
+            result = self.journal.read_from(0)
+            if not result or not result[0]:
+                return False
+            entries, end = result
+            checkpoint = entries[0]
+            if (checkpoint['op'] != PatientJournal.CHECKPOINT
+                    or checkpoint.get('generation') != self._generation + 1
+                    or checkpoint.get('folded_size') != self._journal_offset):
+                return False
+            
+            self._generation += 1
+            self._sequence = checkpoint.get('sequence', self._sequence + self.journal.entry_count)
+            self._workbook_signature = workbook_signature
+            self.journal.entry_count = 0
+            if checkpoint.get('archived_before'):
+                self._drop_months_before_locked(checkpoint['archived_before'])
+            entries = entries[1:]
+        else:
+            result = self.journal.read_from(self._journal_offset)
+            if result is None:
+                return False
+            entries, end = result
+        
+        for entry in entries:
+            if entry['op'] == PatientJournal.CHECKPOINT:
+                return False
+            
+            patient_id = entry['patient_id']
+            self.journal.entry_count += 1
+            
+            if self._pending_ids.get(patient_id):
+                # Both workstations changed this patient at once; the journal
+                # order decides, so read it back once our writes are down
+                logger.warning(f"Patient {patient_id} was changed on another workstation at the same time")
+                self._reload_needed = True
+                continue
+            
+            old = self._row_dict(patient_id)
+            if old is None and entry['op'] == 'delete':
+                # An archived patient; the entry carries the removed row
+                old = entry.get('data') or None
+            self._cache_df = self._apply_change(self._cache_df, entry)
+            new = self._row_dict(patient_id)
+            
+            # A patient brought back from a month partition was counted already
+            if entry.get('moved_from'):
+                self._archived_months.pop(patient_id, None)
+                continue
+            if old != new and self._external_changes is not None:
+                self._external_changes.append((patient_id, old, new))
+        
+        if entries:
+            logger.info(f"Applied {len(entries)} journal entries from other workstations")
+        
+        self._journal_offset = end
+        self._cache_signature = self._get_file_signature()
+        return True
+    
+    def _load_dataframe(self):
+        """
+        Get the patient DataFrame, parsing the Excel file only if it changed on disk
+        
+        The returned DataFrame is the cached instance itself. Callers that hand
+        data out of the handler must return a copy so the cache is never
+        modified from outside.
+        
+        Returns:
+            pandas.DataFrame: DataFrame containing all patients
+        """
+        with self._lock:
+            return self._load_dataframe_locked()
+    
+    def _load_dataframe_locked(self):
+        """
+        Body of _load_dataframe(); the caller holds the lock
+        
+        Returns:
+            pandas.DataFrame: DataFrame containing all patients
+        """
+        # While writes are queued the cache holds changes that are not on disk
+        # yet, so it stays the source of truth until they are flushed
+        if self._cache_df is not None and self._pending_writes > 0:
+            self.cache_hits += 1
+            return self._cache_df
+        
+        signature = self._get_file_signature()
+        
+        if self._cache_df is not None and not self._reload_needed:
+            if signature == self._cache_signature:
+                self.cache_hits += 1
+                return self._cache_df
+            
+            # Another workstation wrote; read only what it added. If it is
+            # writing right now, the cache is served as it is.
+            if not self._file_lock.try_acquire(timeout=0):
+                self.cache_hits += 1
+                return self._cache_df
+            try:
+                caught_up = self._catch_up_locked()
+            finally:
+                self._file_lock.release()
+            if caught_up:
+                self.cache_hits += 1
+                return self._cache_df
+        
+        self.cache_misses += 1
+        
+        # Parse with the files at rest; past the timeout, parse anyway
+        locked = self._file_lock.try_acquire(timeout=self.PARSE_LOCK_TIMEOUT)
+        try:
+            workbook_signature = self._get_workbook_signature()
+            signature = self._get_file_signature()
+            df = pd.read_excel(self.excel_path)
+            
+            # Categorical, integer and date columns instead of object strings
+            df = typed_frame(df)
+            
+            self._index.build(self._index_keys(df))
+            self._name_index = None
+            self._archived_months = {}
+            
+            # Replay changes that have not been folded into the workbook yet
+            entries, end = self.journal.read_from(0) or ([], 0)
+            for entry in entries:
+                df = self._apply_change(df, entry)
+            
+            changes = [entry for entry in entries if entry['op'] != PatientJournal.CHECKPOINT]
+            if changes:
+                logger.info(f"Replayed {len(changes)} journal entries onto {self.excel_path}")
+            
+            self._journal_offset = end
+            checkpoint = entries[0] if entries and entries[0]['op'] == PatientJournal.CHECKPOINT else {}
+            self._generation = checkpoint.get('generation', 0)
+            self._sequence = checkpoint.get('sequence', 0)
+            self._workbook_signature = workbook_signature
+            self.journal.entry_count = len(changes)
+        finally:
+            if locked:
+                self._file_lock.release()
+        
+        self._cache_df = df
+        self._cache_signature = signature
+        self._reload_needed = False
+        
+        # Views cannot be told row by row what a fresh parse changed
+        if self._loaded_once:
+            self._external_changes = None
+        self._loaded_once = True
+        logger.debug(f"Parsed Excel file into cache ({len(df)} rows)")
+        
+        return df
+    
+    def _save_dataframe(self, df):
+        """
+        Write the full DataFrame to the Excel file and keep it as the cached copy
+        
+        The workbook is written to a temporary file and swapped in, then the
+        journal is emptied because its changes are now part of the workbook.
+        
+        Args:
+            df (pandas.DataFrame): DataFrame to save
+        """
+        df = df.reset_index(drop=True)
+        
+        with self._write_locks():
+            temp_path = self.excel_path + '.tmp.xlsx'
+            plain_frame(df).to_excel(temp_path, index=False)
+            os.replace(temp_path, self.excel_path)
+            self._generation += 1
+            self._sequence += self.journal.entry_count
+            self._journal_offset = self.journal.checkpoint(self._generation, self._journal_offset, sequence=self._sequence)
+            self._workbook_signature = self._get_workbook_signature()
+            
+            # The file we just wrote matches the DataFrame in memory
+            self._cache_df = typed_frame(df)
+            self._index.build(self._index_keys(self._cache_df))
+            self._name_index = None
+            self._archived_months = {}
+            self._cache_signature = self._get_file_signature()
+            self._loaded_once = True
+    
+    @staticmethod
+    def _index_keys(df):
+        """
+        Get the columns the index is built from, with dates as YYYY-MM-DD text
+        
+        Args:
+            df (pandas.DataFrame): Typed DataFrame
+        
+        Returns:
+            pandas.DataFrame: patient_id, appointment_date and doctor_name
+        """
+        return plain_frame(df[['patient_id', 'appointment_date', 'doctor_name']])
+    
+    @staticmethod
+    def _index_values(df, label):
+        """
+        Get the date and doctor a row is indexed under
+        
+        Args:
+            df (pandas.DataFrame): Typed DataFrame
+            label: Row label
+        
+        Returns:
+            tuple: (appointment_date as YYYY-MM-DD text, doctor_name)
+        """
+        return plain_value(df.at[label, 'appointment_date']), plain_value(df.at[label, 'doctor_name'])
+    
+    def _apply_change(self, df, entry):
+        """
+        Apply a journal entry to the cached DataFrame and its index
+        
+        Args:
+            df (pandas.DataFrame): Cached DataFrame
+            entry (dict): Journal entry
+            
+        Returns:
+            pandas.DataFrame: The changed DataFrame
+        """
+        if entry['op'] == PatientJournal.CHECKPOINT:
+            return df
+        
+        patient_id = entry['patient_id']
+        labels = self._index.get_labels(patient_id)
+        
+        # An update made against a version the row no longer has is skipped
+        if not entry_applies(df, entry, labels):
+            return df
+        
+        # Take the rows out of the index under the values they were indexed with
+        for label in labels:
+            self._index.remove_row(label, patient_id, *self._index_values(df, label))
+        
+        df = apply_entry(df, entry, labels)
+        
+        if entry['op'] == 'add' and not labels:
+            # A new patient is appended as the last row
+            labels = [df.index[-1]]
+        elif entry['op'] == 'delete':
+            labels = []
+        
+        for label in labels:
+            self._index.add_row(label, patient_id, *self._index_values(df, label))
+        
+        if self._name_index is not None:
+            if entry['op'] == 'delete':
+                self._name_index.remove(patient_id)
+            elif labels and (entry['op'] == 'add' or {'first_name', 'last_name'} & set(entry.get('data', {}))):
+                row = df.loc[labels[0]]
+                self._name_index.add(patient_id, row['first_name'], row['last_name'], row.get('name_key'))
+        
+        return df
+    
+    def _get_name_index(self):
+        """
+        Get the name index, building it if needed
+        
+        The archived months are parsed and indexed without holding the lock,
+        so saves and reads on the Tk thread do not wait for them; the lock is
+        taken again to add the cached patients and install the index. The
+        caller does not hold the lock.
+        
+        Returns:
+            NameIndex: Index over every patient's name
+        """
+        while True:
+            with self._lock:
+                self._load_dataframe()
+                if self._name_index is not None:
+                    return self._name_index
+                generation = self._generation
+            
+            # Archived patients are searchable too; their rows stay on disk
+            # and the index remembers which month holds each one
+            rows = []
+            archived_months = {}
+            for month in self._partition_months():
+                cold = self.partitions.frame(month)
+                for patient_id, first_name, last_name, name_key in zip(
+                    cold.get('patient_id', []), cold.get('first_name', []), cold.get('last_name', []),
+                    cold.get('name_key', [''] * len(cold))
+                ):
+                    rows.append((patient_id, first_name, last_name, name_key or None))
+                    archived_months[patient_id] = month
+            name_index = NameIndex()
+            name_index.build(rows)
+            
+            with self._lock:
+                df = self._load_dataframe()
+                if self._name_index is not None:
+                    return self._name_index
+                if generation != self._generation:
+                    # A compaction moved rows into the partitions meanwhile
+                    continue
+                
+                # Rows saved before phonetic keys existed get theirs now; the
+                # cache is written back at the next compaction, so this happens once
+                if 'name_key' not in df.columns:
+                    df['name_key'] = ''
+                blank = df['name_key'].astype(str).str.strip() == ''
+                if blank.any():
+                    df['name_key'] = df['name_key'].astype(object)
+                    df.loc[blank, 'name_key'] = [
+                        NameIndex.name_key(first_name, last_name)
+                        for first_name, last_name in zip(df.loc[blank, 'first_name'], df.loc[blank, 'last_name'])
+                    ]
+                
+                # The cached row of a patient found in both places is the
+                # current one; the live workbook is small, so this is quick
+                for patient_id, first_name, last_name, name_key in zip(
+                    df['patient_id'], df['first_name'], df['last_name'], df['name_key']
+                ):
+                    archived_months.pop(patient_id, None)
+                    name_index.add(patient_id, first_name, last_name, name_key or None)
+                
+                self._archived_months = archived_months
+                self._name_index = name_index
+                return name_index
+    
+    def _partition_months(self, months=None):
+        """
+        Get the months that have partitions, out of some months
+        
+        Args:
+            months (iterable, optional): Months wanted. Defaults to every month.
+        
+        Returns:
+            list: Months in YYYY-MM format, oldest first
+        """
+        available = self.partitions.months()
+        return sorted(available if months is None else set(months) & set(available))
+    
+    def _without_cached(self, df):
+        """
+        Leave out the archived rows of patients that are also in the cache
+        
+        The caller holds the lock and has loaded the DataFrame.
+        
+        Args:
+            df (pandas.DataFrame): Archived rows
+        
+        Returns:
+            pandas.DataFrame: The rows whose patients are only archived
+        """
+        cached = df['patient_id'].map(self._index.contains).astype(bool)
+        return df[~cached] if cached.any() else df
+    
+    def _id_taken(self, patient_id):
+        """
+        Check whether a patient ID is in use, in the cache or the month partitions
+        
+        The caller holds the lock and has loaded the DataFrame.
+        
+        Args:
+            patient_id (str): Patient ID
+        
+        Returns:
+            bool: True if a patient already has the ID
+        """
+        if self._index.contains(patient_id):
+            return True
+        return self.partitions.may_contain(patient_id) and self._find_archived(patient_id)[1] is not None
+    
+    def _archived_rows(self, months, start_date=None, end_date=None, doctor_name=None):
+        """
+        Get the archived rows of some months that match a date range and a doctor
+        
+        The conditions are handed to the partitions, so frozen months are
+        filtered as they are read. Rows of patients also in the cache are
+        still included; the caller leaves them out with _without_cached()
+        under the lock. The caller does not need to hold the lock.
+        
+        Args:
+            months (iterable): Months to read; None reads every month
+            start_date (str, optional): First date in YYYY-MM-DD format. Defaults to None.
+            end_date (str, optional): Last date in YYYY-MM-DD format, inclusive. Defaults to None.
+            doctor_name (str, optional): Doctor name. Defaults to None.
+        
+        Returns:
+            list: Plain DataFrames, oldest month first
+        """
+        frames = []
+        for month in self._partition_months(months):
+            rows = self.partitions.select(month, start_date, end_date, doctor_name)
+            if not rows.empty:
+                frames.append(plain_frame(rows))
+        return frames
+    
+    def _read_with_archived(self, read_cached, months=None, start_date=None, end_date=None, doctor_name=None):
+        """
+        Read rows from the cache, and before them the matching archived rows of some months
+        
+        The cache is read under the lock and the partitions are parsed after
+        it is released, so saves and reads on the Tk thread do not wait for
+        them; the lock is taken again only to leave out patients also in the
+        cache. If a compaction moved rows into the partitions meanwhile, the
+        read starts over. The caller does not hold the lock.
+        
+        Args:
+            read_cached (callable): Called under the lock with the loaded
+                DataFrame; returns the plain rows wanted from the cache
+            months (iterable, optional): Months to read. Defaults to every month.
+            start_date, end_date, doctor_name: Conditions, see _archived_rows()
+        
+        Returns:
+            pandas.DataFrame: Archived rows oldest month first, then the cached rows
+        """
+        while True:
+            with self._lock:
+                rows = read_cached(self._load_dataframe())
+                generation = self._generation
+            
+            frames = self._archived_rows(months, start_date, end_date, doctor_name)
+            if not frames:
+                return rows
+            
+            with self._lock:
+                if generation != self._generation:
+                    continue
+                frames = [frame for frame in map(self._without_cached, frames) if not frame.empty]
+            return pd.concat(frames + [rows], ignore_index=True) if frames else rows
+    
+    @staticmethod
+    def _months_between(start_date, end_date):
+        """
+        Get the months a date range touches
+        
+        Args:
+            start_date (str): First date in format YYYY-MM-DD
+            end_date (str): Last date in format YYYY-MM-DD, inclusive
+        
+        Returns:
+            list: Months in YYYY-MM format
+        """
+        periods = pd.period_range(start_date[:7], end_date[:7], freq='M')
+        return [str(period) for period in periods]
+    
+    def _find_archived(self, patient_id):
+        """
+        Find a patient in the month partitions
+        
+        The caller holds the lock and has loaded the DataFrame.
+        
+        Args:
+            patient_id (str): Patient ID
+        
+        Returns:
+            tuple: (month, row as a plain dict), or (None, None) if not found
+        """
+        if self._index.contains(patient_id):
+            return None, None
+        
+        # Look first where the name index put the patient, then in the month
+        # the ID was generated in
+        month = self._archived_months.get(patient_id)
+        if month is None and len(patient_id) >= 7:
+            month = f"{patient_id[1:5]}-{patient_id[5:7]}"
+        return self.partitions.find(patient_id, month)
+    
+    def _record_change(self, op, patient_id, data=None, on_complete=None, expected_version=None, moved_from=None):
+        """
+        Apply a change to the cached DataFrame and queue its journal entry
+        
+        The change is visible to reads immediately; the writer thread makes
+        it durable and then calls on_complete.
+        
+        Args:
+            op (str): 'add', 'update' or 'delete'
+            patient_id (str): Patient ID
+            data (dict, optional): Row data for the change
+            on_complete (callable, optional): Called with True once the change
+                is on disk, or False if writing it failed
+            expected_version (int, optional): Row version the change was made
+                against; the change is skipped where the row has moved on
+            moved_from (str, optional): Month partition an 'add' brings the
+                patient back from
+        """
+        with self._lock:
+            df = self._load_dataframe_locked()
+            
+            entry = PatientJournal.make_entry(op, patient_id, data, expected_version, moved_from)
+            self._cache_df = self._apply_change(df, entry)
+            self._pending_writes += 1
+            self._pending_ids[patient_id] = self._pending_ids.get(patient_id, 0) + 1
+        
+        self._writer.submit(entry, on_complete)
+    
+    def _flush_entries(self, entries):
+        """
+        Write queued journal entries with one fsync (runs on the writer thread)
+        
+        Args:
+            entries (list): Journal entries to write
+        """
+        try:
+            with self._write_locks():
+                # Other workstations' changes come before ours in the journal
+                if not self._catch_up_locked():
+                    self._reload_needed = True
+                
+                size = self.journal.append_entries(entries)
+                if not self._reload_needed:
+                    self._journal_offset = size
+                self._finish_pending(entries)
+                
+                # The journal on disk now matches the cache again
+                if self._pending_writes == 0:
+                    self._cache_signature = self._get_file_signature()
+        except Exception:
+            with self._lock:
+                # The optimistic changes never reached disk; drop them from the
+                # cache so the next read shows what is actually stored
+                self._finish_pending(entries)
+                self.invalidate_cache()
+            raise
+        
+        # The changes are durable; record them as backup deltas as well
+        self.backup_manager.record_changes(entries)
+        
+        if self.journal.entry_count >= self.compact_threshold:
+            self.compact()
+    
+    def _finish_pending(self, entries):
+        """
+        Stop counting entries as waiting for the journal
+        
+        The caller holds the lock.
+        
+        Args:
+            entries (list): Journal entries written, or that failed to be
+        """
+        self._pending_writes -= len(entries)
+        for entry in entries:
+            count = self._pending_ids.get(entry['patient_id'], 0) - 1
+            if count > 0:
+                self._pending_ids[entry['patient_id']] = count
+            else:
+                self._pending_ids.pop(entry['patient_id'], None)
+    
+    def compact(self):
+        """
+        Fold the journal into the workbook and empty it
+        
+        Runs on the writer thread, or on the caller's thread after the writer
+        has been flushed, so no journal appends of ours happen while it runs.
+        The lock file is held throughout, so other workstations neither
+        append nor compact until the new workbook and checkpoint are down.
+        """
         try:
-            if os.path.exists(self.excel_path):
-                # Create backups directory if it doesn't exist
-                backup_dir = os.path.join(os.path.dirname(self.excel_path), 'backups')
-                os.makedirs(backup_dir, exist_ok=True)
-                
-                # Create a backup filename with timestamp
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                backup_filename = f"patients_backup_{timestamp}.xlsx"
-                backup_path = os.path.join(backup_dir, backup_filename)
-                
-                # Copy the Excel file to the backup path
-                shutil.copy2(self.excel_path, backup_path)
-                logger.info(f"Created backup at {backup_path}")
-                
-                # Clean up old backups if needed
-                self._cleanup_old_backups(backup_dir)
+            with self._write_locks():
+                # Only what is on disk is folded in: other workstations'
+                # changes, and none of ours still waiting for the writer
+                if self._pending_writes > 0:
+                    return
+                if not self._catch_up_locked():
+                    self._reload_needed = True
+                self._load_dataframe_locked()
+                
+                # Rows of past months go to their month partitions first; a
+                # crash before the workbook is replaced leaves them in both
+                # places, and the live copy wins until the next compaction
+                archived_before = self._archive_past_months_locked()
+                self._freeze_old_months_locked()
+                self.partitions.add_missing_summaries()
+                
+                if self.journal.entry_count == 0 and archived_before is None:
+                    return
+                
+                entry_count = self.journal.entry_count
+                folded_size = self._journal_offset
+                generation = self._generation + 1
+                sequence = self._sequence + entry_count
+                df = plain_frame(self._cache_df).reset_index(drop=True)
+                
+                # The slow workbook write happens without holding the cache
+                # lock; the lock file stays held
+                self._lock.release()
+                try:
+                    temp_path = self.excel_path + '.tmp.xlsx'
+                    df.to_excel(temp_path, index=False)
+                finally:
+                    self._lock.acquire()
+                
+                os.replace(temp_path, self.excel_path)
+                self._journal_offset = self.journal.checkpoint(generation, folded_size, archived_before, sequence)
+                self._generation = generation
+                self._sequence = sequence
+                self._workbook_signature = self._get_workbook_signature()
+                if self._pending_writes == 0:
+                    self._cache_signature = self._get_file_signature()
+            
+            logger.info(f"Compacted {entry_count} journal entries into {self.excel_path}")
         except Exception as e:
-            logger.error(f"Error creating backup: {e}")
+            logger.error(f"Error compacting journal: {e}")
+    
+    @staticmethod
+    def _row_months(df):
+        """
+        Get the appointment month of every row
+        
+        Args:
+            df (pandas.DataFrame): Typed DataFrame
+        
+        Returns:
+            pandas.Series: Month in YYYY-MM format, '' where the date is blank
+        """
+        dates = plain_frame(df[['appointment_date']])['appointment_date'].astype(str)
+        return dates.map(MonthPartitions.month_of)
+    
+    def _archive_past_months_locked(self):
+        """
+        Move the cached rows of months before the current one into month partitions
+        
+        The caller holds the lock and the lock file, with no writes pending.
+        
+        Returns:
+            str: The current month (YYYY-MM) if rows were moved, None otherwise
+        """
+        current_month = datetime.now().strftime('%Y-%m')
+        months = self._row_months(self._cache_df)
+        past = (months != '') & (months < current_month)
+        if not past.any():
+            return None
+        
+        self.partitions.archive(plain_frame(self._cache_df[past]))
+        self._drop_months_before_locked(current_month)
+        return current_month
+    
+    def _freeze_old_months_locked(self):
+        """
+        Freeze the month partitions older than cold_archive_after_months
+        
+        Frozen months are read with the date and doctor of a query applied,
+        so years of rarely used visits cost neither memory nor parse time.
+        The caller holds the lock file.
+        """
+        if self.cold_archive_after_months <= 0:
+            return
+        
+        first_kept = pd.Period(datetime.now(), freq='M') - self.cold_archive_after_months
+        self.partitions.freeze(str(first_kept))
     
-    def _cleanup_old_backups(self, backup_dir, max_backups=10):
+    def _drop_months_before_locked(self, month):
         """
-        Clean up old backups, keeping only the most recent ones
+        Drop the cached rows of months that now live in month partitions
+        
+        The caller holds the lock.
         
         Args:
-            backup_dir (str): Path to backups directory
-            max_backups (int, optional): Maximum number of backups to keep. Defaults to 10.
+            month (str): First month (YYYY-MM) kept in the workbook
+        """
+        months = self._row_months(self._cache_df)
+        past = (months != '') & (months < month)
+        if not past.any():
+            return
+        
+        # The name index keeps the patients; remember where they went
+        if self._name_index is not None:
+            self._archived_months.update(zip(self._cache_df.loc[past, 'patient_id'], months[past]))
+        
+        self._cache_df = self._cache_df[~past]
+        self._index.build(self._index_keys(self._cache_df))
+        logger.info(f"Moved {int(past.sum())} rows before {month} out of the cache")
+    
+    def flush(self):
+        """Block until every queued change has been written to the journal"""
+        self._writer.flush()
+    
+    def close(self):
+        """Write queued changes and fold the journal into the workbook on exit"""
+        self._writer.stop()
+        self.compact()
+    
+    def invalidate_cache(self):
+        """Drop the cached DataFrame so the next read parses the Excel file again"""
+        with self._lock:
+            self._cache_df = None
+            self._cache_signature = None
+            self._index.clear()
+            self._name_index = None
+    
+    def get_cache_stats(self):
+        """
+        Get cache hit/miss counters
+        
+        Returns:
+            dict: Dictionary with hits, misses and cached row count
+        """
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'rows': len(self._cache_df) if self._cache_df is not None else 0
+        }
+    
+    def get_daily_summaries(self):
+        """
+        Get the daily rollup rows of every patient, in parts
+        
+        Past months come from the rows stored in the partition manifest, so
+        only the live workbook is read row by row. A past month that also
+        has patients in the cache, edited ones moved back or a move that was
+        interrupted, is read from its file without those patients.
+        
+        Returns:
+            list: Dicts from DailyRollup.summarize()
+        """
+        while True:
+            with self._lock:
+                df = self._load_dataframe()
+                live = DailyRollup.summarize(plain_frame(df[list(DailyRollup.COLUMNS)]))
+                live_months = set(self._row_months(df))
+                generation = self._generation
+            
+            summaries = [live]
+            overlapping = []
+            for month in self._partition_months():
+                if month in live_months:
+                    overlapping.append(month)
+                else:
+                    summaries.append(self.partitions.summary(month))
+            frames = self._archived_rows(overlapping)
+            
+            with self._lock:
+                if generation != self._generation:
+                    # A compaction moved rows into the partitions meanwhile
+                    continue
+                summaries.extend(DailyRollup.summarize(self._without_cached(frame)) for frame in frames)
+            return summaries
+    
+    def get_change_marker(self):
+        """
+        Get the number of changes in the data the cache holds
+        
+        Changes folded into the workbook are counted in the checkpoint line,
+        the rest are the journal entries read since, so every workstation
+        that has read the same changes gets the same number.
+        
+        Returns:
+            int: Number of changes, or None if the data could not be read
+        """
+        try:
+            with self._lock:
+                self._load_dataframe()
+                return self._sequence + self.journal.entry_count
+        except Exception as e:
+            logger.error(f"Error reading change marker: {e}")
+            return None
+    
+    def poll_external_changes(self):
+        """
+        Get the changes other workstations made since the last poll
+        
+        Returns:
+            list: (patient_id, old, new) tuples with the rows as dicts, None
+                for an added or deleted row; or None if the workbook was
+                parsed again and anything may have changed
         """
         try:
-            # Get a list of backup files
-            backup_files = sorted([
-                os.path.join(backup_dir, f) 
-                for f in os.listdir(backup_dir) 
-                if f.startswith('patients_backup_') and f.endswith('.xlsx')
-            ])
-            
-            # Remove old backups if there are too many
-            if len(backup_files) > max_backups:
-                files_to_remove = backup_files[:-max_backups]
-                for file_path in files_to_remove:
-                    os.remove(file_path)
-                    logger.info(f"Removed old backup: {file_path}")
+            with self._lock:
+                # Reading catches up on the journal if another workstation wrote
+                self._load_dataframe()
+                changes = self._external_changes
+                self._external_changes = []
+                return changes
         except Exception as e:
-            logger.error(f"Error cleaning up old backups: {e}")
+            logger.error(f"Error checking for external changes: {e}")
+            return []
+    
+    def create_backup(self):
+        """
+        Create a full backup snapshot, including changes still in the journal
+        
+        Returns:
+            str: Path of the snapshot, or None if it could not be written
+        """
+        self.flush()
+        return self.backup_manager.create_snapshot()
+    
+    def _write_snapshot(self, path):
+        """
+        Write the current patient data to a snapshot workbook
+        
+        The month partitions are copied file by file next to the snapshot
+        rather than read, so a snapshot costs the same however much history
+        there is.
+        
+        Args:
+            path (str): Path of the snapshot to write
+        """
+        # The lock file keeps compaction from moving rows between the
+        # workbook and the partitions while they are copied
+        with self._file_lock:
+            with self._lock:
+                if self.journal.entry_count == 0 and self._pending_writes == 0 and os.path.exists(self.excel_path):
+                    df = None
+                else:
+                    # Only the current month is cached, so this copy is small
+                    df = plain_frame(self._load_dataframe_locked()).reset_index(drop=True)
+            
+            if df is None:
+                # The workbook already holds everything, so a plain copy is enough
+                shutil.copy2(self.excel_path, path)
+            self.partitions.copy_to(path + BackupManager.PARTITIONS_SUFFIX)
+        
+        # The workbook write happens without holding either lock
+        if df is not None:
+            df.to_excel(path, index=False)
     
     def get_all_patients(self):
         """
@@ -142,16 +1074,68 @@ class ExcelHandler:
             pandas.DataFrame: DataFrame containing all patients
         """
         try:
-            df = pd.read_excel(self.excel_path)
-            
-            # Replace NaN values with empty strings
-            df = df.fillna('')
-            
-            return df
+            # Past months first, so the rows stay in the order they were added
+            return self._read_with_archived(plain_frame)
         except Exception as e:
             logger.error(f"Error getting all patients: {e}")
             return pd.DataFrame(columns=self.COLUMNS)
     
+    def get_patient_count(self):
+        """
+        Get the number of patient rows
+        
+        Returns:
+            int: Row count
+        """
+        try:
+            with self._lock:
+                # Archived months are counted from the manifest without loading them
+                return len(self._load_dataframe()) + self.partitions.total_rows()
+        except Exception as e:
+            logger.error(f"Error counting patients: {e}")
+            return 0
+    
+    def get_patients_slice(self, start, count):
+        """
+        Get a range of patients in workbook order
+        
+        Args:
+            start (int): Index of the first row
+            count (int): Maximum number of rows
+            
+        Returns:
+            pandas.DataFrame: The rows in that range
+        """
+        try:
+            end = start + count
+            while True:
+                with self._lock:
+                    df = self._load_dataframe()
+                    generation = self._generation
+                    month_counts = self.partitions.row_counts()
+                    offset = sum(rows for _, rows in month_counts)
+                    cached = plain_frame(df.iloc[max(start - offset, 0):max(end - offset, 0)])
+                
+                # Only the months the range reaches into are parsed, without the lock
+                parsed = []
+                offset = 0
+                for month, rows in month_counts:
+                    if offset < end and offset + rows > start:
+                        parsed.extend((offset, frame) for frame in self._archived_rows([month]))
+                    offset += rows
+                
+                with self._lock:
+                    if generation != self._generation:
+                        continue
+                    frames = [self._without_cached(frame).iloc[max(start - offset, 0):end - offset]
+                              for offset, frame in parsed]
+                
+                frames.append(cached)
+                return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        except Exception as e:
+            logger.error(f"Error getting patients {start}-{start + count}: {e}")
+            return pd.DataFrame(columns=self.COLUMNS)
+    
     def get_patient_by_id(self, patient_id):
         """
         Get a patient by ID
@@ -163,206 +1147,309 @@ class ExcelHandler:
             dict: Patient data or None if not found
         """
         try:
-            df = pd.read_excel(self.excel_path)
-            
-            # Replace NaN values with empty strings
-            df = df.fillna('')
-            
-            patient = df[df['patient_id'] == patient_id]
-            
-            if len(patient) == 0:
-                return None
+            with self._lock:
+                df = self._load_dataframe()
                 
-            # Convert to dict
-            patient_dict = patient.iloc[0].to_dict()
-            
-            # Ensure no NaN values in the dictionary
-            for key, value in patient_dict.items():
-                if pd.isna(value) or value == 'nan' or value == 'NaN':
-                    patient_dict[key] = ''
-            
-            return patient_dict
+                labels = self._index.get_labels(patient_id)
+                
+                if len(labels) == 0:
+                    # Patients of past months are looked up in their partitions
+                    return self._find_archived(patient_id)[1]
+                    
+                # Convert to dict, with blanks as empty strings
+                return plain_row(df.loc[labels[0]])
         except Exception as e:
             logger.error(f"Error getting patient by ID: {e}")
             return None
     
-    def get_patients_by_name(self, name):
+    def get_patients_by_name(self, name, limit=100):
         """
         Search for patients by name (first or last)
         
         Args:
-            name (str): Name to search for
+            name (str): Name to search for; blank text returns the first patients, up to limit
+            limit (int, optional): Maximum number of matches. Defaults to 100.
             
         Returns:
-            pandas.DataFrame: DataFrame containing matching patients
+            pandas.DataFrame: Matching patients, best match first
         """
         try:
-            df = pd.read_excel(self.excel_path)
+            if not NameIndex.tokenize(name):
+                # The first page only; the list pages through the rest
+                return self.get_patients_slice(0, limit)
             
-            # Replace NaN values with empty strings to avoid search errors
-            df['first_name'].fillna('', inplace=True)
-            df['last_name'].fillna('', inplace=True)
+            # Built outside the lock the first time, as it reads every month
+            name_index = self._get_name_index()
             
-            # Search in first_name and last_name columns
-            matches = df[
-                df['first_name'].str.contains(name, case=False, na=False) |
-                df['last_name'].str.contains(name, case=False, na=False)
-            ]
-            
-            return matches
+            with self._lock:
+                df = self._load_dataframe()
+                
+                # Ranked lookup in the name index; the text is never used as a regex
+                patient_ids = name_index.search(name, limit)
+                labels = [label for patient_id in patient_ids for label in self._index.get_labels(patient_id)]
+                if len(labels) == len(patient_ids):
+                    return plain_frame(df.loc[labels])
+                
+                # Some matches are archived; keep them in rank order
+                rows = []
+                for patient_id in patient_ids:
+                    patient_labels = self._index.get_labels(patient_id)
+                    if patient_labels:
+                        rows.extend(plain_row(df.loc[label]) for label in patient_labels)
+                    else:
+                        row = self._find_archived(patient_id)[1]
+                        if row is not None:
+                            rows.append(row)
+                return pd.DataFrame(rows, columns=df.columns)
         except Exception as e:
             logger.error(f"Error searching patients by name: {e}")
             return pd.DataFrame(columns=self.COLUMNS)
     
-    def add_patient(self, patient_data):
+    def add_patient(self, patient_data, on_complete=None):
         """
         Add a new patient to the Excel file
         
+        The patient is visible to reads as soon as this returns; the journal
+        write happens on the writer thread.
+        
         Args:
             patient_data (dict): Patient data
+            on_complete (callable, optional): Called with True once the patient
+                is on disk, or False if writing failed
             
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            # Read existing data
-            df = pd.read_excel(self.excel_path)
-            
-            # Generate a unique patient ID if not provided
-            if 'patient_id' not in patient_data or not patient_data['patient_id']:
-                # Simple ID generation - can be enhanced as needed
-                now = datetime.now()
-                patient_data['patient_id'] = f"P{now.strftime('%Y%m%d%H%M%S')}"
-            
-            # Generate sequential token number if not provided
-            if 'token_number' not in patient_data or not patient_data['token_number']:
-                # Get today's date
-                today = datetime.now().strftime('%Y-%m-%d')
+            with self._lock:
+                # Only refreshes the cache and its index, which _id_taken() reads
+                self._load_dataframe()
+                
+                # Generate a unique patient ID if not provided
+                if 'patient_id' not in patient_data or not patient_data['patient_id']:
+                    patient_data['patient_id'] = self._generate_patient_id(
+                        self._id_taken
+                    )
+                elif self._id_taken(patient_data['patient_id']):
+                    logger.warning(f"Patient already exists: {patient_data['patient_id']}")
+                    return False
                 
-                # Filter patients by today's date
-                today_patients = df[df['appointment_date'] == today] if not df.empty and 'appointment_date' in df.columns else pd.DataFrame()
-                
-                # Find the highest token number for today
-                if not today_patients.empty and 'token_number' in today_patients.columns:
-                    # Convert to numeric, ignoring errors (will convert non-numeric to NaN)
-                    today_patients['token_number_numeric'] = pd.to_numeric(today_patients['token_number'], errors='coerce')
-                    # Get the maximum, defaulting to 0 if all are NaN
-                    current_max = today_patients['token_number_numeric'].max()
-                    # If max is NaN, start from 0
-                    if pd.isna(current_max):
-                        current_max = 0
-                    # Set the new token number
-                    patient_data['token_number'] = str(int(current_max) + 1)
+                # Generate sequential token number if not provided
+                today = datetime.now().strftime('%Y-%m-%d')
+                if 'token_number' not in patient_data or not patient_data['token_number']:
+                    patient_data['token_number'] = str(self._tokens.allocate(today))
+                    logger.info(f"Generated token number {patient_data['token_number']} for date {today}")
                 else:
-                    # Start from 1 if no patients today
-                    patient_data['token_number'] = "1"
+                    # A token typed by hand is not given out again
+                    self._tokens.observe(today, patient_data['token_number'])
                 
-                logger.info(f"Generated token number {patient_data['token_number']} for date {today}")
-            
-            # Add timestamps
-            now_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            patient_data['created_at'] = now_str
-            patient_data['updated_at'] = now_str
-            
-            # Ensure all required columns exist in patient_data
-            for col in self.COLUMNS:
-                if col not in patient_data:
-                    patient_data[col] = ''
-                elif pd.isna(patient_data[col]) or patient_data[col] == 'nan' or patient_data[col] == 'NaN':
-                    patient_data[col] = ''
-            
-            # Append the new patient data
-            df = pd.concat([df, pd.DataFrame([patient_data])], ignore_index=True)
-            
-            # Create a backup before saving
-            self._create_backup()
-            
-            # Save the updated DataFrame to Excel
-            df.to_excel(self.excel_path, index=False)
-            logger.info(f"Added new patient: {patient_data['patient_id']} with token number: {patient_data['token_number']}")
-            
-            return True
+                # Add timestamps
+                now_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                patient_data['created_at'] = now_str
+                patient_data['updated_at'] = now_str
+                patient_data['version'] = 1
+                
+                # Ensure all required columns exist in patient_data
+                for col in self.COLUMNS:
+                    if col not in patient_data:
+                        patient_data[col] = ''
+                    elif self._is_blank(patient_data[col]):
+                        patient_data[col] = ''
+                
+                # Store the phonetic key with the row for fuzzy name search
+                patient_data['name_key'] = NameIndex.name_key(patient_data['first_name'], patient_data['last_name'])
+                
+                # Queue the new patient for the journal instead of rewriting the workbook
+                self._record_change('add', patient_data['patient_id'], dict(patient_data), on_complete)
+                logger.info(f"Added new patient: {patient_data['patient_id']} with token number: {patient_data['token_number']}")
+                
+                return True
         except Exception as e:
             logger.error(f"Error adding patient: {e}")
             return False
     
-    def update_patient(self, patient_id, patient_data):
+    def _max_token_number(self, date):
+        """
+        Get the highest numeric token number of a day's appointments
+        
+        Args:
+            date (str): Date in format YYYY-MM-DD
+        
+        Returns:
+            int: Highest token number, 0 if there is none
+        """
+        with self._lock:
+            df = self._load_dataframe()
+            labels = self._index.labels_for_date(date)
+            if df.empty or not labels or 'token_number' not in df.columns:
+                return 0
+            
+            current_max = pd.to_numeric(df.loc[labels, 'token_number'], errors='coerce').max()
+            return 0 if pd.isna(current_max) else int(current_max)
+    
+    def get_next_token_number(self, date):
+        """
+        Get the token number the next patient added on a day will get
+        
+        Args:
+            date (str): Date in format YYYY-MM-DD
+        
+        Returns:
+            str: Next token number
+        """
+        try:
+            # Same lock order as add_patient(): the cache, then the counter
+            with self._lock:
+                return str(self._tokens.peek(date))
+        except Exception as e:
+            logger.error(f"Error getting next token number: {e}")
+            return ''
+    
+    def update_patient(self, patient_id, patient_data, on_complete=None):
         """
         Update an existing patient in the Excel file
         
         Args:
             patient_id (str): Patient ID
-            patient_data (dict): Updated patient data
+            patient_data (dict): Updated patient data. A 'version' key holds
+                the row version the data was read at; the update is refused if
+                another workstation has changed the patient since.
+            on_complete (callable, optional): Called with True once the change
+                is on disk, or False if writing failed
             
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            # Read existing data
-            df = pd.read_excel(self.excel_path)
-            
-            # Find the patient
-            mask = df['patient_id'] == patient_id
-            
-            if not mask.any():
-                logger.warning(f"Patient not found: {patient_id}")
-                return False
-            
-            # Update timestamp
-            patient_data['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            # Handle NaN values
-            for key, value in patient_data.items():
-                if pd.isna(value) or value == 'nan' or value == 'NaN':
-                    patient_data[key] = ''
-            
-            # Update the patient data
-            for key, value in patient_data.items():
-                if key in df.columns:
-                    df.loc[mask, key] = value
+            expected_version = patient_data.pop('version', None)
+            if expected_version == '' or self._is_blank(expected_version):
+                expected_version = None
+            else:
+                expected_version = row_version(expected_version)
             
-            # Create a backup before saving
-            self._create_backup()
+            moved_from = None
+            promoted = {}
             
-            # Save the updated DataFrame to Excel
-            df.to_excel(self.excel_path, index=False)
-            logger.info(f"Updated patient: {patient_id}")
+            with self._lock:
+                # Read existing data, with other workstations' changes
+                df = self._load_dataframe()
+                
+                # Find the patient, in the month partitions if not in the workbook
+                current = self._row_dict(patient_id)
+                if current is None:
+                    moved_from, current = self._find_archived(patient_id)
+                if current is None:
+                    logger.warning(f"Patient not found: {patient_id}")
+                    return False
+                
+                # Refuse to overwrite a change made on another workstation
+                if expected_version is not None:
+                    current_version = row_version(current.get('version'))
+                    if current_version != expected_version:
+                        logger.warning(
+                            f"Patient {patient_id} is at version {current_version}, "
+                            f"not {expected_version}; update refused"
+                        )
+                        return False
+                
+                # An edited patient of a past month moves back into the workbook
+                if moved_from is not None:
+                    self._record_change(
+                        'add', patient_id, current,
+                        on_complete=lambda success: promoted.update(success=success),
+                        moved_from=moved_from
+                    )
+                    df = self._cache_df
+                
+                # Update timestamp
+                patient_data['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                
+                # Handle NaN values
+                for key, value in patient_data.items():
+                    if self._is_blank(value):
+                        patient_data[key] = ''
+                
+                # Keep the stored phonetic key in step with the name
+                if 'first_name' in patient_data or 'last_name' in patient_data:
+                    patient_data['name_key'] = NameIndex.name_key(
+                        patient_data.get('first_name', current['first_name']),
+                        patient_data.get('last_name', current['last_name'])
+                    )
+                
+                # Only columns that exist in the workbook are updated
+                changes = {key: value for key, value in patient_data.items() if key in df.columns}
+                
+                # Queue the change for the journal instead of rewriting the workbook
+                self._record_change('update', patient_id, changes, on_complete, expected_version)
+                logger.info(f"Updated patient: {patient_id}")
             
+            if moved_from is not None:
+                self._remove_archived(moved_from, patient_id, promoted)
             return True
         except Exception as e:
             logger.error(f"Error updating patient: {e}")
             return False
     
-    def delete_patient(self, patient_id):
+    def _remove_archived(self, month, patient_id, promoted):
+        """
+        Take a patient brought back into the workbook out of its month partition
+        
+        The partition keeps its row until the journal holds the patient, so a
+        failed write loses nothing; meanwhile the workbook's copy wins.
+        
+        Args:
+            month (str): Month in YYYY-MM format
+            patient_id (str): Patient ID
+            promoted (dict): Filled with 'success' once the patient's journal
+                entry is written
+        """
+        self.flush()
+        if not promoted.get('success'):
+            logger.warning(f"Patient {patient_id} was not written to the journal; kept in partition {month}")
+            return
+        
+        try:
+            with self._write_locks():
+                self.partitions.remove(month, patient_id)
+        except Exception as e:
+            logger.error(f"Error removing patient {patient_id} from partition {month}: {e}")
+    
+    def delete_patient(self, patient_id, on_complete=None):
         """
         Delete a patient from the Excel file
         
         Args:
             patient_id (str): Patient ID
+            on_complete (callable, optional): Called with True once the deletion
+                is on disk, or False if writing failed
             
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            # Read existing data
-            df = pd.read_excel(self.excel_path)
-            
-            # Find the patient
-            mask = df['patient_id'] == patient_id
-            
-            if not mask.any():
-                logger.warning(f"Patient not found: {patient_id}")
-                return False
-            
-            # Create a backup before deleting
-            self._create_backup()
-            
-            # Remove the patient
-            df = df[~mask]
+            with self._lock:
+                # Only refreshes the cache and its index, which the lookup
+                # below reads from
+                self._load_dataframe()
+                
+                # Find the patient
+                if self._index.contains(patient_id):
+                    # Queue the deletion for the journal instead of rewriting the workbook
+                    self._record_change('delete', patient_id, on_complete=on_complete)
+                    logger.info(f"Deleted patient: {patient_id}")
+                    return True
+                
+                month, archived = self._find_archived(patient_id)
+                if archived is None:
+                    logger.warning(f"Patient not found: {patient_id}")
+                    return False
             
-            # Save the updated DataFrame to Excel
-            df.to_excel(self.excel_path, index=False)
-            logger.info(f"Deleted patient: {patient_id}")
+            # A patient of a past month is taken out of its partition, and the
+            # journal entry carries the row so other workstations can count it
+            with self._write_locks():
+                self.partitions.remove(month, patient_id)
+            self._record_change('delete', patient_id, archived, on_complete)
+            logger.info(f"Deleted archived patient: {patient_id}")
             
             return True
         except Exception as e:
@@ -380,22 +1467,49 @@ class ExcelHandler:
             pandas.DataFrame: DataFrame containing appointments for the date
         """
         try:
-            df = pd.read_excel(self.excel_path)
-            
-            # Replace NaN values with empty strings
-            df = df.fillna('')
-            
-            # Filter by date
-            appointments = df[df['appointment_date'] == date]
+            # Look up the day's rows instead of scanning every visit; a past
+            # day is read from its month's partition
+            appointments = self._read_with_archived(
+                lambda df: plain_frame(df.loc[self._index.labels_for_date(date)]),
+                [MonthPartitions.month_of(date)], date, date
+            )
             
             # Sort by time
-            appointments = appointments.sort_values('appointment_time')
-            
-            return appointments
+            return appointments.sort_values('appointment_time')
         except Exception as e:
             logger.error(f"Error getting appointments for date: {e}")
             return pd.DataFrame(columns=self.COLUMNS)
     
+    def get_appointments_between(self, start_date, end_date):
+        """
+        Get all appointments in a date range
+        
+        Args:
+            start_date (str): First date in format YYYY-MM-DD
+            end_date (str): Last date in format YYYY-MM-DD, inclusive
+            
+        Returns:
+            pandas.DataFrame: DataFrame containing appointments in the range
+        """
+        try:
+            def read_cached(df):
+                # Walk the distinct dates, not the visits
+                labels = [
+                    label
+                    for date, date_labels in self._index.by_date.items()
+                    if isinstance(date, str) and start_date <= date <= end_date
+                    for label in date_labels
+                ]
+                return plain_frame(df.loc[sorted(labels)])
+            
+            # Only the partitions of months in the range are read
+            return self._read_with_archived(
+                read_cached, self._months_between(start_date, end_date), start_date, end_date
+            )
+        except Exception as e:
+            logger.error(f"Error getting appointments between dates: {e}")
+            return pd.DataFrame(columns=self.COLUMNS)
+    
     def get_appointments_for_doctor(self, doctor_name, date=None):
         """
         Get all appointments for a specific doctor
@@ -408,22 +1522,16 @@ class ExcelHandler:
             pandas.DataFrame: DataFrame containing appointments for the doctor
         """
         try:
-            df = pd.read_excel(self.excel_path)
-            
-            # Replace NaN values with empty strings
-            df = df.fillna('')
-            
-            # Filter by doctor name
-            appointments = df[df['doctor_name'] == doctor_name]
-            
-            # Further filter by date if provided
-            if date:
-                appointments = appointments[appointments['appointment_date'] == date]
+            # Look up the doctor's rows, for one date if provided; without a
+            # date every archived month is searched for the doctor
+            appointments = self._read_with_archived(
+                lambda df: plain_frame(df.loc[self._index.labels_for_doctor(doctor_name, date)]),
+                [MonthPartitions.month_of(date)] if date else None,
+                date, date, doctor_name
+            )
             
             # Sort by date and time
-            appointments = appointments.sort_values(['appointment_date', 'appointment_time'])
-            
-            return appointments
+            return appointments.sort_values(['appointment_date', 'appointment_time'])
         except Exception as e:
             logger.error(f"Error getting appointments for doctor: {e}")
             return pd.DataFrame(columns=self.COLUMNS) 
\ No newline at end of file
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fenwick Tree for the Receptionist Application
+Prefix sums with point updates, used for date-range statistics
+"""
+
+class FenwickTree:
+    """
+    Fenwick Tree class for the Receptionist Application
+    Holds a fixed number of slots, each a vector of 'width' numbers, such
+    as visits and revenue of one day. Adding to a slot and summing any
+    range of slots both take O(log n) steps.
+    """
+    
+    def __init__(self, size, width=1, values=None):
+        """
+        Initialize the Fenwick Tree
+        
+        Args:
+            size (int): Number of slots, indexed from 0
+            width (int, optional): Numbers held per slot. Defaults to 1.
+            values (dict, optional): Slot index -> initial vector. Defaults to None.
+        """
+        self.size = size
+        self.width = width
+        # Node i (1-based) holds the sum of the slots (i - lowbit(i), i]
+        self._tree = [[0] * width for _ in range(size + 1)]
+        
+        if values:
+            # Build in O(n): place each value, then push every node's sum up
+            # to its parent once
+            for index, vector in values.items():
+                node = self._tree[index + 1]
+                for k in range(width):
+                    node[k] += vector[k]
+            for i in range(1, size + 1):
+                parent = i + (i & -i)
+                if parent <= size:
+                    for k in range(width):
+                        self._tree[parent][k] += self._tree[i][k]
+    
+    def add(self, index, deltas):
+        """
+        Add to a slot
+        
+        Args:
+            index (int): Slot index
+            deltas (sequence): Amount to add to each number of the slot
+        """
+        i = index + 1
+        while i <= self.size:
+            node = self._tree[i]
+            for k in range(self.width):
+                node[k] += deltas[k]
+            i += i & -i
+    
+    def prefix_sum(self, index):
+        """
+        Sum the slots from 0 up to and including index
+        
+        Args:
+            index (int): Last slot index; negative for an empty sum
+        
+        Returns:
+            list: Sum of each number
+        """
+        totals = [0] * self.width
+        i = min(index + 1, self.size)
+        while i > 0:
+            node = self._tree[i]
+            for k in range(self.width):
+                totals[k] += node[k]
+            i -= i & -i
+        return totals
+    
+    def range_sum(self, first, last):
+        """
+        Sum the slots from first to last, inclusive
+        
+        Args:
+            first (int): First slot index
+            last (int): Last slot index
+        
+        Returns:
+            list: Sum of each number, zeros for an empty range
+        """
+        if last < first:
+            return [0] * self.width
+        upper = self.prefix_sum(last)
+        lower = self.prefix_sum(first - 1)
+        return [upper[k] - lower[k] for k in range(self.width)]
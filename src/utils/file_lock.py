@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Lock for the Receptionist Application
+An exclusive lock on a file, shared between processes and workstations
+"""
+
+import os
+import time
+import logging
+import threading
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+    import fcntl
+
+logger = logging.getLogger('receptionist.file_lock')
+
+class FileLockTimeout(Exception):
+    """The lock was not acquired within the timeout"""
+
+class FileLock:
+    """
+    File Lock class for the Receptionist Application
+    Holds an exclusive OS lock on a lock file while in a with block. The
+    operating system releases the lock if the process dies, so a crash
+    never leaves the lock held. Uses msvcrt on Windows and fcntl elsewhere.
+    
+    Threads of one process take turns on the same instance, and the thread
+    holding the lock may acquire it again; it is released when every
+    acquire has been matched by a release.
+    """
+    
+    # Seconds between attempts while another process holds the lock
+    POLL_INTERVAL = 0.05
+    
+    def __init__(self, lock_path, timeout=10):
+        """
+        Initialize the File Lock
+        
+        Args:
+            lock_path (str): Path of the lock file, created if missing
+            timeout (float, optional): Seconds to wait for the lock. Defaults to 10.
+        """
+        self.lock_path = lock_path
+        self.timeout = timeout
+        self._fd = None
+        
+        # Serializes the threads of this process; _depth counts nested acquires
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+    
+    def _try_lock(self):
+        """
+        Try once to lock the open lock file
+        
+        Returns:
+            bool: True if the lock was acquired
+        """
+        try:
+            if msvcrt:
+                msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+    
+    def try_acquire(self, timeout=None):
+        """
+        Acquire the lock, waiting up to a timeout
+        
+        Args:
+            timeout (float, optional): Seconds to wait; 0 tries once.
+                Defaults to the timeout given to the constructor.
+        
+        Returns:
+            bool: True if the lock was acquired
+        """
+        if timeout is None:
+            timeout = self.timeout
+        deadline = time.monotonic() + timeout
+        
+        if not self._thread_lock.acquire(timeout=max(timeout, 0)):
+            return False
+        
+        self._depth += 1
+        if self._depth > 1:
+            return True
+        
+        self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT)
+        while not self._try_lock():
+            if time.monotonic() >= deadline:
+                os.close(self._fd)
+                self._fd = None
+                self._depth -= 1
+                self._thread_lock.release()
+                return False
+            time.sleep(self.POLL_INTERVAL)
+        return True
+    
+    def acquire(self):
+        """
+        Acquire the lock, waiting up to the timeout
+        
+        Raises:
+            FileLockTimeout: If another process kept the lock past the timeout
+        """
+        if not self.try_acquire():
+            raise FileLockTimeout(f"Timed out waiting for {self.lock_path}")
+    
+    def release(self):
+        """Release the lock"""
+        if self._depth == 0:
+            return
+        
+        self._depth -= 1
+        if self._depth > 0:
+            self._thread_lock.release()
+            return
+        
+        try:
+            if msvcrt:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        except OSError as e:
+            logger.error(f"Error releasing lock {self.lock_path}: {e}")
+        finally:
+            os.close(self._fd)
+            self._fd = None
+            self._thread_lock.release()
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
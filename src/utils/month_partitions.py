@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Month Partitions for the Receptionist Application
+Older appointments kept in one workbook per month, loaded on demand
+"""
+
+import os
+import json
+import shutil
+import logging
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from utils.patient_schema import typed_frame, plain_frame, plain_row, date_mask
+from utils.columnar_archive import archive_extension, is_archive, write_archive, read_archive
+from utils.daily_rollup import DailyRollup
+
+logger = logging.getLogger('receptionist.month_partitions')
+
+class MonthPartitions:
+    """
+    Month Partitions class for the Receptionist Application
+    Holds the patients of past months in one workbook per appointment
+    month, next to a manifest listing each month's file and row count.
+    The live workbook only keeps the current month, so it stays small as
+    years of visits accumulate; a past month is parsed the first time a
+    search, a list page or a historical statistic needs it, and only the
+    most recently used months are kept in memory.
+    
+    Months old enough to be rarely read are frozen into compressed column
+    files instead of workbooks. Date and doctor queries read only the
+    matching rows of those, without loading the month.
+    
+    The manifest also keeps each month's daily rollup rows, so the
+    statistics can be rebuilt without reading the months again.
+    
+    A patient lives in exactly one place. When a past patient is edited
+    the row moves back to the live workbook; if a crash leaves a row in
+    both, the live copy wins.
+    """
+    
+    VERSION = 1
+    
+    # Past months kept parsed in memory
+    DEFAULT_CACHE_MONTHS = 12
+    
+    def __init__(self, partition_dir, file_prefix, cache_months=DEFAULT_CACHE_MONTHS):
+        """
+        Initialize the Month Partitions
+        
+        Args:
+            partition_dir (str): Folder holding the month workbooks and manifest
+            file_prefix (str): Start of each month workbook's name, such as 'patients'
+            cache_months (int, optional): Past months kept parsed. Defaults to DEFAULT_CACHE_MONTHS.
+        """
+        self.partition_dir = partition_dir
+        self.file_prefix = file_prefix
+        self.cache_months = max(1, cache_months)
+        self.manifest_path = os.path.join(partition_dir, 'manifest.json')
+        
+        # month -> {'file', 'rows', 'days'}, re-read when the manifest changes on disk
+        self._months = {}
+        # Largest patient ID ever archived, so new IDs can be checked cheaply
+        self._latest_id = ''
+        self._manifest_signature = None
+        
+        # month -> (file signature, typed DataFrame), least recently used first
+        self._frames = OrderedDict()
+        self._lock = threading.RLock()
+    
+    @staticmethod
+    def _signature(path):
+        """
+        Get the (mtime, size) of a file
+        
+        Args:
+            path (str): File path
+        
+        Returns:
+            tuple: (mtime, size), or None if the file does not exist
+        """
+        try:
+            stat = os.stat(path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+    
+    @staticmethod
+    def month_of(date):
+        """
+        Get the month a date belongs to
+        
+        Args:
+            date (str): Date in YYYY-MM-DD format
+        
+        Returns:
+            str: Month in YYYY-MM format, or '' if the date is blank or malformed
+        """
+        date = str(date or '')
+        if len(date) < 7 or date[4] != '-':
+            return ''
+        return date[:7]
+    
+    def _refresh_manifest(self):
+        """Read the manifest again if another workstation rewrote it"""
+        signature = self._signature(self.manifest_path)
+        if signature == self._manifest_signature:
+            return
+        
+        manifest = {}
+        if signature is not None:
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except Exception as e:
+                logger.error(f"Error reading partition manifest: {e}")
+                return
+        
+        self._months = manifest.get('months', {})
+        self._latest_id = manifest.get('latest_id', '')
+        self._manifest_signature = signature
+    
+    def _write_manifest(self):
+        """Write the manifest atomically; the caller holds the lock file"""
+        os.makedirs(self.partition_dir, exist_ok=True)
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            manifest = {'version': self.VERSION, 'months': self._months, 'latest_id': self._latest_id}
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+        self._manifest_signature = self._signature(self.manifest_path)
+    
+    def months(self):
+        """
+        Get the past months that have partitions
+        
+        Returns:
+            list: Months in YYYY-MM format, oldest first
+        """
+        with self._lock:
+            self._refresh_manifest()
+            return sorted(self._months)
+    
+    def row_counts(self):
+        """
+        Get the number of rows of each past month
+        
+        Returns:
+            list: (month, rows) tuples, oldest first
+        """
+        with self._lock:
+            self._refresh_manifest()
+            return [(month, self._months[month]['rows']) for month in sorted(self._months)]
+    
+    def total_rows(self):
+        """
+        Get the number of rows in every past month together
+        
+        Returns:
+            int: Row count, read from the manifest without loading any month
+        """
+        return sum(rows for _, rows in self.row_counts())
+    
+    def summary(self, month):
+        """
+        Get the daily rollup rows of a past month
+        
+        Args:
+            month (str): Month in YYYY-MM format
+        
+        Returns:
+            dict: Rows as DailyRollup.summarize() makes them, from the
+                manifest, or from the month's file if the manifest predates
+                them; empty if the month has no partition
+        """
+        with self._lock:
+            self._refresh_manifest()
+            info = self._months.get(month)
+            if info is None:
+                return {}
+            if 'days' in info:
+                return info['days']
+            path = os.path.join(self.partition_dir, info['file'])
+        
+        return DailyRollup.summarize(self._read_file(path, DailyRollup.COLUMNS))
+    
+    def add_missing_summaries(self):
+        """
+        Store the daily rollup rows of months written before the manifest kept them
+        
+        The caller holds the lock file.
+        
+        Returns:
+            int: Number of months summarized
+        """
+        with self._lock:
+            self._refresh_manifest()
+            months = [month for month, info in self._months.items() if 'days' not in info]
+            for month in months:
+                self._months[month]['days'] = self.summary(month)
+            if months:
+                self._write_manifest()
+                logger.info(f"Stored daily totals of {len(months)} month partitions")
+        return len(months)
+    
+    def may_contain(self, patient_id):
+        """
+        Check cheaply whether a patient ID could be archived
+        
+        Generated IDs grow with time, so an ID after every archived one is
+        certainly free; other IDs need find() to be sure.
+        
+        Args:
+            patient_id (str): Patient ID
+        
+        Returns:
+            bool: False if the ID is certainly not archived
+        """
+        with self._lock:
+            self._refresh_manifest()
+            return bool(self._months) and patient_id.split('-')[0] <= self._latest_id.split('-')[0]
+    
+    def paths(self):
+        """
+        Get the workbook of every past month
+        
+        Returns:
+            list: Paths, oldest month first
+        """
+        with self._lock:
+            self._refresh_manifest()
+            return [os.path.join(self.partition_dir, self._months[month]['file']) for month in sorted(self._months)]
+    
+    def frame(self, month):
+        """
+        Get the patients of a past month, parsing its workbook if needed
+        
+        The file is parsed without holding the lock, so manifest lookups
+        such as may_contain() do not wait for it.
+        
+        Args:
+            month (str): Month in YYYY-MM format
+        
+        Returns:
+            pandas.DataFrame: Typed rows of the month, shared with the cache;
+                empty if the month has no partition
+        """
+        with self._lock:
+            self._refresh_manifest()
+            info = self._months.get(month)
+            if info is None:
+                self._frames.pop(month, None)
+                return pd.DataFrame()
+            
+            path = os.path.join(self.partition_dir, info['file'])
+            signature = self._signature(path)
+            cached = self._frames.get(month)
+            if cached is not None and cached[0] == signature:
+                self._frames.move_to_end(month)
+                return cached[1]
+        
+        df = typed_frame(self._read_file(path)) if signature is not None else pd.DataFrame()
+        
+        with self._lock:
+            # Kept only if the file was not rewritten while it was parsed
+            if self._signature(path) != signature:
+                return df
+            self._frames[month] = (signature, df)
+            self._frames.move_to_end(month)
+            while len(self._frames) > self.cache_months:
+                evicted, _ = self._frames.popitem(last=False)
+                logger.debug(f"Dropped partition {evicted} from memory")
+            
+            logger.info(f"Loaded partition {month} ({len(df)} rows)")
+            return df
+    
+    def select(self, month, start_date=None, end_date=None, doctor_name=None):
+        """
+        Get the patients of a past month that match a date range and a doctor
+        
+        A frozen month that is not in memory is filtered while it is read
+        and is not kept; other months are loaded with frame() and filtered.
+        
+        Args:
+            month (str): Month in YYYY-MM format
+            start_date (str, optional): First date in YYYY-MM-DD format. Defaults to None.
+            end_date (str, optional): Last date in YYYY-MM-DD format, inclusive. Defaults to None.
+            doctor_name (str, optional): Doctor name. Defaults to None.
+        
+        Returns:
+            pandas.DataFrame: Typed matching rows, empty if the month has no partition
+        """
+        with self._lock:
+            self._refresh_manifest()
+            info = self._months.get(month)
+            frozen = info is not None and is_archive(info['file']) and month not in self._frames
+        
+        if frozen:
+            path = os.path.join(self.partition_dir, info['file'])
+            return typed_frame(read_archive(path, start_date, end_date, doctor_name))
+        
+        df = self.frame(month)
+        if df.empty:
+            return df
+        if start_date or end_date:
+            df = df[date_mask(df['appointment_date'], start_date or '0000-00-00', end_date or '9999-99-99')]
+        if doctor_name is not None:
+            df = df[df['doctor_name'].astype(object) == doctor_name]
+        return df
+    
+    def find(self, patient_id, month_hint=None):
+        """
+        Find a patient in the past months
+        
+        Args:
+            patient_id (str): Patient ID
+            month_hint (str, optional): Month to look in first, such as the
+                one the ID was generated in. Defaults to None.
+        
+        Returns:
+            tuple: (month, row as a plain dict), or (None, None) if not found
+        """
+        months = self.months()
+        if month_hint in months:
+            months.remove(month_hint)
+            months.insert(0, month_hint)
+        
+        for month in months:
+            df = self.frame(month)
+            if df.empty:
+                continue
+            matches = df.index[df['patient_id'] == patient_id]
+            if len(matches) > 0:
+                return month, plain_row(df.loc[matches[0]])
+        return None, None
+    
+    def archive(self, df):
+        """
+        Move rows into their months' workbooks
+        
+        A row already in a month's workbook is replaced. The caller holds
+        the lock file.
+        
+        Args:
+            df (pandas.DataFrame): Plain rows to archive, all of past months
+        """
+        months = df['appointment_date'].astype(str).map(self.month_of)
+        
+        with self._lock:
+            self._refresh_manifest()
+            self._latest_id = max([self._latest_id] + [str(patient_id) for patient_id in df['patient_id']])
+            for month, rows in df.groupby(months):
+                existing = self._read_plain(month)
+                if not existing.empty:
+                    existing = existing[~existing['patient_id'].isin(rows['patient_id'])]
+                    rows = pd.concat([existing, rows], ignore_index=True)
+                self._write_month(month, rows)
+            self._write_manifest()
+        
+        logger.info(f"Archived {len(df)} rows into {months.nunique()} month partitions")
+    
+    def freeze(self, before_month):
+        """
+        Turn the workbooks of months before a month into compressed column files
+        
+        The caller holds the lock file.
+        
+        Args:
+            before_month (str): First month (YYYY-MM) left as a workbook
+        
+        Returns:
+            int: Number of months frozen
+        """
+        with self._lock:
+            self._refresh_manifest()
+            months = [month for month in sorted(self._months)
+                      if month < before_month and not is_archive(self._months[month]['file'])]
+            
+            for month in months:
+                old_path = os.path.join(self.partition_dir, self._months[month]['file'])
+                rows = self._read_plain(month)
+                file_name = f"{self.file_prefix}_{month}{archive_extension()}"
+                write_archive(rows, os.path.join(self.partition_dir, file_name))
+                self._months[month] = dict(self._months[month], file=file_name, rows=len(rows))
+                self._frames.pop(month, None)
+                
+                # The manifest points at the new file before the workbook goes
+                self._write_manifest()
+                if os.path.exists(old_path):
+                    os.remove(old_path)
+        
+        if months:
+            logger.info(f"Froze {len(months)} month partitions before {before_month}")
+        return len(months)
+    
+    def copy_to(self, target_dir):
+        """
+        Copy every month's file and the manifest into another folder
+        
+        The files are copied as they are, without being read. Nothing is
+        copied when there are no partitions. The caller holds the lock file.
+        
+        Args:
+            target_dir (str): Folder to copy into, created if needed
+        """
+        with self._lock:
+            self._refresh_manifest()
+            if not self._months:
+                return
+            
+            os.makedirs(target_dir, exist_ok=True)
+            for info in self._months.values():
+                shutil.copy2(os.path.join(self.partition_dir, info['file']), os.path.join(target_dir, info['file']))
+            shutil.copy2(self.manifest_path, os.path.join(target_dir, os.path.basename(self.manifest_path)))
+    
+    def remove(self, month, patient_id):
+        """
+        Take a patient out of a month's workbook
+        
+        The caller holds the lock file.
+        
+        Args:
+            month (str): Month in YYYY-MM format
+            patient_id (str): Patient ID
+        """
+        with self._lock:
+            self._refresh_manifest()
+            existing = self._read_plain(month)
+            if existing.empty:
+                return
+            
+            self._write_month(month, existing[existing['patient_id'] != patient_id])
+            self._write_manifest()
+    
+    def _read_plain(self, month):
+        """
+        Read a month's workbook as plain rows
+        
+        Args:
+            month (str): Month in YYYY-MM format
+        
+        Returns:
+            pandas.DataFrame: Rows, empty if the month has no partition
+        """
+        df = self.frame(month)
+        return plain_frame(df) if not df.empty else df
+    
+    @staticmethod
+    def _read_file(path, columns=None):
+        """
+        Read a month's file, workbook or frozen
+        
+        Args:
+            path (str): File path
+            columns (iterable, optional): Columns to read. Defaults to every column.
+        
+        Returns:
+            pandas.DataFrame: Rows as read, before typing
+        """
+        if is_archive(path):
+            return read_archive(path, columns=list(columns) if columns is not None else None)
+        if columns is not None:
+            return pd.read_excel(path, usecols=lambda column: column in columns)
+        return pd.read_excel(path)
+    
+    def _write_month(self, month, df):
+        """
+        Write a month's file and its manifest entry, or drop both if it is empty
+        
+        A frozen month stays frozen; other months are written as workbooks.
+        
+        Args:
+            month (str): Month in YYYY-MM format
+            df (pandas.DataFrame): Plain rows of the month
+        """
+        info = self._months.get(month)
+        file_name = info['file'] if info is not None else f"{self.file_prefix}_{month}.xlsx"
+        path = os.path.join(self.partition_dir, file_name)
+        self._frames.pop(month, None)
+        
+        if df.empty:
+            self._months.pop(month, None)
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        
+        os.makedirs(self.partition_dir, exist_ok=True)
+        if is_archive(path):
+            write_archive(df, path)
+        else:
+            temp_path = path + '.tmp.xlsx'
+            df.reset_index(drop=True).to_excel(temp_path, index=False)
+            os.replace(temp_path, path)
+        self._months[month] = {'file': file_name, 'rows': len(df), 'days': DailyRollup.summarize(df)}
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Name Index for the Receptionist Application
+Prefix and trigram index over patient names for ranked search
+"""
+
+import re
+import heapq
+import logging
+
+from utils.phonetic import ALIASES, phonetic_key, deletes, edit_distance
+
+logger = logging.getLogger('receptionist.name_index')
+
+# Names are split into words on anything that is not a letter or digit
+_WORD_SPLIT = re.compile(r'[\W_]+', re.UNICODE)
+
+# Match quality of a query word against a name word
+EXACT_MATCH = 5
+PREFIX_MATCH = 4
+PHONETIC_MATCH = 3
+INFIX_MATCH = 2
+FUZZY_MATCH = 1
+
+MATCH_ORDER = (EXACT_MATCH, PREFIX_MATCH, PHONETIC_MATCH, INFIX_MATCH, FUZZY_MATCH)
+
+# Query words shorter than this only match exactly or as a prefix
+MIN_FUZZY_LENGTH = 3
+
+class _TrieNode:
+    """Node of the prefix trie"""
+    
+    __slots__ = ('children', 'tokens')
+    
+    def __init__(self):
+        self.children = {}
+        # Every indexed word that starts with the path to this node
+        self.tokens = set()
+
+class NameIndex:
+    """
+    Name Index class for the Receptionist Application
+    Indexes the words of each patient's first and last name. Prefix
+    lookups walk a trie over the distinct words, infix lookups intersect
+    trigram sets, sound-alike spellings share a phonetic key, and typos are
+    found through one-character deletions checked with a bounded edit
+    distance. Results are ranked exact > prefix > phonetic > infix > typo
+    with newer patients first, stopping as soon as enough results are
+    found. User input is never treated as a pattern.
+    """
+    
+    def __init__(self):
+        """Initialize an empty Name Index"""
+        self.clear()
+    
+    def clear(self):
+        """Drop every entry"""
+        self._root = _TrieNode()
+        self._trigrams = {}
+        # word -> {patient_id: sequence}, kept in insertion (= sequence) order
+        self._postings = {}
+        # patient_id -> (words, sequence)
+        self._patients = {}
+        self._sequence = 0
+        # word -> phonetic key, phonetic key -> words, deletion -> words
+        self._word_keys = {}
+        self._phonetic = {}
+        self._deletes = {}
+    
+    def __len__(self):
+        return len(self._patients)
+    
+    @staticmethod
+    def tokenize(text):
+        """
+        Split text into lower-case words
+        
+        Args:
+            text (str): Name or search text
+        
+        Returns:
+            list: Words, without duplicates, in their original order
+        """
+        if not isinstance(text, str):
+            text = '' if text is None else str(text)
+        words = []
+        for word in _WORD_SPLIT.split(text.casefold()):
+            if word and word != 'nan' and word not in words:
+                words.append(word)
+        return words
+    
+    @classmethod
+    def name_key(cls, first_name, last_name):
+        """
+        Get the phonetic key stored with a patient row
+        
+        Args:
+            first_name (str): First name
+            last_name (str): Last name
+        
+        Returns:
+            str: One phonetic key per name word, separated by spaces
+        """
+        words = cls.tokenize(f"{first_name or ''} {last_name or ''}")
+        # '-' keeps the keys lined up with the words for words without letters
+        return ' '.join(phonetic_key(word) or '-' for word in words)
+    
+    @staticmethod
+    def _word_trigrams(word):
+        """
+        Get the trigrams of a word
+        
+        Args:
+            word (str): Word
+        
+        Returns:
+            set: Three-character substrings
+        """
+        return {word[i:i + 3] for i in range(len(word) - 2)}
+    
+    def build(self, rows):
+        """
+        Rebuild the index
+        
+        Args:
+            rows (iterable): (patient_id, first_name, last_name, name_key)
+                tuples, oldest first
+        """
+        self.clear()
+        for patient_id, first_name, last_name, name_key in rows:
+            self.add(patient_id, first_name, last_name, name_key)
+        logger.debug(f"Indexed names of {len(self._patients)} patients")
+    
+    def add(self, patient_id, first_name, last_name, name_key=None):
+        """
+        Add a patient, replacing any previous entry for the same ID
+        
+        Args:
+            patient_id (str): Patient ID
+            first_name (str): First name
+            last_name (str): Last name
+            name_key (str, optional): Stored result of name_key(); computed
+                here if missing or out of date
+        """
+        self.remove(patient_id)
+        
+        words = tuple(self.tokenize(f"{first_name or ''} {last_name or ''}"))
+        keys = name_key.split() if isinstance(name_key, str) else []
+        if len(keys) != len(words):
+            keys = self.name_key(first_name, last_name).split()
+        
+        self._sequence += 1
+        self._patients[patient_id] = (words, self._sequence)
+        
+        for word, key in zip(words, keys):
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = {}
+                self._add_word(word, key)
+            postings[patient_id] = self._sequence
+    
+    def remove(self, patient_id):
+        """
+        Remove a patient
+        
+        Args:
+            patient_id (str): Patient ID
+        """
+        entry = self._patients.pop(patient_id, None)
+        if entry is None:
+            return
+        
+        for word in entry[0]:
+            postings = self._postings.get(word)
+            if postings is None:
+                continue
+            postings.pop(patient_id, None)
+            if not postings:
+                del self._postings[word]
+                self._remove_word(word)
+    
+    def _add_word(self, word, key):
+        """
+        Add a distinct word to the trie, trigram, phonetic and deletion sets
+        
+        Args:
+            word (str): Word
+            key (str): Phonetic key of the word
+        """
+        node = self._root
+        node.tokens.add(word)
+        for char in word:
+            node = node.children.setdefault(char, _TrieNode())
+            node.tokens.add(word)
+        
+        for trigram in self._word_trigrams(word):
+            self._trigrams.setdefault(trigram, set()).add(word)
+        
+        self._word_keys[word] = key
+        self._phonetic.setdefault(key, set()).add(word)
+        
+        if len(word) >= MIN_FUZZY_LENGTH:
+            for variant in deletes(word) | {word}:
+                self._deletes.setdefault(variant, set()).add(word)
+    
+    def _remove_word(self, word):
+        """
+        Remove a word no patient uses any more
+        
+        Args:
+            word (str): Word
+        """
+        node = self._root
+        node.tokens.discard(word)
+        for char in word:
+            child = node.children.get(char)
+            if child is None:
+                break
+            child.tokens.discard(word)
+            if not child.tokens:
+                # Nothing below this node is indexed any more
+                del node.children[char]
+                break
+            node = child
+        
+        lookups = [(self._trigrams, trigram) for trigram in self._word_trigrams(word)]
+        lookups.append((self._phonetic, self._word_keys.pop(word, None)))
+        if len(word) >= MIN_FUZZY_LENGTH:
+            lookups.extend((self._deletes, variant) for variant in deletes(word) | {word})
+        
+        for table, key in lookups:
+            words = table.get(key)
+            if words is not None:
+                words.discard(word)
+                if not words:
+                    del table[key]
+    
+    def _matching_words(self, query_word):
+        """
+        Find the indexed words a query word matches
+        
+        Args:
+            query_word (str): Lower-case query word
+        
+        Returns:
+            dict: Indexed word to match quality
+        """
+        matches = {}
+        
+        node = self._root
+        for char in query_word:
+            node = node.children.get(char)
+            if node is None:
+                break
+        else:
+            for word in node.tokens:
+                matches[word] = EXACT_MATCH if word == query_word else PREFIX_MATCH
+        
+        # Words containing the query somewhere after their first letter
+        if len(query_word) >= 3:
+            candidates = None
+            for trigram in self._word_trigrams(query_word):
+                words = self._trigrams.get(trigram)
+                if not words:
+                    candidates = set()
+                    break
+                candidates = set(words) if candidates is None else candidates & words
+                if not candidates:
+                    break
+            for word in candidates or ():
+                if word not in matches and query_word in word:
+                    matches[word] = INFIX_MATCH
+        
+        if len(query_word) >= MIN_FUZZY_LENGTH or query_word in ALIASES:
+            # Other spellings of the same sound, such as Mohammad for Muhammad
+            for word in self._phonetic.get(phonetic_key(query_word), ()):
+                if matches.get(word, 0) < PHONETIC_MATCH:
+                    matches[word] = PHONETIC_MATCH
+        
+        if len(query_word) >= MIN_FUZZY_LENGTH:
+            # Typos: one edit for short words, two for longer ones
+            max_distance = 1 if len(query_word) < 5 else 2
+            candidates = set()
+            for variant in deletes(query_word) | {query_word}:
+                candidates.update(self._deletes.get(variant, ()))
+            for word in candidates:
+                if word not in matches and edit_distance(query_word, word, max_distance) <= max_distance:
+                    matches[word] = FUZZY_MATCH
+        
+        return matches
+    
+    def search(self, text, limit=100):
+        """
+        Search for patients by name
+        
+        Every word of the search text has to match a word of the patient's
+        first or last name: as the whole word or its beginning, or, for
+        three or more characters, anywhere inside it, by sound, or with a
+        typo.
+        
+        Args:
+            text (str): Search text
+            limit (int, optional): Maximum number of results. Defaults to 100.
+        
+        Returns:
+            list: Patient IDs, best match first
+        """
+        query_words = self.tokenize(text)
+        if not query_words or limit <= 0:
+            return []
+        
+        word_matches = [self._matching_words(word) for word in query_words]
+        if not all(word_matches):
+            return []
+        
+        if len(query_words) == 1:
+            return self._search_single(word_matches[0], limit)
+        
+        # Narrow down with set intersections, most selective word first,
+        # so only patients matching every word are scored
+        def posting_count(matches):
+            return sum(len(self._postings[word]) for word in matches)
+        
+        candidates = None
+        for matches in sorted(word_matches, key=posting_count):
+            word_candidates = set()
+            for word in matches:
+                word_candidates.update(self._postings[word])
+            candidates = word_candidates if candidates is None else candidates & word_candidates
+            if not candidates:
+                return []
+        
+        scored = []
+        for patient_id in candidates:
+            words, sequence = self._patients[patient_id]
+            total = 0
+            for matches in word_matches:
+                score = max(matches.get(word, 0) for word in words)
+                if score == 0:
+                    break
+                total += score
+            else:
+                scored.append((-total, -sequence, patient_id))
+        
+        return [patient_id for _, _, patient_id in heapq.nsmallest(limit, scored)]
+    
+    def _search_single(self, matches, limit):
+        """
+        Collect the best matches of a single-word search
+        
+        Patients are taken bucket by bucket, exact matches first, and newest
+        first within a bucket, so only as many postings are read as results
+        are needed.
+        
+        Args:
+            matches (dict): Indexed word to match quality
+            limit (int): Maximum number of results
+        
+        Returns:
+            list: Patient IDs, best match first
+        """
+        results = []
+        seen = set()
+        
+        for quality in MATCH_ORDER:
+            words = [word for word, score in matches.items() if score == quality]
+            if not words:
+                continue
+            
+            newest_first = [reversed(self._postings[word].items()) for word in words]
+            for patient_id, _ in heapq.merge(*newest_first, key=lambda item: -item[1]):
+                if patient_id in seen:
+                    continue
+                seen.add(patient_id)
+                results.append(patient_id)
+                if len(results) >= limit:
+                    return results
+        
+        return results
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Patient Index for the Receptionist Application
+In-memory lookup tables over the cached patient DataFrame
+"""
+
+import logging
+
+logger = logging.getLogger('receptionist.patient_index')
+
+class PatientIndex:
+    """
+    Patient Index class for the Receptionist Application
+    Maps patient IDs, appointment dates and (doctor, date) pairs to row
+    labels of the cached DataFrame. It is built once when the workbook is
+    parsed and then kept up to date change by change, so lookups do not
+    depend on how many visits have been recorded.
+    """
+    
+    def __init__(self):
+        """Initialize an empty Patient Index"""
+        self.clear()
+    
+    def clear(self):
+        """Drop every entry"""
+        # patient_id -> row labels; older workbooks may hold an ID more than once
+        self.by_id = {}
+        self.by_date = {}
+        self.by_doctor = {}
+        self.by_doctor_date = {}
+    
+    def build(self, df):
+        """
+        Rebuild the index from a DataFrame
+        
+        Args:
+            df (pandas.DataFrame): Patient DataFrame
+        """
+        self.clear()
+        for label, patient_id, date, doctor in zip(
+            df.index, df['patient_id'], df['appointment_date'], df['doctor_name']
+        ):
+            self.add_row(label, patient_id, date, doctor)
+        logger.debug(f"Indexed {len(df)} rows")
+    
+    def add_row(self, label, patient_id, date, doctor):
+        """
+        Add a row to the index
+        
+        Args:
+            label: Row label in the DataFrame
+            patient_id (str): Patient ID
+            date (str): Appointment date
+            doctor (str): Doctor name
+        """
+        self.by_id.setdefault(patient_id, []).append(label)
+        self.by_date.setdefault(date, set()).add(label)
+        self.by_doctor.setdefault(doctor, set()).add(label)
+        self.by_doctor_date.setdefault((doctor, date), set()).add(label)
+    
+    def remove_row(self, label, patient_id, date, doctor):
+        """
+        Remove a row from the index
+        
+        Args:
+            label: Row label in the DataFrame
+            patient_id (str): Patient ID
+            date (str): Appointment date the row was indexed under
+            doctor (str): Doctor name the row was indexed under
+        """
+        labels = self.by_id.get(patient_id)
+        if labels is not None:
+            if label in labels:
+                labels.remove(label)
+            if not labels:
+                del self.by_id[patient_id]
+        
+        for table, key in (
+            (self.by_date, date),
+            (self.by_doctor, doctor),
+            (self.by_doctor_date, (doctor, date))
+        ):
+            labels = table.get(key)
+            if labels is not None:
+                labels.discard(label)
+                if not labels:
+                    del table[key]
+    
+    def get_labels(self, patient_id):
+        """
+        Get the row labels holding a patient ID
+        
+        Args:
+            patient_id (str): Patient ID
+        
+        Returns:
+            list: Row labels in DataFrame order, empty if the ID is unknown
+        """
+        return list(self.by_id.get(patient_id, ()))
+    
+    def contains(self, patient_id):
+        """
+        Check whether a patient ID is present
+        
+        Args:
+            patient_id (str): Patient ID
+        
+        Returns:
+            bool: True if at least one row holds the ID
+        """
+        return patient_id in self.by_id
+    
+    def labels_for_date(self, date):
+        """
+        Get the row labels of appointments on a date
+        
+        Args:
+            date (str): Date in format YYYY-MM-DD
+        
+        Returns:
+            list: Row labels in DataFrame order
+        """
+        return sorted(self.by_date.get(date, ()))
+    
+    def labels_for_doctor(self, doctor_name, date=None):
+        """
+        Get the row labels of a doctor's appointments
+        
+        Args:
+            doctor_name (str): Doctor name
+            date (str, optional): Date in format YYYY-MM-DD. Defaults to None.
+        
+        Returns:
+            list: Row labels in DataFrame order
+        """
+        if date:
+            return sorted(self.by_doctor_date.get((doctor_name, date), ()))
+        return sorted(self.by_doctor.get(doctor_name, ()))
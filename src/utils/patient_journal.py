@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Patient Journal for the Receptionist Application
+Append-only write-ahead log of patient changes kept next to the workbook
+"""
+
+import os
+import json
+import logging
+from datetime import datetime
+
+from utils.patient_schema import append_row, assign
+
+logger = logging.getLogger('receptionist.patient_journal')
+
+def _json_default(value):
+    """
+    Convert values json cannot encode, such as numpy scalars
+    
+    Args:
+        value: Value to convert
+    
+    Returns:
+        A JSON serializable value
+    """
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+def row_version(value):
+    """
+    Get a stored row version as a number
+    
+    Args:
+        value: Version as stored; blank for rows saved before versions existed
+    
+    Returns:
+        int: Version, 0 if blank or not a number
+    """
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+def entry_applies(df, entry, labels):
+    """
+    Check whether a journal entry takes effect on a patient DataFrame
+    
+    An update or delete made against a known row version only applies if
+    the row still has that version. Entries are replayed in journal order,
+    so when two workstations change the same patient from the same version
+    the first change written wins on every workstation.
+    
+    Args:
+        df (pandas.DataFrame): DataFrame the entry would change
+        entry (dict): Journal entry
+        labels (list): Row labels holding the entry's patient ID
+    
+    Returns:
+        bool: False for a checkpoint marker or an entry whose version no longer matches
+    """
+    if entry['op'] == PatientJournal.CHECKPOINT:
+        return False
+    
+    expected = entry.get('expected_version')
+    if expected is None or len(labels) == 0 or 'version' not in df.columns:
+        return True
+    return row_version(df.at[labels[0], 'version']) == expected
+
+def apply_entry(df, entry, labels=None):
+    """
+    Apply a journal entry to a patient DataFrame
+    
+    Live changes, startup replay and backup restores all go through here, so
+    replaying entries reproduces exactly the state the user saw. After a
+    crash between writing the workbook and emptying the journal, entries
+    already in the workbook are applied again: adds and deletes change
+    nothing, and an update rewrites the same values, but an update without
+    an expected version moves the row's version on once more, unless the
+    patient's add is replayed too and resets it. A desk editing that
+    patient from the older version is then refused, as if another
+    workstation had changed it.
+    
+    Args:
+        df (pandas.DataFrame): DataFrame to change, modified in place where possible
+        entry (dict): Journal entry
+        labels (list, optional): Row labels holding the entry's patient ID,
+            when the caller already knows them. Found by a scan otherwise.
+        
+    Returns:
+        pandas.DataFrame: The changed DataFrame
+    """
+    if entry['op'] == PatientJournal.CHECKPOINT:
+        return df
+    
+    op = entry['op']
+    patient_id = entry['patient_id']
+    data = entry.get('data', {})
+    if labels is None:
+        labels = df.index[df['patient_id'] == patient_id]
+    
+    if not entry_applies(df, entry, labels):
+        return df
+    
+    if op == 'delete':
+        if len(labels) > 0:
+            df.drop(index=labels, inplace=True)
+        return df
+    
+    # Columns outside the standard list are kept, as the workbook always has
+    for key in data:
+        if key not in df.columns:
+            df[key] = ''
+    
+    if op == 'add' and len(labels) == 0:
+        # Rows are only ever appended, so the last label is the largest
+        new_label = df.index[-1] + 1 if len(df) > 0 else 0
+        return append_row(df, new_label, data)
+    
+    # An update, or an add that is already present after a crash; values
+    # are stored in each column's type
+    for key, value in data.items():
+        assign(df, labels, key, value)
+    
+    # Every applied update moves the row to a new version
+    if op == 'update' and 'version' in df.columns and len(labels) > 0:
+        assign(df, labels, 'version', row_version(df.at[labels[0], 'version']) + 1)
+    return df
+
+class PatientJournal:
+    """
+    Patient Journal class for the Receptionist Application
+    Stores one JSON line per add/update/delete. Every append is fsynced, so
+    a change is durable as soon as append_entries() returns, without
+    rewriting the workbook. Entries appended together share one fsync.
+    
+    Several workstations may share the journal. Lines are only ever
+    appended, so a workstation catches up on the others' changes by reading
+    from the byte offset it last read up to. When the journal is folded into
+    the workbook it starts again with a checkpoint line that numbers the
+    workbook generation, records how long the journal was and counts the
+    changes folded into the workbook so far.
+    """
+    
+    # Operation of the marker line a folded journal starts with
+    CHECKPOINT = 'checkpoint'
+    
+    def __init__(self, journal_path):
+        """
+        Initialize the Patient Journal
+        
+        Args:
+            journal_path (str): Path to the journal file
+        """
+        self.journal_path = journal_path
+        self.entry_count = len([entry for entry in self.read_entries() if entry['op'] != self.CHECKPOINT])
+    
+    @staticmethod
+    def make_entry(op, patient_id, data=None, expected_version=None, moved_from=None):
+        """
+        Build a journal entry
+        
+        Args:
+            op (str): 'add', 'update' or 'delete'
+            patient_id (str): Patient ID
+            data (dict, optional): Full row for 'add', changed fields for
+                'update', and the removed row for 'delete' of an archived patient
+            expected_version (int, optional): Row version the change was made
+                against. Defaults to None, which applies it to any version.
+            moved_from (str, optional): Month partition an 'add' brings the
+                patient back from, rather than a new patient. Defaults to None.
+        
+        Returns:
+            dict: Journal entry
+        """
+        entry = {
+            'op': op,
+            'patient_id': patient_id,
+            'data': data or {},
+            'ts': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        if expected_version is not None:
+            entry['expected_version'] = expected_version
+        if moved_from is not None:
+            entry['moved_from'] = moved_from
+        return entry
+    
+    def append_entries(self, entries):
+        """
+        Append several entries with a single write and fsync
+        
+        Args:
+            entries (list): Journal entries built with make_entry()
+        
+        Returns:
+            int: Size of the journal in bytes after the append, None if
+                there was nothing to append
+        """
+        if not entries:
+            return None
+        
+        data = ''.join(
+            json.dumps(entry, default=_json_default, ensure_ascii=False) + '\n'
+            for entry in entries
+        )
+        
+        with open(self.journal_path, 'a+b') as f:
+            # Start on a fresh line if a crash left a torn entry at the end
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    data = '\n' + data
+            f.write(data.encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        
+        self.entry_count += len(entries)
+        return size
+    
+    def read_entries(self):
+        """
+        Read all journal entries in the order they were written
+        
+        A torn last line, left by a crash in the middle of an append, is
+        ignored; that change was never acknowledged to the caller.
+        
+        Returns:
+            list: Journal entries
+        """
+        if not os.path.exists(self.journal_path):
+            return []
+        
+        entries = []
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping unreadable journal line {line_number} in {self.journal_path}")
+        
+        return entries
+    
+    def read_from(self, offset):
+        """
+        Read the entries appended after a byte offset
+        
+        A last line without its newline is being written, or was torn by a
+        crash, and is left for the next read.
+        
+        Args:
+            offset (int): Size of the journal when it was last read
+        
+        Returns:
+            tuple: (entries, offset after the last complete line), or None if
+                the journal is now shorter than offset because it was folded
+        """
+        try:
+            with open(self.journal_path, 'rb') as f:
+                size = f.seek(0, os.SEEK_END)
+                if size < offset:
+                    return None
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return None if offset > 0 else ([], 0)
+        
+        complete = data.rfind(b'\n') + 1
+        entries = []
+        for line in data[:complete].decode('utf-8').splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping unreadable journal line in {self.journal_path}")
+        
+        return entries, offset + complete
+    
+    def checkpoint(self, generation, folded_size, archived_before=None, sequence=0):
+        """
+        Empty the journal once its entries are folded into the workbook,
+        leaving a checkpoint line
+        
+        A workstation that had read the journal up to folded_size, with the
+        workbook of generation - 1, already holds exactly what the new
+        workbook holds, less the rows moved to month partitions, and does
+        not need to parse it.
+        
+        Args:
+            generation (int): Generation of the workbook just written
+            folded_size (int): Size of the journal that was folded in
+            archived_before (str, optional): Month (YYYY-MM) before which
+                rows were moved out of the workbook. Defaults to None.
+            sequence (int, optional): Number of changes folded into the
+                workbook over all generations. Defaults to 0.
+        
+        Returns:
+            int: Size of the journal in bytes after the checkpoint line
+        """
+        entry = {'op': self.CHECKPOINT, 'generation': generation, 'folded_size': folded_size, 'sequence': sequence}
+        if archived_before is not None:
+            entry['archived_before'] = archived_before
+        data = (json.dumps(entry) + '\n').encode('utf-8')
+        with open(self.journal_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.entry_count = 0
+        return len(data)
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Patient Schema for the Receptionist Application
+Compact column types for the cached patient table
+"""
+
+import logging
+from datetime import date as date_type, datetime
+
+import pandas as pd
+
+logger = logging.getLogger('receptionist.patient_schema')
+
+# Type of each typed column of PatientStore.COLUMNS; the rest hold text
+# with blanks as empty strings
+SCHEMA = {
+    'doctor_name': 'category',
+    'city': 'category',
+    'guardian_relation': 'category',
+    'status': 'category',
+    'fees': 'Int64',
+    'token_number': 'Int64',
+    'version': 'Int64',
+    'appointment_date': 'date'
+}
+
+DATE_FORMAT = '%Y-%m-%d'
+
+def _is_blank(value):
+    """
+    Check whether a value is an empty field
+    
+    Args:
+        value: Value to check
+    
+    Returns:
+        bool: True for None, NaN, NA, NaT and blank text
+    """
+    if isinstance(value, str):
+        return value.strip() in ('', 'nan', 'NaN')
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):
+        return False
+
+def _blank_mask(series):
+    """
+    Find the empty fields of a column
+    
+    Args:
+        series (pandas.Series): Column as read from the workbook
+    
+    Returns:
+        pandas.Series: True where the field is empty
+    """
+    return series.isna() | series.astype(str).str.strip().isin(['', 'nan', 'NaN'])
+
+def _to_int(series, blank):
+    """
+    Convert a column to nullable integers
+    
+    Args:
+        series (pandas.Series): Column as read from the workbook
+        blank (pandas.Series): Empty fields of the column
+    
+    Returns:
+        pandas.Series: Int64 column, or None if a field is not a whole number
+    """
+    numbers = pd.to_numeric(series.where(~blank), errors='coerce')
+    if (numbers.isna() & ~blank).any() or (numbers.dropna() % 1 != 0).any():
+        return None
+    return numbers.astype('Int64')
+
+def _to_date(series, blank):
+    """
+    Convert a column to dates
+    
+    Args:
+        series (pandas.Series): Column as read from the workbook
+        blank (pandas.Series): Empty fields of the column
+    
+    Returns:
+        pandas.Series: datetime64 column, or None if a field is not a plain date
+    """
+    dates = pd.to_datetime(series.where(~blank).astype(object), format='ISO8601', errors='coerce')
+    if (dates.isna() & ~blank).any() or (dates.dropna() != dates.dropna().dt.normalize()).any():
+        return None
+    return dates
+
+def typed_frame(df):
+    """
+    Give a patient DataFrame read from a workbook its compact column types
+    
+    Empty fields of typed columns become NA, or an empty category; empty
+    fields of text columns become empty strings. A typed column holding a
+    value that does not fit its type, such as a token typed as 'A12', is
+    kept as text so nothing is lost.
+    
+    Args:
+        df (pandas.DataFrame): Patients as read, modified in place
+    
+    Returns:
+        pandas.DataFrame: The typed DataFrame
+    """
+    for column in df.columns:
+        kind = SCHEMA.get(column)
+        series = df[column]
+        
+        if kind is None:
+            df[column] = series.fillna('')
+            continue
+        
+        blank = _blank_mask(series)
+        if kind == 'category':
+            converted = series.where(~blank, '').astype(str).astype('category')
+        elif kind == 'Int64':
+            converted = _to_int(series, blank)
+        else:
+            converted = _to_date(series, blank)
+        
+        if converted is None:
+            logger.warning(f"Column '{column}' holds values that are not {kind}; keeping it as text")
+            df[column] = series.where(~blank, '').astype(object)
+        else:
+            df[column] = converted
+    
+    return df
+
+def plain_value(value):
+    """
+    Get a value as views and the journal expect it
+    
+    Args:
+        value: Value from the typed DataFrame
+    
+    Returns:
+        The value, with blanks as '', dates as YYYY-MM-DD text and numpy
+        numbers as Python numbers
+    """
+    if _is_blank(value):
+        return ''
+    if isinstance(value, (datetime, date_type)):
+        return value.strftime(DATE_FORMAT)
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+def plain_frame(df):
+    """
+    Get a copy of a typed patient DataFrame as views expect it
+    
+    Args:
+        df (pandas.DataFrame): Typed DataFrame
+    
+    Returns:
+        pandas.DataFrame: Copy with blanks as '', dates as YYYY-MM-DD text
+            and no categorical or nullable columns
+    """
+    plain = df.copy()
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            plain[column] = series.astype(object)
+        elif pd.api.types.is_datetime64_any_dtype(series.dtype):
+            plain[column] = series.dt.strftime(DATE_FORMAT).astype(object).where(series.notna(), '')
+        elif isinstance(series.dtype, pd.Int64Dtype):
+            plain[column] = series.astype(object).where(series.notna(), '')
+    return plain
+
+def plain_row(row):
+    """
+    Get a row of a typed DataFrame as a dict of plain values
+    
+    Args:
+        row (pandas.Series): Row
+    
+    Returns:
+        dict: Column -> plain_value()
+    """
+    return {column: plain_value(value) for column, value in row.items()}
+
+def date_mask(series, start_date, end_date):
+    """
+    Find the rows of a date column within a range
+
+    Args:
+        series (pandas.Series): appointment_date column, typed or text
+        start_date (str): First date in YYYY-MM-DD format
+        end_date (str): Last date in YYYY-MM-DD format, inclusive
+
+    Returns:
+        pandas.Series: True for rows dated within the range
+    """
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return (series >= pd.Timestamp(start_date)) & (series <= pd.Timestamp(end_date))
+    dates = series.astype(str).str[:10]
+    return (dates >= start_date) & (dates <= end_date)
+
+def _coerce(dtype, value):
+    """
+    Convert a value to a column type
+    
+    Args:
+        dtype: Column dtype
+        value: Value to store
+    
+    Returns:
+        The value as the column holds it
+    
+    Raises:
+        ValueError: If the value does not fit the type
+    """
+    blank = _is_blank(value)
+    
+    if isinstance(dtype, pd.Int64Dtype):
+        if blank:
+            return pd.NA
+        number = float(value)
+        if not number.is_integer():
+            raise ValueError(f"{value!r} is not a whole number")
+        return int(number)
+    
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        if blank:
+            return pd.NaT
+        timestamp = pd.Timestamp(value)
+        if timestamp != timestamp.normalize():
+            raise ValueError(f"{value!r} is not a plain date")
+        return timestamp
+    
+    return '' if blank else value
+
+def _is_typed(dtype):
+    """
+    Check whether a column dtype is one of the schema's compact types
+    
+    Args:
+        dtype: Column dtype
+    
+    Returns:
+        bool: True for categorical, Int64 and datetime64 columns
+    """
+    return (isinstance(dtype, (pd.CategoricalDtype, pd.Int64Dtype))
+            or pd.api.types.is_datetime64_any_dtype(dtype))
+
+def _fit(df, column, value):
+    """
+    Convert a value for a column, widening the column if it has to
+    
+    A value that does not fit turns a typed column back into text, and a
+    category missing from a categorical column is added to it.
+    
+    Args:
+        df (pandas.DataFrame): Typed DataFrame, modified in place
+        column (str): Column name
+        value: Value to store
+    
+    Returns:
+        The value as the column holds it
+    """
+    try:
+        value = _coerce(df[column].dtype, value)
+    except (TypeError, ValueError):
+        logger.warning(f"Value {value!r} does not fit column '{column}'; keeping it as text")
+        df[column] = plain_frame(df[[column]])[column].astype(object)
+        value = '' if _is_blank(value) else value
+    
+    dtype = df[column].dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        if value not in dtype.categories:
+            df[column] = df[column].cat.add_categories([value])
+    elif not _is_typed(dtype) and dtype != object:
+        # Text columns read as string or float dtypes take any value as objects
+        df[column] = df[column].astype(object)
+    return value
+
+def assign(df, labels, column, value):
+    """
+    Store a value in some rows, keeping the column's type where it fits
+    
+    Args:
+        df (pandas.DataFrame): Typed DataFrame, modified in place
+        labels (list): Row labels
+        column (str): Column name
+        value: Value to store
+    """
+    df.loc[labels, column] = _fit(df, column, value)
+
+def append_row(df, label, data):
+    """
+    Append a row, keeping every column's type
+    
+    Setting a new row with .loc would turn categorical columns into text,
+    so the row is built with the DataFrame's dtypes and concatenated.
+    
+    Args:
+        df (pandas.DataFrame): Typed DataFrame
+        label: Label of the new row
+        data (dict): Column -> value; missing columns are blank
+    
+    Returns:
+        pandas.DataFrame: DataFrame with the row appended
+    """
+    values = {}
+    for column in df.columns:
+        value = _fit(df, column, data.get(column, ''))
+        values[column] = pd.Series([value], index=[label], dtype=df[column].dtype)
+    
+    row = pd.DataFrame(values)
+    if len(df) == 0:
+        return row
+    return pd.concat([df, row])
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Patient Store interface for the Receptionist Application
+Defines the operations every patient storage backend must provide
+"""
+
+import os
+import logging
+from datetime import datetime
+
+import pandas as pd
+
+logger = logging.getLogger('receptionist.patient_store')
+
+class PatientStore:
+    """
+    Base class for patient storage backends
+    
+    PatientModel and StatsHandler only talk to the methods defined here, so
+    the Excel workbook, the SQLite database and the data server can be
+    swapped through the 'storage_backend' setting.
+    """
+    
+    # Define the columns stored for every patient
+    COLUMNS = [
+        'patient_id',
+        'token_number',
+        'first_name',
+        'last_name',
+        'guardian_relation',
+        'address',
+        'city',
+        'postal_code',
+        'phone_number',
+        'email',
+        'doctor_name',
+        'appointment_date',
+        'appointment_time',  # This is used for checkup time
+        'arrival_time',
+        'appointment_duration',
+        'fees',
+        'reason_for_visit',
+        'status',  # New / Old patient, as chosen in the patient form
+        'remarks',
+        'name_key',  # Phonetic key of the name, used by fuzzy name search
+        'created_at',
+        'updated_at',
+        'version'  # Raised on every update, for optimistic concurrency between workstations
+    ]
+    
+    # Path of the file backing the store, shown in the status bar
+    storage_path = ''
+    
+    # BackupManager holding the store's snapshots and deltas
+    backup_manager = None
+    
+    @staticmethod
+    def _generate_patient_id(id_exists=None):
+        """
+        Generate a new patient ID from the current timestamp
+        
+        Args:
+            id_exists (callable, optional): Returns True if an ID is already
+                taken. Used to add a suffix when two patients are registered
+                within the same second.
+        
+        Returns:
+            str: Patient ID
+        """
+        now = datetime.now()
+        base_id = f"P{now.strftime('%Y%m%d%H%M%S')}"
+        
+        patient_id = base_id
+        suffix = 1
+        while id_exists is not None and id_exists(patient_id):
+            suffix += 1
+            patient_id = f"{base_id}-{suffix}"
+        
+        return patient_id
+    
+    @staticmethod
+    def _is_blank(value):
+        """
+        Check whether a value should be stored as an empty field
+        
+        Args:
+            value: Value to check
+        
+        Returns:
+            bool: True if the value is None, NaN or the string 'nan'
+        """
+        if value is None:
+            return True
+        if isinstance(value, str):
+            return value in ('nan', 'NaN')
+        try:
+            return bool(pd.isna(value))
+        except (TypeError, ValueError):
+            return False
+    
+    @staticmethod
+    def _notify_complete(on_complete, success):
+        """
+        Report the outcome of a write that finished synchronously
+        
+        Args:
+            on_complete (callable): Completion callback or None
+            success (bool): Whether the write succeeded
+        """
+        if on_complete is not None:
+            on_complete(success)
+    
+    def get_all_patients(self):
+        """
+        Get all patients
+        
+        Returns:
+            pandas.DataFrame: DataFrame containing all patients
+        """
+        raise NotImplementedError
+    
+    def get_patient_count(self):
+        """
+        Get the number of patient rows
+        
+        Returns:
+            int: Row count
+        """
+        raise NotImplementedError
+    
+    def get_patients_slice(self, start, count):
+        """
+        Get a range of patients in the order get_all_patients() returns them
+        
+        Args:
+            start (int): Index of the first row
+            count (int): Maximum number of rows
+        
+        Returns:
+            pandas.DataFrame: The rows in that range
+        """
+        raise NotImplementedError
+    
+    def get_patient_by_id(self, patient_id):
+        """
+        Get a patient by ID
+        
+        Args:
+            patient_id (str): Patient ID
+        
+        Returns:
+            dict: Patient data or None if not found
+        """
+        raise NotImplementedError
+    
+    def get_patients_by_name(self, name, limit=100):
+        """
+        Search for patients by name (first or last)
+        
+        Args:
+            name (str): Name to search for; blank text returns the first patients, up to limit
+            limit (int, optional): Maximum number of matches. Defaults to 100.
+        
+        Returns:
+            pandas.DataFrame: Matching patients, best match first
+        """
+        raise NotImplementedError
+    
+    def add_patient(self, patient_data, on_complete=None):
+        """
+        Add a new patient
+        
+        Args:
+            patient_data (dict): Patient data. The generated patient_id and
+                token_number are written back into this dict.
+            on_complete (callable, optional): Called with True once the change
+                is durable, or False if writing it failed. Only called when
+                this method returned True; backends that write in the
+                background call it from their writer thread.
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        raise NotImplementedError
+    
+    def get_next_token_number(self, date):
+        """
+        Get the token number the next patient added on a day will get
+        
+        Only a preview: the number is given out when add_patient() is called
+        without a token number, so two forms showing the same preview still
+        save different tokens.
+        
+        Args:
+            date (str): Date in format YYYY-MM-DD
+        
+        Returns:
+            str: Next token number
+        """
+        raise NotImplementedError
+    
+    def update_patient(self, patient_id, patient_data, on_complete=None):
+        """
+        Update an existing patient
+        
+        Args:
+            patient_id (str): Patient ID
+            patient_data (dict): Updated patient data. If it holds a 'version',
+                the update is refused unless the stored row still has that
+                version, so a change made on another workstation since the
+                data was read is not overwritten.
+            on_complete (callable, optional): See add_patient()
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        raise NotImplementedError
+    
+    def delete_patient(self, patient_id, on_complete=None):
+        """
+        Delete a patient
+        
+        Args:
+            patient_id (str): Patient ID
+            on_complete (callable, optional): See add_patient()
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        raise NotImplementedError
+    
+    def get_appointments_for_date(self, date):
+        """
+        Get all appointments for a specific date
+        
+        Args:
+            date (str): Date in format YYYY-MM-DD
+        
+        Returns:
+            pandas.DataFrame: DataFrame containing appointments for the date
+        """
+        raise NotImplementedError
+    
+    def get_appointments_between(self, start_date, end_date):
+        """
+        Get all appointments in a date range
+        
+        Args:
+            start_date (str): First date in format YYYY-MM-DD
+            end_date (str): Last date in format YYYY-MM-DD, inclusive
+        
+        Returns:
+            pandas.DataFrame: DataFrame containing appointments in the range
+        """
+        raise NotImplementedError
+    
+    def get_appointments_for_doctor(self, doctor_name, date=None):
+        """
+        Get all appointments for a specific doctor
+        
+        Args:
+            doctor_name (str): Doctor name
+            date (str, optional): Date in format YYYY-MM-DD. Defaults to None.
+        
+        Returns:
+            pandas.DataFrame: DataFrame containing appointments for the doctor
+        """
+        raise NotImplementedError
+    
+    def poll_external_changes(self):
+        """
+        Get the changes other workstations made since the last poll
+        
+        Returns:
+            list: (patient_id, old, new) tuples with the rows as dicts, None
+                for an added or deleted row; or None if the data was reloaded
+                and anything may have changed
+        """
+        return []
+    
+    def get_change_marker(self):
+        """
+        Get a number that moves on with every change to the stored patients
+        
+        Every workstation sharing the data gets the same number for the same
+        data, so the daily rollup saved with it can be checked on the next
+        start.
+        
+        Returns:
+            int: Marker, or None if the store cannot tell
+        """
+        return None
+    
+    def get_daily_summaries(self):
+        """
+        Get the daily rollup rows of every stored patient, in parts
+        
+        Returns:
+            list: Dicts from DailyRollup.summarize(); a date may appear in
+                more than one part
+        """
+        from utils.daily_rollup import DailyRollup
+        return [DailyRollup.summarize(self.get_all_patients())]
+    
+    def create_daily_rollup(self):
+        """
+        Create the per-day totals the statistics are read from
+        
+        Returns:
+            DailyRollup: Rollup kept in a JSON file next to the data file
+        """
+        from utils.daily_rollup import DailyRollup
+        return DailyRollup(self, os.path.splitext(self.storage_path)[0] + '_daily_rollup.json')
+    
+    def create_backup(self):
+        """Create a backup copy of the store"""
+        raise NotImplementedError
+    
+    def restore_backup(self, point_in_time, export_path):
+        """
+        Restore the patient data as it was at a point in time into a workbook
+        
+        Args:
+            point_in_time (datetime): Time to restore
+            export_path (str): Path of the workbook to write
+        
+        Returns:
+            int: Number of patients in the restored workbook
+        
+        Raises:
+            ValueError: If no backup covers that time
+        """
+        if self.backup_manager is None:
+            raise ValueError("This storage backend does not keep backups")
+        return self.backup_manager.restore_to_excel(point_in_time, export_path)
+    
+    def export_to_excel(self, export_path):
+        """
+        Export all patients to an Excel workbook
+        
+        Args:
+            export_path (str): Path of the workbook to write
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            df = self.get_all_patients()
+            
+            # Keep the standard column order, followed by any extra columns
+            extra_columns = [col for col in df.columns if col not in self.COLUMNS]
+            df = df.reindex(columns=self.COLUMNS + extra_columns, fill_value='')
+            
+            df.to_excel(export_path, index=False)
+            logger.info(f"Exported {len(df)} patients to {export_path}")
+            return True
+        except Exception as e:
+            logger.error(f"Error exporting patients to Excel: {e}")
+            return False
+    
+    def flush(self):
+        """Block until every queued change is durable"""
+        pass
+    
+    def close(self):
+        """Release any resources held by the store"""
+        pass
+
+
+def create_patient_store(settings, backend=None):
+    """
+    Create the patient store selected by the 'storage_backend' setting
+    
+    Args:
+        settings: Application settings
+        backend (str, optional): 'excel', 'sqlite' or 'remote'. Defaults to
+            the 'storage_backend' setting.
+    
+    Returns:
+        PatientStore: The configured storage backend
+    """
+    if backend is None:
+        backend = settings.get('storage_backend', 'excel')
+    
+    if backend == 'remote':
+        from utils.remote_store import RemoteStore
+        return RemoteStore(settings)
+    
+    if backend == 'sqlite':
+        from utils.sqlite_handler import SQLiteHandler
+        return SQLiteHandler(settings)
+    
+    if backend != 'excel':
+        logger.warning(f"Unknown storage backend '{backend}', falling back to Excel")
+    
+    from utils.excel_handler import ExcelHandler
+    return ExcelHandler(settings)
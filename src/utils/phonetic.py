@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Phonetic matching for the Receptionist Application
+Sound-alike keys and edit distance for romanized Urdu names
+"""
+
+# Abbreviations written in place of the full name
+ALIASES = {
+    'mohd': 'muhammad',
+    'muhd': 'muhammad',
+    'mhd': 'muhammad',
+    'md': 'muhammad',
+    'sy': 'syed',
+    'syd': 'syed',
+}
+
+VOWELS = set('aeiouy')
+
+# Letter pairs that stand for one sound, mapped to a single code letter
+DIGRAPHS = {
+    'sh': 'x',
+    'ch': 'c',
+    'ph': 'f',
+    'ck': 'k',
+}
+
+# Single letters romanized in more than one way
+LETTERS = {
+    'q': 'k',
+    'w': 'v',
+    'x': 'ks',
+}
+
+def phonetic_key(word):
+    """
+    Get the sound-alike key of a lower-case word
+    
+    The key keeps a leading vowel as 'a' and the consonants after it, so
+    spellings that differ in vowels and doubled letters share a key:
+    Muhammad, Mohammad and Mohammed; Hussain and Husain; Ayesha and Aisha;
+    Siddiqui and Siddiqi; Yousaf and Yusuf. An 'h' next to a vowel that is
+    not followed by a consonant is silent in these spellings (Muhammad,
+    Fatimah), while the 'h' of Ahmed or Rehman is kept.
+    
+    Args:
+        word (str): Lower-case word
+    
+    Returns:
+        str: Phonetic key, empty for an empty word
+    """
+    word = ALIASES.get(word, word)
+    word = ''.join(char for char in word if char.isalpha())
+    if not word:
+        return ''
+    
+    codes = []
+    i = 0
+    while i < len(word):
+        char = word[i]
+        pair = word[i:i + 2]
+        following = word[i + 1] if i + 1 < len(word) else ''
+        
+        if pair in DIGRAPHS:
+            codes.append(DIGRAPHS[pair])
+            i += 2
+            continue
+        
+        if char in VOWELS and not (char == 'y' and i == 0):
+            # Only a leading vowel is kept, and all vowels sound alike there
+            if i == 0:
+                codes.append('a')
+        elif char == 'h':
+            previous = word[i - 1] if i > 0 else ''
+            if i == 0:
+                codes.append('h')
+            elif previous in VOWELS and following and following not in VOWELS:
+                # Ahmed, Rehman, Mahmood
+                codes.append('h')
+            # Otherwise silent: kh, gh, bh, th, Muhammad, Fatimah
+        else:
+            codes.append(LETTERS.get(char, char))
+        i += 1
+    
+    # Doubled letters sound like one
+    key = []
+    for code in ''.join(codes):
+        if not key or key[-1] != code:
+            key.append(code)
+    return ''.join(key)
+
+def deletes(word):
+    """
+    Get every string made by deleting one character of a word
+    
+    Two words within edit distance two that share a deletion (or where one
+    is a deletion of the other) are found by looking these up, without
+    comparing the query against every indexed word.
+    
+    Args:
+        word (str): Word
+    
+    Returns:
+        set: Strings with one character removed
+    """
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+def edit_distance(first, second, max_distance):
+    """
+    Get the edit distance between two words, giving up past a bound
+    
+    Insertions, deletions, substitutions and swaps of neighbouring letters
+    each count as one edit. Only the band of the table within max_distance
+    of the diagonal is filled in.
+    
+    Args:
+        first (str): First word
+        second (str): Second word
+        max_distance (int): Largest distance of interest
+    
+    Returns:
+        int: The distance, or max_distance + 1 if it is larger than max_distance
+    """
+    if abs(len(first) - len(second)) > max_distance:
+        return max_distance + 1
+    
+    too_far = max_distance + 1
+    previous_previous = None
+    previous = list(range(len(second) + 1))
+    
+    for i in range(1, len(first) + 1):
+        current = [too_far] * (len(second) + 1)
+        current[0] = i
+        low = max(1, i - max_distance)
+        high = min(len(second), i + max_distance)
+        
+        for j in range(low, high + 1):
+            cost = 0 if first[i - 1] == second[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous_previous is not None and j > 1
+                    and first[i - 1] == second[j - 2] and first[i - 2] == second[j - 1]):
+                value = min(value, previous_previous[j - 2] + 1)
+            current[j] = min(value, too_far)
+        
+        if min(current[low - 1:high + 1]) > max_distance:
+            return too_far
+        previous_previous, previous = previous, current
+    
+    return min(previous[len(second)], too_far)
@@ -0,0 +1,568 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Remote Store for the Receptionist Application
+Patient storage served by the data server
+"""
+
+import json
+import uuid
+import logging
+import threading
+import http.client
+
+import pandas as pd
+
+from utils.patient_store import PatientStore
+from utils.data_server import decode_value, json_default
+
+logger = logging.getLogger('receptionist.remote_store')
+
+class RemoteStoreError(Exception):
+    """The data server could not be reached or refused a call"""
+
+class RemoteStore(PatientStore):
+    """
+    Remote Store class for the Receptionist Application
+    Thin client of the data server: every call goes to the server, which
+    keeps the store, its caches and the daily rollup warm, so a desk
+    starts without reading any patient data.
+    
+    Each thread keeps its own connection open between calls. Writes carry
+    a change feed poll in the same batch, so other desks' changes arrive
+    without an extra round trip.
+    """
+    
+    # Seconds to wait for the server before a write, a backup or another
+    # slow call fails; a write is only answered once it is durable
+    TIMEOUT = 30
+    
+    # Seconds to wait before a read fails. Reads come from the UI thread,
+    # so a server that stops answering must not freeze the window for long
+    READ_TIMEOUT = 5
+    
+    def __init__(self, settings):
+        """
+        Initialize the Remote Store and say hello to the server
+        
+        Args:
+            settings: Application settings
+        
+        Raises:
+            RemoteStoreError: If the data server cannot be reached
+        """
+        self.settings = settings
+        host, _, port = settings.get('server_address', '127.0.0.1:8765').rpartition(':')
+        self.host = host or '127.0.0.1'
+        self.port = int(port)
+        self.token = settings.get('server_token', '')
+        
+        # Identifies this desk's changes in the server's feed
+        self.client_id = uuid.uuid4().hex
+        self._local = threading.local()
+        
+        # Connections of every thread, closed together by close()
+        self._connections = []
+        self._lock = threading.Lock()
+        
+        # Other desks' changes received with a write, waiting for the next poll
+        self._pending_changes = []
+        self._refresh_needed = False
+        
+        hello = self.call('hello')
+        self.storage_path = hello['storage_path']
+        self._session = hello['session']
+        self._seq = hello['seq']
+        logger.info(f"Connected to data server at {self.host}:{self.port} serving {self.storage_path}")
+    
+    def _connection(self):
+        """
+        Get this thread's connection to the server, opening it if needed
+        
+        Returns:
+            http.client.HTTPConnection: The connection
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=self.TIMEOUT)
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+    
+    def _drop_connection(self):
+        """Close this thread's connection so the next call opens a new one"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+            with self._lock:
+                if connection in self._connections:
+                    self._connections.remove(connection)
+    
+    def _post(self, body, timeout):
+        """
+        Send a request body to the server and read the reply
+        
+        A connection the server closed while idle fails on first use; the
+        request is sent once more on a new connection in that case.
+        
+        Args:
+            body (bytes): JSON request
+            timeout (float): Seconds to wait for the server
+        
+        Returns:
+            dict: Decoded reply
+        
+        Raises:
+            RemoteStoreError: If the server cannot be reached or rejects the request
+        """
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['X-Clinic-Token'] = self.token
+        
+        for attempt in range(2):
+            reused = getattr(self._local, 'connection', None) is not None
+            connection = self._connection()
+            connection.timeout = timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(timeout)
+            try:
+                connection.request('POST', '/rpc', body, headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                self._drop_connection()
+                if not reused or attempt > 0:
+                    raise RemoteStoreError(f"Cannot reach data server at {self.host}:{self.port}: {e}") from e
+        
+        reply = json.loads(data)
+        if response.status != 200:
+            raise RemoteStoreError(reply.get('error', f"HTTP {response.status}"))
+        return reply
+    
+    def call_batch(self, calls, timeout=None):
+        """
+        Run several server calls in one request
+        
+        Args:
+            calls (list): (method, params) tuples, run in order
+            timeout (float, optional): Seconds to wait for the server.
+                Defaults to READ_TIMEOUT.
+        
+        Returns:
+            list: Result of each call
+        
+        Raises:
+            RemoteStoreError: If the server cannot be reached or a call failed
+        """
+        body = json.dumps({
+            'client_id': self.client_id,
+            'calls': [{'method': method, 'params': list(params)} for method, params in calls]
+        }, default=json_default).encode('utf-8')
+        
+        results = []
+        reply = self._post(body, timeout or self.READ_TIMEOUT)
+        for (method, _), outcome in zip(calls, reply['results']):
+            if 'error' in outcome:
+                raise RemoteStoreError(f"{method}: {outcome['error']}")
+            results.append(decode_value(outcome['result']))
+        return results
+    
+    def call(self, method, *params):
+        """
+        Run one quick server call, waiting at most READ_TIMEOUT
+        
+        Args:
+            method (str): Method name
+            *params: Arguments
+        
+        Returns:
+            Result of the call
+        """
+        return self.call_batch([(method, params)])[0]
+    
+    def call_slow(self, method, *params):
+        """
+        Run one server call that may take a while, waiting at most TIMEOUT
+        
+        Args:
+            method (str): Method name
+            *params: Arguments
+        
+        Returns:
+            Result of the call
+        """
+        return self.call_batch([(method, params)], self.TIMEOUT)[0]
+    
+    def _write(self, method, *params):
+        """
+        Run a write together with a change feed poll
+        
+        Args:
+            method (str): add_patient, update_patient or delete_patient
+            *params: Arguments
+        
+        Returns:
+            Result of the write
+        """
+        result, feed = self.call_batch([
+            (method, params),
+            ('changes_since', (self._session, self._seq))
+        ], self.TIMEOUT)
+        self._take_feed(feed)
+        return result
+    
+    def _take_feed(self, feed):
+        """
+        Keep the changes of a feed poll for poll_external_changes()
+        
+        Args:
+            feed (dict): Result of changes_since
+        """
+        with self._lock:
+            if feed['changes'] is None:
+                self._refresh_needed = True
+                self._pending_changes = []
+            elif not self._refresh_needed:
+                # Two threads' polls may overlap; keep each change once
+                self._pending_changes.extend(
+                    (patient_id, old, new)
+                    for seq, patient_id, old, new in feed['changes']
+                    if seq > self._seq
+                )
+            if feed['changes'] is None or feed['seq'] > self._seq:
+                self._session = feed['session']
+                self._seq = feed['seq']
+    
+    def get_all_patients(self):
+        """
+        Get all patients
+        
+        Returns:
+            pandas.DataFrame: DataFrame containing all patients
+        """
+        try:
+            return self.call_slow('get_all_patients')
+        except Exception as e:
+            logger.error(f"Error getting all patients: {e}")
+            return pd.DataFrame(columns=self.COLUMNS)
+    
+    def get_patient_count(self):
+        """
+        Get the number of patient rows
+        
+        Returns:
+            int: Row count
+        """
+        try:
+            return self.call('get_patient_count')
+        except Exception as e:
+            logger.error(f"Error counting patients: {e}")
+            return 0
+    
+    def get_patients_slice(self, start, count):
+        """
+        Get a range of patients in the order get_all_patients() returns them
+        
+        Args:
+            start (int): Index of the first row
+            count (int): Maximum number of rows
+        
+        Returns:
+            pandas.DataFrame: The rows in that range
+        """
+        try:
+            return self.call('get_patients_slice', start, count)
+        except Exception as e:
+            logger.error(f"Error getting patients slice: {e}")
+            return pd.DataFrame(columns=self.COLUMNS)
+    
+    def get_patient_by_id(self, patient_id):
+        """
+        Get a patient by ID
+        
+        Args:
+            patient_id (str): Patient ID
+        
+        Returns:
+            dict: Patient data or None if not found
+        """
+        try:
+            return self.call('get_patient_by_id', patient_id)
+        except Exception as e:
+            logger.error(f"Error getting patient by ID: {e}")
+            return None
+    
+    def get_patients_by_name(self, name, limit=100):
+        """
+        Search for patients by name (first or last)
+        
+        Args:
+            name (str): Name to search for; blank text returns the first patients, up to limit
+            limit (int, optional): Maximum number of matches. Defaults to 100.
+        
+        Returns:
+            pandas.DataFrame: Matching patients, best match first
+        """
+        try:
+            return self.call('get_patients_by_name', name, limit)
+        except Exception as e:
+            logger.error(f"Error searching patients by name: {e}")
+            return pd.DataFrame(columns=self.COLUMNS)
+    
+    def add_patient(self, patient_data, on_complete=None):
+        """
+        Add a new patient
+        
+        Args:
+            patient_data (dict): Patient data. The patient_id and token_number
+                given out by the server are written back into this dict.
+            on_complete (callable, optional): Called with True once the server
+                reports the change durable
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            result = self._write('add_patient', patient_data)
+            if not result['success']:
+                return False
+            
+            patient_data['patient_id'] = result['patient_id']
+            patient_data['token_number'] = result['token_number']
+            self._notify_complete(on_complete, True)
+            return True
+        except Exception as e:
+            logger.error(f"Error adding patient: {e}")
+            return False
+    
+    def get_next_token_number(self, date):
+        """
+        Get the token number the next patient added on a day will get
+        
+        Args:
+            date (str): Date in format YYYY-MM-DD
+        
+        Returns:
+            str: Next token number
+        """
+        try:
+            return self.call('get_next_token_number', date)
+        except Exception as e:
+            logger.error(f"Error getting next token number: {e}")
+            return "1"
+    
+    def update_patient(self, patient_id, patient_data, on_complete=None):
+        """
+        Update an existing patient
+        
+        Args:
+            patient_id (str): Patient ID
+            patient_data (dict): Updated patient data, optionally with a 'version'
+            on_complete (callable, optional): See add_patient()
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            success = self._write('update_patient', patient_id, patient_data)
+            if success:
+                self._notify_complete(on_complete, True)
+            return success
+        except Exception as e:
+            logger.error(f"Error updating patient: {e}")
+            return False
+    
+    def delete_patient(self, patient_id, on_complete=None):
+        """
+        Delete a patient
+        
+        Args:
+            patient_id (str): Patient ID
+            on_complete (callable, optional): See add_patient()
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            success = self._write('delete_patient', patient_id)
+            if success:
+                self._notify_complete(on_complete, True)
+            return success
+        except Exception as e:
+            logger.error(f"Error deleting patient: {e}")
+            return False
+    
+    def get_appointments_for_date(self, date):
+        """
+        Get all appointments for a specific date
+        
+        Args:
+            date (str): Date in format YYYY-MM-DD
+        
+        Returns:
+            pandas.DataFrame: DataFrame containing appointments for the date
+        """
+        try:
+            return self.call('get_appointments_for_date', date)
+        except Exception as e:
+            logger.error(f"Error getting appointments for date: {e}")
+            return pd.DataFrame(columns=self.COLUMNS)
+    
+    def get_appointments_between(self, start_date, end_date):
+        """
+        Get all appointments in a date range
+        
+        Args:
+            start_date (str): First date in format YYYY-MM-DD
+            end_date (str): Last date in format YYYY-MM-DD, inclusive
+        
+        Returns:
+            pandas.DataFrame: DataFrame containing appointments in the range
+        """
+        try:
+            return self.call('get_appointments_between', start_date, end_date)
+        except Exception as e:
+            logger.error(f"Error getting appointments between dates: {e}")
+            return pd.DataFrame(columns=self.COLUMNS)
+    
+    def get_appointments_for_doctor(self, doctor_name, date=None):
+        """
+        Get all appointments for a specific doctor
+        
+        Args:
+            doctor_name (str): Doctor name
+            date (str, optional): Date in format YYYY-MM-DD. Defaults to None.
+        
+        Returns:
+            pandas.DataFrame: DataFrame containing appointments for the doctor
+        """
+        try:
+            return self.call('get_appointments_for_doctor', doctor_name, date)
+        except Exception as e:
+            logger.error(f"Error getting appointments for doctor: {e}")
+            return pd.DataFrame(columns=self.COLUMNS)
+    
+    def poll_external_changes(self):
+        """
+        Get the changes other desks made since the last poll
+        
+        Returns:
+            list: (patient_id, old, new) tuples, or None if this desk fell
+                behind the server's change feed and must refresh fully
+        """
+        try:
+            self._take_feed(self.call('changes_since', self._session, self._seq))
+        except Exception as e:
+            logger.error(f"Error checking for external changes: {e}")
+        
+        with self._lock:
+            if self._refresh_needed:
+                self._refresh_needed = False
+                return None
+            changes = self._pending_changes
+            self._pending_changes = []
+            return changes
+    
+    def create_daily_rollup(self):
+        """
+        Create the per-day totals the statistics are read from
+        
+        Returns:
+            RemoteRollup: The server's rollup
+        """
+        return RemoteRollup(self)
+    
+    def create_backup(self):
+        """
+        Create a full backup snapshot on the server
+        
+        Returns:
+            str: Path of the snapshot on the server, or None if it could not be written
+        """
+        try:
+            return self.call_slow('create_backup')
+        except Exception as e:
+            logger.error(f"Error creating backup: {e}")
+            return None
+    
+    def restore_backup(self, point_in_time, export_path):
+        """
+        Restore the patient data as it was at a point in time into a workbook
+        
+        Raises:
+            ValueError: Always; backups are kept and restored on the server
+        """
+        raise ValueError("Backups are kept on the data server; restore them there")
+    
+    def close(self):
+        """Close every connection to the server"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+
+class RemoteRollup:
+    """
+    Remote Rollup class for the Receptionist Application
+    Reads the data server's daily rollup. The server counts every change
+    as it writes it, so changes published on this desk are not applied
+    again here.
+    """
+    
+    def __init__(self, store):
+        """
+        Initialize the Remote Rollup
+        
+        Args:
+            store (RemoteStore): Connection to the data server
+        """
+        self.store = store
+    
+    def rebuild(self):
+        """
+        Leave the server's rollup as it is
+        
+        The server rebuilds its rollup itself whenever it cannot hand out
+        the changes a desk missed, so a desk that fell behind only clears
+        its own caches and refreshes its views.
+        """
+    
+    def apply_event(self, event):
+        """
+        Ignore a patient change event; the server has counted it already
+        
+        Args:
+            event (PatientEvent): Change published by the patient model
+        """
+    
+    def get_days(self, start_date, end_date):
+        """
+        Get the rollup rows of a date range
+        
+        Args:
+            start_date (str): First date in YYYY-MM-DD format
+            end_date (str): Last date in YYYY-MM-DD format, inclusive
+        
+        Returns:
+            list: (date, day) tuples in date order, only for days with visits
+        """
+        return [tuple(row) for row in self.store.call('rollup_get_days', start_date, end_date)]
+    
+    def range_totals(self, start_date, end_date):
+        """
+        Get the totals of a date range
+        
+        Args:
+            start_date (str): First date in YYYY-MM-DD format
+            end_date (str): Last date in YYYY-MM-DD format, inclusive
+        
+        Returns:
+            dict: visits, revenue, new and old totals of the range
+        """
+        return self.store.call('rollup_range_totals', start_date, end_date)
+    
+    def close(self):
+        """Nothing to save; the server keeps the rollup"""
@@ -0,0 +1,878 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite Handler for the Receptionist Application
+Handles reading and writing patient data to a SQLite database
+"""
+
+import os
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from utils.patient_store import PatientStore
+from utils.patient_journal import PatientJournal, row_version
+from utils.backup_manager import BackupManager
+from utils.name_index import NameIndex
+
+logger = logging.getLogger('receptionist.sqlite_handler')
+
+class SQLiteHandler(PatientStore):
+    """
+    SQLite Handler class for the Receptionist Application
+    Stores one row per patient visit and changes single rows in place, so
+    saving a patient no longer rewrites the whole data file
+    """
+    
+    # Columns holding numbers; everything else is stored as text
+    NUMERIC_COLUMNS = ('token_number', 'fees', 'version')
+    
+    # File systems of network shares, where SQLite's WAL mode is unsafe
+    NETWORK_FILESYSTEMS = ('nfs', 'nfs4', 'cifs', 'smb', 'smbfs', 'smb3', 'afs', 'fuse.sshfs', '9p')
+    
+    # Indexes backing the lookups used by the UI and the stats handler
+    INDEXES = {
+        'idx_patients_appointment_date': '(appointment_date, appointment_time)',
+        'idx_patients_doctor_date': '(doctor_name, appointment_date)',
+        'idx_patients_first_name': '(first_name COLLATE NOCASE)',
+        'idx_patients_last_name': '(last_name COLLATE NOCASE)'
+    }
+    
+    def __init__(self, settings):
+        """
+        Initialize the SQLite Handler
+        
+        Args:
+            settings: Application settings
+        """
+        self.settings = settings
+        self.db_path = settings.get_sqlite_path()
+        self.storage_path = self.db_path
+        
+        # The connection is shared, so serialize access to it
+        self._lock = threading.RLock()
+        self._conn = None
+        
+        # Name search index, built on the first search
+        self._name_index = None
+        
+        # Commit counter of other connections, to notice other workstations' writes
+        self._data_version = None
+        
+        # Backup deltas of committed changes, queued in commit order under
+        # self._lock and recorded once it is released
+        self._pending_deltas = []
+        self._delta_lock = threading.Lock()
+        
+        self.ensure_database()
+        
+        # Periodic snapshots plus per-change deltas
+        self.backup_manager = BackupManager(
+            settings,
+            os.path.join(os.path.dirname(self.db_path), 'backups'),
+            '.db',
+            self._write_snapshot
+        )
+        self.backup_manager.start()
+    
+    @classmethod
+    def _is_network_path(cls, path):
+        """
+        Check whether a file lives on a network share
+        
+        Args:
+            path (str): File path
+        
+        Returns:
+            bool: True for UNC paths and mapped network drives on Windows,
+                and network file systems listed in /proc/mounts elsewhere
+        """
+        path = os.path.abspath(path)
+        
+        if os.name == 'nt':
+            if path.startswith('\\\\'):
+                return True
+            import ctypes
+            drive = os.path.splitdrive(path)[0] + '\\'
+            # DRIVE_REMOTE
+            return ctypes.windll.kernel32.GetDriveTypeW(drive) == 4
+        
+        try:
+            with open('/proc/mounts', 'r') as f:
+                mounts = [line.split()[1:3] for line in f if len(line.split()) >= 3]
+        except OSError:
+            return False
+        
+        # The longest mount point holding the path is the one it is on
+        best_mount, filesystem = '', ''
+        for mount_point, kind in mounts:
+            mount_point = mount_point.replace('\\040', ' ')
+            inside = path == mount_point or path.startswith(mount_point.rstrip('/') + '/')
+            if inside and len(mount_point) > len(best_mount):
+                best_mount, filesystem = mount_point, kind
+        return filesystem in cls.NETWORK_FILESYSTEMS
+    
+    def ensure_database(self):
+        """Ensure the database exists with the patients table and its indexes"""
+        try:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            
+            # WAL keeps readers from blocking on the writer and makes commits
+            # cheap, but needs memory shared between the processes using the
+            # database, so it only works when they all run on one computer.
+            # A database shared over the network uses a rollback journal.
+            journal_mode = str(self.settings.get('sqlite_journal_mode', 'auto')).lower()
+            if journal_mode not in ('wal', 'delete'):
+                journal_mode = 'delete' if self._is_network_path(self.db_path) else 'wal'
+            
+            actual_mode = self._conn.execute(f"PRAGMA journal_mode={journal_mode}").fetchone()[0]
+            if actual_mode != journal_mode:
+                # Leaving WAL fails while another connection has the database open
+                logger.warning(f"SQLite journal mode is {actual_mode}, not {journal_mode}; close the other workstations and restart")
+            self._conn.execute('PRAGMA synchronous=NORMAL' if actual_mode == 'wal' else 'PRAGMA synchronous=FULL')
+            
+            with self._lock, self._conn:
+                column_defs = ['patient_id TEXT PRIMARY KEY']
+                for col in self.COLUMNS[1:]:
+                    col_type = 'NUMERIC' if col in self.NUMERIC_COLUMNS else 'TEXT'
+                    column_defs.append(f"{col} {col_type}")
+                
+                self._conn.execute(f"CREATE TABLE IF NOT EXISTS patients ({', '.join(column_defs)})")
+                
+                # Add any columns introduced after the database was created
+                existing_columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(patients)')}
+                missing_columns = [col for col in self.COLUMNS if col not in existing_columns]
+                for col in missing_columns:
+                    col_type = 'NUMERIC' if col in self.NUMERIC_COLUMNS else 'TEXT'
+                    self._conn.execute(f"ALTER TABLE patients ADD COLUMN {col} {col_type}")
+                if missing_columns:
+                    logger.info(f"Added missing columns to database: {missing_columns}")
+                
+                for index_name, index_columns in self.INDEXES.items():
+                    self._conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON patients {index_columns}")
+                
+                # Last token number given out per day
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS token_counters (date TEXT PRIMARY KEY, last_token INTEGER NOT NULL)"
+                )
+                
+                # Count of changes to the patients, whichever workstation made
+                # them; storing name keys is not a change
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+                )
+                self._conn.execute("INSERT OR IGNORE INTO store_meta (key, value) VALUES ('generation', 0)")
+                bump = "UPDATE store_meta SET value = value + 1 WHERE key = 'generation'"
+                data_columns = ', '.join(col for col in self.COLUMNS if col != 'name_key')
+                self._conn.execute(f"CREATE TRIGGER IF NOT EXISTS patients_added AFTER INSERT ON patients BEGIN {bump}; END")
+                self._conn.execute(f"CREATE TRIGGER IF NOT EXISTS patients_updated AFTER UPDATE OF {data_columns} ON patients BEGIN {bump}; END")
+                self._conn.execute(f"CREATE TRIGGER IF NOT EXISTS patients_deleted AFTER DELETE ON patients BEGIN {bump}; END")
+            
+            # Other workstations' commits are counted from here on
+            self._data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+            
+            logger.info(f"Opened SQLite database at {self.db_path}")
+        except Exception as e:
+            logger.error(f"Error ensuring SQLite database: {e}")
+            raise
+    
+    def _select_columns(self):
+        """
+        Get the column list used in SELECT statements
+        
+        Returns:
+            str: Comma separated column names
+        """
+        return ', '.join(self.COLUMNS)
+    
+    def _query_dataframe(self, where='', params=(), order_by='rowid', limit=None, offset=0):
+        """
+        Run a SELECT on the patients table and return the rows as a DataFrame
+        
+        Args:
+            where (str, optional): WHERE clause without the keyword. Defaults to ''.
+            params (tuple, optional): Query parameters. Defaults to ().
+            order_by (str, optional): ORDER BY clause without the keyword. Defaults to 'rowid'.
+            limit (int, optional): Maximum number of rows. Defaults to None.
+            offset (int, optional): Rows to skip when a limit is given. Defaults to 0.
+        
+        Returns:
+            pandas.DataFrame: Matching rows with blanks as empty strings
+        """
+        sql = f"SELECT {self._select_columns()} FROM patients"
+        if where:
+            sql += f" WHERE {where}"
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params = tuple(params) + (limit, offset)
+        
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        
+        df = pd.DataFrame([tuple(row) for row in rows], columns=self.COLUMNS)
+        
+        # Match the Excel handler, which hands out blanks as empty strings
+        return df.fillna('')
+    
+    def _to_db_value(self, value):
+        """
+        Convert a form value to the value stored in the database
+        
+        Args:
+            value: Value from the patient data dict
+        
+        Returns:
+            The value to bind, with blanks stored as NULL
+        """
+        if self._is_blank(value) or value == '':
+            return None
+        return value
+    
+    def get_all_patients(self):
+        """
+        Get all patients from the database
+        
+        Returns:
+            pandas.DataFrame: DataFrame containing all patients
+        """
+        try:
+            return self._query_dataframe()
+        except Exception as e:
+            logger.error(f"Error getting all patients: {e}")
+            return pd.DataFrame(columns=self.COLUMNS)
+    
+    def get_patient_by_id(self, patient_id):
+        """
+        Get a patient by ID
+        
+        Args:
+            patient_id (str): Patient ID
+        
+        Returns:
+            dict: Patient data or None if not found
+        """
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    f"SELECT {self._select_columns()} FROM patients WHERE patient_id = ?",
+                    (patient_id,)
+                ).fetchone()
+            
+            if row is None:
+                return None
+            
+            return {key: ('' if row[key] is None else row[key]) for key in self.COLUMNS}
+        except Exception as e:
+            logger.error(f"Error getting patient by ID: {e}")
+            return None
+    
+    def _get_name_index(self):
+        """
+        Get the name index, building it from the database if needed
+        
+        Returns:
+            NameIndex: Index over the patients' names
+        """
+        with self._lock:
+            if self._name_index is None:
+                self._backfill_name_keys()
+                rows = self._conn.execute(
+                    "SELECT patient_id, first_name, last_name, name_key FROM patients ORDER BY rowid"
+                ).fetchall()
+                name_index = NameIndex()
+                name_index.build(tuple(row) for row in rows)
+                self._name_index = name_index
+            return self._name_index
+    
+    def _backfill_name_keys(self):
+        """Store phonetic keys for rows saved or migrated without one"""
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT patient_id, first_name, last_name FROM patients WHERE name_key IS NULL"
+            ).fetchall()
+            if rows:
+                self._conn.executemany(
+                    "UPDATE patients SET name_key = ? WHERE patient_id = ?",
+                    [(NameIndex.name_key(row['first_name'], row['last_name']), row['patient_id']) for row in rows]
+                )
+                logger.info(f"Stored phonetic name keys for {len(rows)} patients")
+    
+    def _update_name_index(self, patient_id):
+        """
+        Refresh a patient's entry in the name index after a commit
+        
+        Args:
+            patient_id (str): Patient ID
+        """
+        with self._lock:
+            if self._name_index is None:
+                return
+            row = self._conn.execute(
+                "SELECT first_name, last_name, name_key FROM patients WHERE patient_id = ?",
+                (patient_id,)
+            ).fetchone()
+            if row is None:
+                self._name_index.remove(patient_id)
+            else:
+                self._name_index.add(patient_id, row['first_name'], row['last_name'], row['name_key'])
+    
+    def get_patients_by_name(self, name, limit=100):
+        """
+        Search for patients by name (first or last)
+        
+        Args:
+            name (str): Name to search for; blank text returns the first patients, up to limit
+            limit (int, optional): Maximum number of matches. Defaults to 100.
+        
+        Returns:
+            pandas.DataFrame: Matching patients, best match first
+        """
+        try:
+            if not NameIndex.tokenize(name):
+                # The first page only; the list pages through the rest
+                return self._query_dataframe(limit=limit)
+            
+            patient_ids = self._get_name_index().search(name, limit)
+            if not patient_ids:
+                return pd.DataFrame(columns=self.COLUMNS)
+            
+            placeholders = ', '.join('?' for _ in patient_ids)
+            df = self._query_dataframe(f"patient_id IN ({placeholders})", tuple(patient_ids), order_by='')
+            
+            # Put the rows back in ranked order
+            rank = {patient_id: position for position, patient_id in enumerate(patient_ids)}
+            order = df['patient_id'].map(rank).sort_values(kind='stable').index
+            return df.loc[order].reset_index(drop=True)
+        except Exception as e:
+            logger.error(f"Error searching patients by name: {e}")
+            return pd.DataFrame(columns=self.COLUMNS)
+    
+    def _patient_exists(self, patient_id):
+        """
+        Check whether a patient ID is already in the database
+        
+        Args:
+            patient_id (str): Patient ID
+            
+        Returns:
+            bool: True if the ID exists
+        """
+        row = self._conn.execute("SELECT 1 FROM patients WHERE patient_id = ?", (patient_id,)).fetchone()
+        return row is not None
+    
+    def _max_token_number(self, date):
+        """
+        Get the highest token number of a day's appointments
+        
+        Args:
+            date (str): Date in format YYYY-MM-DD
+        
+        Returns:
+            int: Highest token number, 0 if there is none
+        """
+        row = self._conn.execute(
+            "SELECT MAX(CAST(token_number AS INTEGER)) FROM patients "
+            "WHERE appointment_date = ? AND token_number IS NOT NULL",
+            (date,)
+        ).fetchone()
+        return int(row[0] or 0)
+    
+    def _seed_token_counter(self, date):
+        """
+        Create a day's token counter from its appointments if it is missing
+        
+        The caller holds the lock and an open transaction.
+        
+        Args:
+            date (str): Date in format YYYY-MM-DD
+        """
+        self._conn.execute(
+            "INSERT OR IGNORE INTO token_counters (date, last_token) VALUES (?, ?)",
+            (date, self._max_token_number(date))
+        )
+    
+    def _next_token_number(self, date):
+        """
+        Give out the next token number for a date
+        
+        The counter row is updated before it is read, so the transaction
+        holds the database write lock and no other connection can give out
+        the same number. The caller holds the lock and an open transaction.
+        
+        Args:
+            date (str): Date in format YYYY-MM-DD
+        
+        Returns:
+            str: Next token number
+        """
+        cursor = self._conn.execute(
+            "UPDATE token_counters SET last_token = last_token + 1 WHERE date = ?", (date,)
+        )
+        if cursor.rowcount == 0:
+            self._seed_token_counter(date)
+            self._conn.execute(
+                "UPDATE token_counters SET last_token = last_token + 1 WHERE date = ?", (date,)
+            )
+        
+        row = self._conn.execute("SELECT last_token FROM token_counters WHERE date = ?", (date,)).fetchone()
+        return str(row[0])
+    
+    def _observe_token_number(self, date, token_number):
+        """
+        Record a token number entered by hand so it is not given out again
+        
+        The caller holds the lock and an open transaction.
+        
+        Args:
+            date (str): Date in format YYYY-MM-DD
+            token_number (str): Token number as entered; ignored unless numeric
+        """
+        try:
+            token_number = int(str(token_number).strip())
+        except ValueError:
+            return
+        
+        self._seed_token_counter(date)
+        self._conn.execute(
+            "UPDATE token_counters SET last_token = MAX(last_token, ?) WHERE date = ?",
+            (token_number, date)
+        )
+    
+    def get_next_token_number(self, date):
+        """
+        Get the token number the next patient added on a day will get
+        
+        Args:
+            date (str): Date in format YYYY-MM-DD
+        
+        Returns:
+            str: Next token number
+        """
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT last_token FROM token_counters WHERE date = ?", (date,)
+                ).fetchone()
+                last = row[0] if row else self._max_token_number(date)
+            return str(last + 1)
+        except Exception as e:
+            logger.error(f"Error getting next token number: {e}")
+            return ''
+    
+    def add_patient(self, patient_data, on_complete=None):
+        """
+        Add a new patient to the database
+        
+        Args:
+            patient_data (dict): Patient data
+            on_complete (callable, optional): Called with True after the commit
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            with self._lock:
+                with self._conn:
+                    # Generate a unique patient ID if not provided
+                    if 'patient_id' not in patient_data or not patient_data['patient_id']:
+                        patient_data['patient_id'] = self._generate_patient_id(self._patient_exists)
+                    
+                    # Generate sequential token number if not provided
+                    today = datetime.now().strftime('%Y-%m-%d')
+                    if 'token_number' not in patient_data or not patient_data['token_number']:
+                        patient_data['token_number'] = self._next_token_number(today)
+                        logger.info(f"Generated token number {patient_data['token_number']} for date {today}")
+                    else:
+                        # A token typed by hand is not given out again
+                        self._observe_token_number(today, patient_data['token_number'])
+                    
+                    # Add timestamps
+                    now_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    patient_data['created_at'] = now_str
+                    patient_data['updated_at'] = now_str
+                    patient_data['version'] = 1
+                    
+                    # Ensure all required columns exist in patient_data
+                    for col in self.COLUMNS:
+                        if col not in patient_data or self._is_blank(patient_data[col]):
+                            patient_data[col] = ''
+                    
+                    # Store the phonetic key with the row for fuzzy name search
+                    patient_data['name_key'] = NameIndex.name_key(patient_data['first_name'], patient_data['last_name'])
+                    
+                    placeholders = ', '.join('?' for _ in self.COLUMNS)
+                    self._conn.execute(
+                        f"INSERT INTO patients ({self._select_columns()}) VALUES ({placeholders})",
+                        [self._to_db_value(patient_data[col]) for col in self.COLUMNS]
+                    )
+                
+                # Queued before the lock is released, so deltas keep the commit order
+                self._queue_backup_delta('add', patient_data['patient_id'], {col: patient_data[col] for col in self.COLUMNS})
+            
+            logger.info(f"Added new patient: {patient_data['patient_id']} with token number: {patient_data['token_number']}")
+            self._record_backup_deltas()
+            self._update_name_index(patient_data['patient_id'])
+            self._notify_complete(on_complete, True)
+            return True
+        except Exception as e:
+            logger.error(f"Error adding patient: {e}")
+            return False
+    
+    def update_patient(self, patient_id, patient_data, on_complete=None):
+        """
+        Update an existing patient in the database
+        
+        Args:
+            patient_id (str): Patient ID
+            patient_data (dict): Updated patient data. A 'version' key holds
+                the row version the data was read at; the update is refused if
+                another workstation has changed the patient since.
+            on_complete (callable, optional): Called with True after the commit
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            expected_version = patient_data.pop('version', None)
+            if expected_version == '' or self._is_blank(expected_version):
+                expected_version = None
+            
+            # Update timestamp
+            patient_data['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            
+            # Handle NaN values
+            for key, value in patient_data.items():
+                if self._is_blank(value):
+                    patient_data[key] = ''
+            
+            # Keep the stored phonetic key in step with the name
+            if 'first_name' in patient_data or 'last_name' in patient_data:
+                current = self.get_patient_by_id(patient_id) or {}
+                patient_data['name_key'] = NameIndex.name_key(
+                    patient_data.get('first_name', current.get('first_name', '')),
+                    patient_data.get('last_name', current.get('last_name', ''))
+                )
+            
+            # Only known columns are written; the patient ID itself never changes here
+            columns = [col for col in patient_data if col in self.COLUMNS and col != 'patient_id']
+            assignments = ''.join(f"{col} = ?, " for col in columns)
+            params = [self._to_db_value(patient_data[col]) for col in columns] + [patient_id]
+            
+            # The version check and the write are one statement, so no other
+            # connection can change the row in between
+            where = "patient_id = ?"
+            if expected_version is not None:
+                where += " AND COALESCE(version, 0) = ?"
+                params.append(row_version(expected_version))
+            
+            with self._lock:
+                with self._conn:
+                    cursor = self._conn.execute(
+                        f"UPDATE patients SET {assignments}version = COALESCE(version, 0) + 1 WHERE {where}",
+                        params
+                    )
+                    exists = cursor.rowcount > 0 or self._patient_exists(patient_id)
+                if cursor.rowcount > 0:
+                    self._queue_backup_delta('update', patient_id, {col: patient_data[col] for col in columns})
+            
+            if cursor.rowcount == 0:
+                if exists:
+                    logger.warning(f"Patient {patient_id} is no longer at version {expected_version}; update refused")
+                else:
+                    logger.warning(f"Patient not found: {patient_id}")
+                return False
+            
+            logger.info(f"Updated patient: {patient_id}")
+            self._record_backup_deltas()
+            if 'first_name' in columns or 'last_name' in columns:
+                self._update_name_index(patient_id)
+            self._notify_complete(on_complete, True)
+            return True
+        except Exception as e:
+            logger.error(f"Error updating patient: {e}")
+            return False
+    
+    def delete_patient(self, patient_id, on_complete=None):
+        """
+        Delete a patient from the database
+        
+        Args:
+            patient_id (str): Patient ID
+            on_complete (callable, optional): Called with True after the commit
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            with self._lock:
+                with self._conn:
+                    cursor = self._conn.execute("DELETE FROM patients WHERE patient_id = ?", (patient_id,))
+                if cursor.rowcount > 0:
+                    self._queue_backup_delta('delete', patient_id)
+            
+            if cursor.rowcount == 0:
+                logger.warning(f"Patient not found: {patient_id}")
+                return False
+            
+            logger.info(f"Deleted patient: {patient_id}")
+            self._record_backup_deltas()
+            self._update_name_index(patient_id)
+            self._notify_complete(on_complete, True)
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting patient: {e}")
+            return False
+    
+    def get_appointments_for_date(self, date):
+        """
+        Get all appointments for a specific date
+        
+        Args:
+            date (str): Date in format YYYY-MM-DD
+        
+        Returns:
+            pandas.DataFrame: DataFrame containing appointments for the date
+        """
+        try:
+            return self._query_dataframe(
+                "appointment_date = ?",
+                (date,),
+                order_by='appointment_time'
+            )
+        except Exception as e:
+            logger.error(f"Error getting appointments for date: {e}")
+            return pd.DataFrame(columns=self.COLUMNS)
+    
+    def get_appointments_between(self, start_date, end_date):
+        """
+        Get all appointments in a date range
+        
+        Args:
+            start_date (str): First date in format YYYY-MM-DD
+            end_date (str): Last date in format YYYY-MM-DD, inclusive
+        
+        Returns:
+            pandas.DataFrame: DataFrame containing appointments in the range
+        """
+        try:
+            return self._query_dataframe(
+                "appointment_date BETWEEN ? AND ?",
+                (start_date, end_date)
+            )
+        except Exception as e:
+            logger.error(f"Error getting appointments between dates: {e}")
+            return pd.DataFrame(columns=self.COLUMNS)
+    
+    def get_appointments_for_doctor(self, doctor_name, date=None):
+        """
+        Get all appointments for a specific doctor
+        
+        Args:
+            doctor_name (str): Doctor name
+            date (str, optional): Date in format YYYY-MM-DD. Defaults to None.
+        
+        Returns:
+            pandas.DataFrame: DataFrame containing appointments for the doctor
+        """
+        try:
+            if date:
+                return self._query_dataframe(
+                    "doctor_name = ? AND appointment_date = ?",
+                    (doctor_name, date),
+                    order_by='appointment_date, appointment_time'
+                )
+            
+            return self._query_dataframe(
+                "doctor_name = ?",
+                (doctor_name,),
+                order_by='appointment_date, appointment_time'
+            )
+        except Exception as e:
+            logger.error(f"Error getting appointments for doctor: {e}")
+            return pd.DataFrame(columns=self.COLUMNS)
+    
+    def import_records(self, records):
+        """
+        Insert a batch of already normalized records in one transaction
+        
+        Records whose patient_id already exists are skipped, so importing
+        overlapping sources keeps the first copy of each patient.
+        
+        Args:
+            records (list): Tuples of values in COLUMNS order
+            
+        Returns:
+            int: Number of rows actually inserted
+        """
+        placeholders = ', '.join('?' for _ in self.COLUMNS)
+        
+        with self._lock, self._conn:
+            changes_before = self._conn.total_changes
+            self._conn.executemany(
+                f"INSERT OR IGNORE INTO patients ({self._select_columns()}) VALUES ({placeholders})",
+                records
+            )
+            # Rebuilt on the next search
+            self._name_index = None
+            return self._conn.total_changes - changes_before
+    
+    def iter_records(self, batch_size=1000):
+        """
+        Stream all rows from the database without loading them at once
+        
+        Args:
+            batch_size (int, optional): Rows fetched per round trip. Defaults to 1000.
+            
+        Yields:
+            tuple: Row values in COLUMNS order, with NULL as None
+        """
+        with self._lock:
+            cursor = self._conn.execute(f"SELECT {self._select_columns()} FROM patients ORDER BY rowid")
+        
+        while True:
+            # Only hold the lock per batch, never across a yield
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield tuple(row)
+    
+    def get_patient_count(self):
+        """
+        Get the number of patient rows in the database
+        
+        Returns:
+            int: Row count
+        """
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0]
+    
+    def get_patients_slice(self, start, count):
+        """
+        Get a range of patients in insertion order
+        
+        Args:
+            start (int): Index of the first row
+            count (int): Maximum number of rows
+        
+        Returns:
+            pandas.DataFrame: The rows in that range
+        """
+        try:
+            return self._query_dataframe(limit=count, offset=start)
+        except Exception as e:
+            logger.error(f"Error getting patients {start}-{start + count}: {e}")
+            return pd.DataFrame(columns=self.COLUMNS)
+    
+    def clear_all_patients(self):
+        """Delete every patient row, used before re-running a migration"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM patients")
+            self._name_index = None
+        logger.warning(f"Cleared all patients from {self.db_path}")
+    
+    def _queue_backup_delta(self, op, patient_id, data=None):
+        """
+        Queue the backup delta of a change just committed
+        
+        The caller holds the lock, so deltas queue in the order their
+        changes were committed.
+        
+        Args:
+            op (str): 'add', 'update' or 'delete'
+            patient_id (str): Patient ID
+            data (dict, optional): Row data for the change
+        """
+        self._pending_deltas.append(PatientJournal.make_entry(op, patient_id, data))
+    
+    def _record_backup_deltas(self):
+        """
+        Record the queued backup deltas, oldest first
+        
+        A snapshot holds the backup manager's lock while it takes self._lock,
+        so deltas are recorded after self._lock is released; taking the
+        queue and recording it under one lock keeps their order.
+        """
+        with self._delta_lock:
+            with self._lock:
+                entries, self._pending_deltas = self._pending_deltas, []
+            if entries:
+                self.backup_manager.record_changes(entries)
+    
+    def get_change_marker(self):
+        """
+        Get the number of changes committed to the patients
+        
+        Returns:
+            int: Number of changes, or None if it could not be read
+        """
+        try:
+            with self._lock:
+                return self._conn.execute("SELECT value FROM store_meta WHERE key = 'generation'").fetchone()[0]
+        except Exception as e:
+            logger.error(f"Error reading change marker: {e}")
+            return None
+    
+    def poll_external_changes(self):
+        """
+        Check whether another workstation committed since the last poll
+        
+        SQLite raises its data version whenever another connection commits,
+        which costs one pragma to read, but it does not say which rows
+        changed.
+        
+        Returns:
+            list: Empty if nothing changed; None if another workstation
+                wrote and anything may have changed
+        """
+        try:
+            with self._lock:
+                data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+                changed = self._data_version is not None and data_version != self._data_version
+                self._data_version = data_version
+                
+                if changed:
+                    # The name index may be missing other workstations' patients
+                    self._name_index = None
+            return None if changed else []
+        except Exception as e:
+            logger.error(f"Error checking for external changes: {e}")
+            return []
+    
+    def create_backup(self):
+        """
+        Create a full backup snapshot of the database
+        
+        Returns:
+            str: Path of the snapshot, or None if it could not be written
+        """
+        return self.backup_manager.create_snapshot()
+    
+    def _write_snapshot(self, path):
+        """
+        Write a consistent copy of the database to a snapshot file
+        
+        Args:
+            path (str): Path of the snapshot to write
+        """
+        # The backup API copies a consistent snapshot even with WAL enabled
+        backup_conn = sqlite3.connect(path)
+        try:
+            with self._lock:
+                self._conn.backup(backup_conn)
+        finally:
+            backup_conn.close()
+    
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -5,7 +5,9 @@ Stats Handler for the Receptionist Application
 Handles statistics calculations for patients and revenue
 """
 
+import calendar
 import logging
+import threading
 import pandas as pd
 from datetime import datetime, timedelta
 
@@ -17,50 +19,309 @@ class StatsHandler:
     Handles statistics calculations for patients and revenue
     """
     
-    def __init__(self, excel_handler):
+    # Groupings the daily rollup can answer without reading visits
+    ROLLUP_GROUPS = (None, 'appointment_date', 'doctor_name')
+    
+    # Dimensions of the breakdown, in index order
+    BREAKDOWN_DIMENSIONS = ['doctor_name', 'appointment_date', 'hour', 'status']
+    
+    def __init__(self, store, rollup=None):
         """
         Initialize the Stats Handler
         
         Args:
-            excel_handler: ExcelHandler instance
+            store: PatientStore instance (Excel or SQLite backend)
+            rollup (DailyRollup, optional): Per-day totals used instead of
+                reading visits where possible. Defaults to None.
         """
-        self.excel_handler = excel_handler
+        self.store = store
+        self.rollup = rollup
+        
+        # (start_date, end_date) -> breakdown DataFrame, dropped when a
+        # change touches the range
+        self._breakdown_cache = {}
+        self._breakdown_lock = threading.Lock()
     
-    def get_daily_stats(self, date=None):
+    def _load_range(self, start_date, end_date):
         """
-        Get daily statistics for patient visits and revenue
+        Load the visits in a date range with numeric fees
         
         Args:
-            date (str, optional): Date in YYYY-MM-DD format. Defaults to today.
+            start_date (str): First date in YYYY-MM-DD format
+            end_date (str): Last date in YYYY-MM-DD format, inclusive
             
         Returns:
-            dict: Dictionary with visit_count and revenue
+            pandas.DataFrame: Visits in the range; blank or invalid fees count as 0
         """
-        if date is None:
-            date = datetime.now().strftime('%Y-%m-%d')
+        df = self.store.get_appointments_between(start_date, end_date)
+        df['fees'] = pd.to_numeric(df['fees'], errors='coerce').fillna(0)
+        return df
+    
+    def get_range_stats(self, start_date, end_date, group_by=None):
+        """
+        Get visit and revenue statistics for a date range
+        
+        With a daily rollup, totals come from its Fenwick tree in O(log D)
+        steps and per-date or per-doctor splits are summed from its rows.
+        Otherwise, and for other groupings, the range is loaded once and
+        summed in a single pass.
+        
+        Args:
+            start_date (str): First date in YYYY-MM-DD format
+            end_date (str): Last date in YYYY-MM-DD format, inclusive
+            group_by (str, optional): Column to split the totals by, such as
+                'appointment_date' or 'doctor_name'. Defaults to None.
             
+        Returns:
+            dict: Dictionary with start_date, end_date, visit_count, revenue,
+                new_count and old_count, plus 'groups' when group_by is given:
+                a DataFrame indexed by the group value with visit_count and
+                revenue columns
+        """
+        stats = {
+            'start_date': start_date,
+            'end_date': end_date,
+            'visit_count': 0,
+            'revenue': 0,
+            'new_count': 0,
+            'old_count': 0
+        }
+        
         try:
-            # Get appointments for the date
-            df = self.excel_handler.get_appointments_for_date(date)
+            if self.rollup is not None and group_by is None:
+                totals = self.rollup.range_totals(start_date, end_date)
+                stats['visit_count'] = int(totals['visits'])
+                stats['revenue'] = float(totals['revenue'])
+                stats['new_count'] = int(totals['new'])
+                stats['old_count'] = int(totals['old'])
+                return stats
             
-            # Count visits
-            visit_count = len(df)
+            if self.rollup is not None and group_by in self.ROLLUP_GROUPS:
+                return self._rollup_range_stats(stats, group_by)
             
-            # Calculate revenue
-            revenue = df['fees'].sum() if not df.empty else 0
+            df = self._load_range(start_date, end_date)
             
-            return {
-                'date': date,
-                'visit_count': visit_count,
-                'revenue': revenue
-            }
+            stats['visit_count'] = len(df)
+            stats['revenue'] = float(df['fees'].sum())
+            status = df['status'].astype(str).str.strip().str.lower()
+            stats['new_count'] = int((status == 'new').sum())
+            stats['old_count'] = int((status == 'old').sum())
+            
+            if group_by:
+                stats['groups'] = df.groupby(group_by, sort=True)['fees'].agg(
+                    visit_count='size', revenue='sum'
+                )
         except Exception as e:
-            logger.error(f"Error getting daily stats: {e}")
-            return {
-                'date': date,
-                'visit_count': 0,
-                'revenue': 0
-            }
+            logger.error(f"Error getting range stats: {e}")
+            if group_by:
+                stats['groups'] = pd.DataFrame(columns=['visit_count', 'revenue'])
+        
+        return stats
+    
+    def _rollup_range_stats(self, stats, group_by):
+        """
+        Sum the daily rollup rows of a date range
+        
+        Args:
+            stats (dict): Statistics to fill in, with start_date and end_date set
+            group_by (str): None, 'appointment_date' or 'doctor_name'
+            
+        Returns:
+            dict: The filled-in statistics
+        """
+        days = self.rollup.get_days(stats['start_date'], stats['end_date'])
+        groups = {}
+        
+        for date, day in days:
+            stats['visit_count'] += day['visits']
+            stats['revenue'] += day['revenue']
+            stats['new_count'] += day['new']
+            stats['old_count'] += day['old']
+            
+            if group_by == 'appointment_date':
+                groups[date] = (day['visits'], day['revenue'])
+            elif group_by == 'doctor_name':
+                for doctor, (visits, revenue) in day['doctors'].items():
+                    total = groups.get(doctor, (0, 0))
+                    groups[doctor] = (total[0] + visits, total[1] + revenue)
+        
+        stats['revenue'] = float(stats['revenue'])
+        
+        if group_by:
+            stats['groups'] = pd.DataFrame(
+                [(key, visits, revenue) for key, (visits, revenue) in sorted(groups.items())],
+                columns=[group_by, 'visit_count', 'revenue']
+            ).set_index(group_by)
+        
+        return stats
+    
+    @staticmethod
+    def _arrival_hours(times):
+        """
+        Get the hour of day of arrival times
+        
+        Arrival times are written like '9 AM:35' by the patient form, or
+        as 24-hour 'HH:MM' in older data.
+        
+        Args:
+            times (pandas.Series): Arrival times as stored
+            
+        Returns:
+            pandas.Series: Hour from 0 to 23, or -1 where it is unknown
+        """
+        times = times.astype(str).str.strip().str.upper()
+        hours = pd.to_numeric(times.str.extract(r'^(\d{1,2})', expand=False), errors='coerce')
+        pm = times.str.contains('PM', regex=False)
+        am = times.str.contains('AM', regex=False)
+        
+        hours = hours.where(~(am | pm), hours % 12 + pm * 12)
+        hours = hours.where((hours >= 0) & (hours <= 23))
+        return hours.fillna(-1).astype(int)
+    
+    def get_breakdown(self, start_date, end_date):
+        """
+        Get visits and revenue by doctor, day, hour of arrival and status
+        
+        The range is loaded once and aggregated in a single groupby. The
+        result is cached until a patient change touches the range.
+        
+        Args:
+            start_date (str): First date in YYYY-MM-DD format
+            end_date (str): Last date in YYYY-MM-DD format, inclusive
+            
+        Returns:
+            pandas.DataFrame: visit_count and revenue columns, indexed by
+                doctor_name, appointment_date, hour (-1 if unknown) and
+                status ('New', 'Old' or '')
+        """
+        key = (start_date, end_date)
+        with self._breakdown_lock:
+            cached = self._breakdown_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        try:
+            df = self._load_range(start_date, end_date)
+            
+            status = df['status'].astype(str).str.strip().str.capitalize()
+            grouped = pd.DataFrame({
+                'doctor_name': df['doctor_name'].astype(str),
+                'appointment_date': df['appointment_date'].astype(str),
+                'hour': self._arrival_hours(df['arrival_time']),
+                'status': status.where(status.isin(['New', 'Old']), ''),
+                'fees': df['fees']
+            }).groupby(self.BREAKDOWN_DIMENSIONS, sort=True)['fees'].agg(
+                visit_count='size', revenue='sum'
+            )
+        except Exception as e:
+            logger.error(f"Error getting breakdown stats: {e}")
+            return pd.DataFrame(
+                columns=['visit_count', 'revenue'],
+                index=pd.MultiIndex.from_tuples([], names=self.BREAKDOWN_DIMENSIONS)
+            )
+        
+        with self._breakdown_lock:
+            self._breakdown_cache[key] = grouped
+        return grouped
+    
+    def get_breakdown_summary(self, start_date, end_date, by):
+        """
+        Sum the breakdown over every dimension but some
+        
+        Args:
+            start_date (str): First date in YYYY-MM-DD format
+            end_date (str): Last date in YYYY-MM-DD format, inclusive
+            by (list): Dimensions to keep, such as ['doctor_name'] or ['hour']
+            
+        Returns:
+            pandas.DataFrame: visit_count, new_count, old_count and revenue
+                columns, indexed by the kept dimensions
+        """
+        breakdown = self.get_breakdown(start_date, end_date)
+        
+        if breakdown.empty:
+            return pd.DataFrame(columns=['visit_count', 'new_count', 'old_count', 'revenue'])
+        
+        statuses = breakdown['visit_count'].unstack('status', fill_value=0)
+        summary = breakdown.groupby(level=by)[['visit_count', 'revenue']].sum()
+        for status, column in (('New', 'new_count'), ('Old', 'old_count')):
+            if status in statuses.columns:
+                summary[column] = statuses[status].groupby(level=by).sum()
+            else:
+                summary[column] = 0
+        
+        return summary[['visit_count', 'new_count', 'old_count', 'revenue']]
+    
+    def on_patient_changed(self, event):
+        """
+        Drop the cached breakdowns a patient change affects
+        
+        Args:
+            event (PatientEvent): Change published by the patient model
+        """
+        dates = event.dates()
+        with self._breakdown_lock:
+            for key in list(self._breakdown_cache):
+                if any(key[0] <= date <= key[1] for date in dates):
+                    del self._breakdown_cache[key]
+    
+    def clear_cache(self):
+        """Drop every cached breakdown"""
+        with self._breakdown_lock:
+            self._breakdown_cache.clear()
+    
+    def get_year_over_year(self, start_date, end_date):
+        """
+        Compare a date range with the same dates one year earlier
+        
+        Args:
+            start_date (str): First date in YYYY-MM-DD format
+            end_date (str): Last date in YYYY-MM-DD format, inclusive
+            
+        Returns:
+            dict: Dictionary with 'current' and 'previous' range stats, and
+                visit_change and revenue_change as percentages, None when
+                the previous year had none
+        """
+        def year_earlier(date_str):
+            date = datetime.strptime(date_str, '%Y-%m-%d')
+            # 29 February becomes 28 February
+            day = min(date.day, calendar.monthrange(date.year - 1, date.month)[1])
+            return date.replace(year=date.year - 1, day=day).strftime('%Y-%m-%d')
+        
+        current = self.get_range_stats(start_date, end_date)
+        previous = self.get_range_stats(year_earlier(start_date), year_earlier(end_date))
+        
+        def change(now, before):
+            return (now - before) / before * 100 if before else None
+        
+        return {
+            'current': current,
+            'previous': previous,
+            'visit_change': change(current['visit_count'], previous['visit_count']),
+            'revenue_change': change(current['revenue'], previous['revenue'])
+        }
+    
+    def get_daily_stats(self, date=None):
+        """
+        Get daily statistics for patient visits and revenue
+        
+        Args:
+            date (str, optional): Date in YYYY-MM-DD format. Defaults to today.
+            
+        Returns:
+            dict: Dictionary with visit_count and revenue
+        """
+        if date is None:
+            date = datetime.now().strftime('%Y-%m-%d')
+        
+        stats = self.get_range_stats(date, date)
+        
+        return {
+            'date': date,
+            'visit_count': stats['visit_count'],
+            'revenue': stats['revenue']
+        }
     
     def get_weekly_stats(self, end_date=None):
         """
@@ -80,36 +341,7 @@ class StatsHandler:
         # Calculate start date (7 days before end date)
         start_date = end_date - timedelta(days=6)
         
-        try:
-            # Initialize counters
-            visit_count = 0
-            revenue = 0
-            
-            # Get stats for each day in the week
-            current_date = start_date
-            while current_date <= end_date:
-                date_str = current_date.strftime('%Y-%m-%d')
-                daily_stats = self.get_daily_stats(date_str)
-                
-                visit_count += daily_stats['visit_count']
-                revenue += daily_stats['revenue']
-                
-                current_date += timedelta(days=1)
-            
-            return {
-                'start_date': start_date.strftime('%Y-%m-%d'),
-                'end_date': end_date.strftime('%Y-%m-%d'),
-                'visit_count': visit_count,
-                'revenue': revenue
-            }
-        except Exception as e:
-            logger.error(f"Error getting weekly stats: {e}")
-            return {
-                'start_date': start_date.strftime('%Y-%m-%d'),
-                'end_date': end_date.strftime('%Y-%m-%d'),
-                'visit_count': 0,
-                'revenue': 0
-            }
+        return self.get_range_stats(start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
     
     def get_monthly_stats(self, year=None, month=None):
         """
@@ -126,35 +358,13 @@ class StatsHandler:
             now = datetime.now()
             year = now.year
             month = now.month
-            
-        try:
-            # Get all patients
-            df = self.excel_handler.get_all_patients()
-            
-            # Filter by month and year
-            df['appointment_date'] = pd.to_datetime(df['appointment_date'])
-            monthly_df = df[
-                (df['appointment_date'].dt.year == year) & 
-                (df['appointment_date'].dt.month == month)
-            ]
-            
-            # Count visits
-            visit_count = len(monthly_df)
-            
-            # Calculate revenue
-            revenue = monthly_df['fees'].sum() if not monthly_df.empty else 0
-            
-            return {
-                'year': year,
-                'month': month,
-                'visit_count': visit_count,
-                'revenue': revenue
-            }
-        except Exception as e:
-            logger.error(f"Error getting monthly stats: {e}")
-            return {
-                'year': year,
-                'month': month,
-                'visit_count': 0,
-                'revenue': 0
-            } 
\ No newline at end of file
+        
+        days_in_month = calendar.monthrange(year, month)[1]
+        stats = self.get_range_stats(f"{year:04d}-{month:02d}-01", f"{year:04d}-{month:02d}-{days_in_month:02d}")
+        
+        return {
+            'year': year,
+            'month': month,
+            'visit_count': stats['visit_count'],
+            'revenue': stats['revenue']
+        }
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stats Provider for the Receptionist Application
+Cached statistics of the current day, week and month
+"""
+
+import time
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger('receptionist.stats_provider')
+
+class StatsProvider:
+    """
+    Stats Provider class for the Receptionist Application
+    Serves today's, this week's and this month's figures to the stats bar,
+    the stats counter and the statistics window from one cache. The cache
+    is dropped when a patient change touches the current week or month,
+    when the day changes, and after a time limit as a safety net. Other
+    periods are passed through to the stats handler.
+    """
+    
+    # Seconds cached figures are used without a patient change
+    DEFAULT_TTL = 300
+    
+    def __init__(self, stats_handler, ttl=DEFAULT_TTL):
+        """
+        Initialize the Stats Provider
+        
+        Args:
+            stats_handler (StatsHandler): Computes the figures
+            ttl (float, optional): Seconds the cache is kept. Defaults to DEFAULT_TTL.
+        """
+        self.stats_handler = stats_handler
+        self.ttl = ttl
+        
+        # {'daily', 'weekly', 'monthly'} stats for _today, or None when stale
+        self._current = None
+        self._today = None
+        self._computed_at = 0
+        # Held while computing so concurrent readers share one computation
+        self._lock = threading.Lock()
+    
+    def get_current_stats(self):
+        """
+        Get the statistics of the current day, week and month
+        
+        Returns:
+            dict: 'daily', 'weekly' and 'monthly' stats, as returned by the
+                stats handler's get_daily_stats, get_weekly_stats and
+                get_monthly_stats
+        """
+        now = datetime.now()
+        today = now.strftime('%Y-%m-%d')
+        
+        with self._lock:
+            if (self._current is None or self._today != today
+                    or time.monotonic() - self._computed_at > self.ttl):
+                self._current = {
+                    'daily': self.stats_handler.get_daily_stats(today),
+                    'weekly': self.stats_handler.get_weekly_stats(today),
+                    'monthly': self.stats_handler.get_monthly_stats(now.year, now.month)
+                }
+                self._today = today
+                self._computed_at = time.monotonic()
+                logger.debug(f"Computed current stats for {today}")
+            
+            # Copies, so callers cannot change the cached figures
+            return {period: dict(stats) for period, stats in self._current.items()}
+    
+    def get_daily_stats(self, date=None):
+        """
+        Get daily statistics, cached for today
+        
+        Args:
+            date (str, optional): Date in YYYY-MM-DD format. Defaults to today.
+        
+        Returns:
+            dict: Dictionary with date, visit_count and revenue
+        """
+        if date is None or date == datetime.now().strftime('%Y-%m-%d'):
+            return self.get_current_stats()['daily']
+        return self.stats_handler.get_daily_stats(date)
+    
+    def get_weekly_stats(self, end_date=None):
+        """
+        Get weekly statistics, cached for the week ending today
+        
+        Args:
+            end_date (str, optional): End date in YYYY-MM-DD format. Defaults to today.
+        
+        Returns:
+            dict: Dictionary with start_date, end_date, visit_count and revenue
+        """
+        if end_date is None or end_date == datetime.now().strftime('%Y-%m-%d'):
+            return self.get_current_stats()['weekly']
+        return self.stats_handler.get_weekly_stats(end_date)
+    
+    def get_monthly_stats(self, year=None, month=None):
+        """
+        Get monthly statistics, cached for the current month
+        
+        Args:
+            year (int, optional): Year. Defaults to current year.
+            month (int, optional): Month (1-12). Defaults to current month.
+        
+        Returns:
+            dict: Dictionary with year, month, visit_count and revenue
+        """
+        now = datetime.now()
+        if year is None or month is None or (year, month) == (now.year, now.month):
+            return self.get_current_stats()['monthly']
+        return self.stats_handler.get_monthly_stats(year, month)
+    
+    def on_patient_changed(self, event):
+        """
+        Drop the cache if a patient change touches the current week or month
+        
+        Args:
+            event (PatientEvent): Change published by the patient model
+        """
+        with self._lock:
+            if self._current is None:
+                return
+            
+            weekly = self._current['weekly']
+            monthly = self._current['monthly']
+            first = min(weekly['start_date'], f"{monthly['year']:04d}-{monthly['month']:02d}-01")
+            last = max(weekly['end_date'], f"{monthly['year']:04d}-{monthly['month']:02d}-31")
+            
+            if any(first <= str(date)[:10] <= last for date in event.dates()):
+                self._current = None
+    
+    def invalidate(self):
+        """Drop the cached figures so the next read recomputes them"""
+        with self._lock:
+            self._current = None
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Token Counter for the Receptionist Application
+Per-day token numbers handed out atomically
+"""
+
+import os
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from utils.file_lock import FileLock
+
+logger = logging.getLogger('receptionist.token_counter')
+
+class TokenCounter:
+    """
+    Token Counter class for the Receptionist Application
+    Keeps the last token number given out on each day in a small JSON file.
+    Allocating a token reads and rewrites that file under a file lock, so
+    two saves, even from two processes, never get the same number, and the
+    cost does not grow with the number of patients.
+    
+    A day missing from the file, because it is new or the file was lost,
+    is seeded from the highest token number already in the data.
+    """
+    
+    # Days kept in the file; older days are never allocated again
+    KEEP_DAYS = 7
+    
+    def __init__(self, counter_path, max_token_number):
+        """
+        Initialize the Token Counter
+        
+        Args:
+            counter_path (str): Path of the JSON file holding the counters
+            max_token_number (callable): Called with a date; returns the
+                highest numeric token number stored for it, 0 if none
+        """
+        self.counter_path = counter_path
+        self.max_token_number = max_token_number
+        self._file_lock = FileLock(counter_path + '.lock')
+        self._lock = threading.Lock()
+    
+    def _read(self):
+        """
+        Read the counters
+        
+        Returns:
+            dict: date -> last token number; empty if the file is missing or unreadable
+        """
+        if not os.path.exists(self.counter_path):
+            return {}
+        
+        try:
+            with open(self.counter_path, 'r', encoding='utf-8') as f:
+                return {date: int(last) for date, last in json.load(f).items()}
+        except Exception as e:
+            logger.error(f"Error reading token counters, reseeding from data: {e}")
+            return {}
+    
+    def _write(self, counters):
+        """
+        Write the counters atomically, dropping days past KEEP_DAYS
+        
+        Args:
+            counters (dict): date -> last token number
+        """
+        oldest = (datetime.now() - timedelta(days=self.KEEP_DAYS)).strftime('%Y-%m-%d')
+        counters = {date: last for date, last in counters.items() if date >= oldest}
+        
+        temp_path = self.counter_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(counters, f)
+        os.replace(temp_path, self.counter_path)
+    
+    def _last(self, counters, date):
+        """
+        Get the last token number of a day, seeding it from the data if needed
+        
+        Args:
+            counters (dict): date -> last token number
+            date (str): Date in format YYYY-MM-DD
+        
+        Returns:
+            int: Last token number given out on the day
+        """
+        if date not in counters:
+            counters[date] = int(self.max_token_number(date))
+            logger.info(f"Seeded token counter for {date} at {counters[date]}")
+        return counters[date]
+    
+    def peek(self, date):
+        """
+        Get the token number the next allocation will most likely return
+        
+        Args:
+            date (str): Date in format YYYY-MM-DD
+        
+        Returns:
+            int: Next token number
+        """
+        with self._lock, self._file_lock:
+            return self._last(self._read(), date) + 1
+    
+    def allocate(self, date):
+        """
+        Give out the next token number of a day
+        
+        Args:
+            date (str): Date in format YYYY-MM-DD
+        
+        Returns:
+            int: Token number, never given out before for the day
+        """
+        with self._lock, self._file_lock:
+            counters = self._read()
+            counters[date] = self._last(counters, date) + 1
+            self._write(counters)
+            return counters[date]
+    
+    def observe(self, date, token_number):
+        """
+        Record a token number entered by hand so it is not given out again
+        
+        Args:
+            date (str): Date in format YYYY-MM-DD
+            token_number (str): Token number as entered; ignored unless numeric
+        """
+        try:
+            token_number = int(str(token_number).strip())
+        except ValueError:
+            return
+        
+        with self._lock, self._file_lock:
+            counters = self._read()
+            if token_number > self._last(counters, date):
+                counters[date] = token_number
+                self._write(counters)
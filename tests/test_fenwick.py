@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for the Fenwick Tree
+"""
+
+import random
+
+from utils.fenwick import FenwickTree
+
+def test_range_sums_match_a_plain_list():
+    rng = random.Random(7)
+    size = 37
+    slots = [[0, 0] for _ in range(size)]
+    tree = FenwickTree(size, width=2)
+    
+    for _ in range(200):
+        index = rng.randrange(size)
+        deltas = [rng.randint(-3, 5), rng.randint(0, 1000)]
+        tree.add(index, deltas)
+        slots[index] = [slots[index][k] + deltas[k] for k in range(2)]
+    
+    for first in range(size):
+        for last in range(first, size):
+            expected = [sum(slot[k] for slot in slots[first:last + 1]) for k in range(2)]
+            assert tree.range_sum(first, last) == expected
+
+def test_initial_values_build_the_same_tree():
+    values = {0: [1], 4: [2], 9: [5]}
+    built = FenwickTree(10, values=values)
+    added = FenwickTree(10)
+    for index, vector in values.items():
+        added.add(index, vector)
+    
+    assert [built.prefix_sum(i) for i in range(10)] == [added.prefix_sum(i) for i in range(10)]
+    assert built.range_sum(1, 4) == [2]
+
+def test_empty_and_clamped_ranges():
+    tree = FenwickTree(5, values={2: [3]})
+    assert tree.range_sum(3, 2) == [0]
+    assert tree.prefix_sum(-1) == [0]
+    assert tree.prefix_sum(99) == [3]
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for the Name Index
+"""
+
+from utils.name_index import NameIndex
+
+def make_index():
+    """Index a few patients, oldest first"""
+    index = NameIndex()
+    index.build([
+        ('P1', 'Muhammad', 'Ali', None),
+        ('P2', 'Ayesha', 'Khan', None),
+        ('P3', 'Mohammad', 'Hussain', None),
+        ('P4', 'Ali', 'Raza', None),
+        ('P5', 'Alina', 'Siddiqui', None),
+    ])
+    return index
+
+def test_exact_match_ranks_before_prefix():
+    index = make_index()
+    assert index.search('ali') == ['P4', 'P1', 'P5']
+
+def test_newer_patients_first_within_a_match():
+    index = make_index()
+    assert index.search('ali', limit=2) == ['P4', 'P1']
+
+def test_phonetic_spellings_match():
+    index = make_index()
+    assert set(index.search('mohammed')) == {'P1', 'P3'}
+    assert index.search('aisha') == ['P2']
+    assert index.search('mohd') == ['P3', 'P1']
+
+def test_infix_and_typo_matches():
+    index = make_index()
+    assert index.search('ssai') == ['P3']
+    assert index.search('siddiqi') == ['P5']
+    assert index.search('khna') == ['P2']
+
+def test_every_word_must_match():
+    index = make_index()
+    assert index.search('muhammad ali') == ['P1']
+    assert index.search('ali khan') == []
+
+def test_input_is_not_a_pattern():
+    index = make_index()
+    assert index.search('.*') == []
+    assert index.search('(ali)') == index.search('ali')
+
+def test_add_replaces_and_remove_drops():
+    index = make_index()
+    index.add('P2', 'Ayesha', 'Malik')
+    assert index.search('khan') == []
+    assert index.search('malik') == ['P2']
+    
+    index.remove('P2')
+    assert index.search('ayesha') == []
+    assert len(index) == 4
+
+def test_stored_name_key_is_used_when_it_lines_up():
+    key = NameIndex.name_key('Muhammad', 'Ali')
+    assert key == NameIndex.name_key('Mohammed', 'Ali')
+    
+    index = NameIndex()
+    index.add('P1', 'Muhammad', 'Ali', key)
+    # A key with the wrong number of words is recomputed
+    index.add('P2', 'Mohammad', 'Khan', 'x')
+    assert index.search('mohamad') == ['P2', 'P1']
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for the Patient Journal and journal replay
+"""
+
+import pandas as pd
+
+from utils.patient_journal import PatientJournal, apply_entry
+
+COLUMNS = ['patient_id', 'first_name', 'remarks', 'version']
+
+def replay(entries, df=None):
+    """Apply entries in order to a DataFrame, empty by default"""
+    if df is None:
+        df = pd.DataFrame(columns=COLUMNS, dtype=object)
+    for entry in entries:
+        df = apply_entry(df, entry)
+    return df
+
+def rows(df):
+    """Get the rows of a DataFrame as plain tuples"""
+    return [tuple(row) for row in df[COLUMNS].itertuples(index=False)]
+
+def test_entries_round_trip(tmp_path):
+    journal = PatientJournal(str(tmp_path / 'journal.jsonl'))
+    entries = [
+        PatientJournal.make_entry('add', 'P1', {'patient_id': 'P1', 'first_name': 'Ali', 'remarks': '', 'version': 1}),
+        PatientJournal.make_entry('update', 'P1', {'remarks': 'fever'}, expected_version=1),
+    ]
+    size = journal.append_entries(entries)
+    
+    assert journal.entry_count == 2
+    assert journal.read_entries() == entries
+    assert journal.read_from(0) == (entries, size)
+    assert PatientJournal(journal.journal_path).entry_count == 2
+
+def test_replay_applies_adds_updates_and_deletes():
+    df = replay([
+        PatientJournal.make_entry('add', 'P1', {'patient_id': 'P1', 'first_name': 'Ali', 'remarks': '', 'version': 1}),
+        PatientJournal.make_entry('add', 'P2', {'patient_id': 'P2', 'first_name': 'Sara', 'remarks': '', 'version': 1}),
+        PatientJournal.make_entry('update', 'P1', {'remarks': 'fever'}, expected_version=1),
+        PatientJournal.make_entry('delete', 'P2'),
+    ])
+    assert rows(df) == [('P1', 'Ali', 'fever', 2)]
+
+def test_update_from_an_old_version_is_refused():
+    df = replay([
+        PatientJournal.make_entry('add', 'P1', {'patient_id': 'P1', 'first_name': 'Ali', 'remarks': '', 'version': 1}),
+        PatientJournal.make_entry('update', 'P1', {'remarks': 'first'}, expected_version=1),
+        PatientJournal.make_entry('update', 'P1', {'remarks': 'second'}, expected_version=1),
+    ])
+    assert rows(df) == [('P1', 'Ali', 'first', 2)]
+
+def test_replaying_again_after_a_crash():
+    added = replay([
+        PatientJournal.make_entry('add', 'P1', {'patient_id': 'P1', 'first_name': 'Ali', 'remarks': '', 'version': 1}),
+    ])
+    entries = [
+        PatientJournal.make_entry('add', 'P2', {'patient_id': 'P2', 'first_name': 'Sara', 'remarks': '', 'version': 1}),
+        PatientJournal.make_entry('delete', 'P2'),
+        PatientJournal.make_entry('update', 'P1', {'remarks': 'fever'}),
+    ]
+    folded = replay(entries, added)
+    assert rows(folded) == [('P1', 'Ali', 'fever', 2)]
+    
+    # Adds and deletes change nothing the second time; the update without
+    # an expected version moves the version on once more
+    assert rows(replay(entries, folded.copy())) == [('P1', 'Ali', 'fever', 3)]
+
+def test_replayed_add_resets_the_version():
+    entries = [
+        PatientJournal.make_entry('add', 'P1', {'patient_id': 'P1', 'first_name': 'Ali', 'remarks': '', 'version': 1}),
+        PatientJournal.make_entry('update', 'P1', {'remarks': 'fever'}),
+    ]
+    assert rows(replay(entries + entries)) == [('P1', 'Ali', 'fever', 2)]
+
+def test_checkpoint_empties_the_journal(tmp_path):
+    journal = PatientJournal(str(tmp_path / 'journal.jsonl'))
+    size = journal.append_entries([
+        PatientJournal.make_entry('add', 'P1', {'patient_id': 'P1', 'first_name': 'Ali', 'remarks': '', 'version': 1})
+    ])
+    after = journal.checkpoint(generation=2, folded_size=size, archived_before='2026-01', sequence=5)
+    
+    assert journal.entry_count == 0
+    assert PatientJournal(journal.journal_path).entry_count == 0
+    # A reader past the checkpoint line must reload the workbook
+    assert journal.read_from(size) is None
+    
+    [marker] = journal.read_entries()
+    assert marker == {'op': PatientJournal.CHECKPOINT, 'generation': 2, 'folded_size': size,
+                      'sequence': 5, 'archived_before': '2026-01'}
+    assert after == journal.read_from(0)[1]
+    assert len(replay([marker])) == 0
+
+def test_torn_last_line_is_skipped(tmp_path):
+    journal = PatientJournal(str(tmp_path / 'journal.jsonl'))
+    entry = PatientJournal.make_entry('delete', 'P1')
+    size = journal.append_entries([entry])
+    with open(journal.journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"op": "add", "pat')
+    
+    assert journal.read_from(0) == ([entry], size)
+    assert journal.read_entries() == [entry]
+    
+    # The next append starts on a fresh line
+    journal.append_entries([entry])
+    assert journal.read_entries() == [entry, entry]
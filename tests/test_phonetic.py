@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for phonetic keys and the bounded edit distance
+"""
+
+from utils.phonetic import phonetic_key, deletes, edit_distance
+
+def test_spellings_of_one_name_share_a_key():
+    for group in (
+        ('muhammad', 'mohammad', 'mohammed', 'muhammed', 'mohd'),
+        ('hussain', 'husain'),
+        ('ayesha', 'aisha'),
+        ('siddiqui', 'siddiqi'),
+        ('yousaf', 'yusuf'),
+        ('fatima', 'fatimah'),
+    ):
+        assert len({phonetic_key(word) for word in group}) == 1, group
+
+def test_different_names_get_different_keys():
+    assert phonetic_key('ahmed') != phonetic_key('amed')
+    assert phonetic_key('rehman') != phonetic_key('ramen')
+    assert phonetic_key('ali') != phonetic_key('aslam')
+
+def test_key_of_empty_word():
+    assert phonetic_key('') == ''
+    assert phonetic_key('123') == ''
+
+def test_deletes():
+    assert deletes('abc') == {'bc', 'ac', 'ab'}
+    assert deletes('') == set()
+
+def test_edit_distance():
+    assert edit_distance('khan', 'khan', 2) == 0
+    assert edit_distance('khan', 'kahn', 2) == 1
+    assert edit_distance('ali', 'alia', 2) == 1
+    assert edit_distance('raza', 'rizwan', 3) == 3
+
+def test_edit_distance_stops_at_the_bound():
+    assert edit_distance('ali', 'aslam', 1) == 2
+    assert edit_distance('muhammad', 'ali', 2) == 3
+    assert edit_distance('abcdef', 'fedcba', 2) == 3